@@ -16,13 +16,19 @@
 
 # flake8: noqa
 
-from .data import Row
+import importlib
+from typing import Any
+
+from .data import (
+    Row,
+    RowBatch,
+    DictionaryColumn,
+    StringDictionary,
+)
+
+from .proto import vizierapi_pb2 as vpb
 
 from .client import (
-    vpb,
-    cpb,
-    cloudapi_pb2_grpc,
-    vizierapi_pb2_grpc,
     Client,
     ScriptExecutor,
     Conn,
@@ -31,6 +37,34 @@ from .client import (
     TableSubGenerator,
 )
 
+from .filters import (
+    col,
+    ColumnRef,
+    FilterExpr,
+    FilterStats,
+)
+
+from .export import (
+    CSVWriter,
+    NDJSONWriter,
+)
+
 from .errors import (
     PxLError
 )
+
+# Modules that only some features need. They are imported on first access to keep
+# `import pxapi` fast, e.g. the cloud API is only needed to list clusters.
+_LAZY_MODULES = {
+    "cpb": ".proto.cloudapi_pb2",
+    "cloudapi_pb2_grpc": ".proto.cloudapi_pb2_grpc",
+    "vizierapi_pb2_grpc": ".proto.vizierapi_pb2_grpc",
+}
+
+
+def __getattr__(name: str) -> Any:
+    if name not in _LAZY_MODULES:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    module = importlib.import_module(_LAZY_MODULES[name], __name__)
+    globals()[name] = module
+    return module
@@ -15,15 +15,15 @@
 # SPDX-License-Identifier: Apache-2.0
 
 import asyncio
-import grpc
-import grpc.aio
 import warnings
 from typing import AsyncGenerator, Awaitable, Callable, cast, \
-    Dict, Generator, List, Literal, Union, Set
+    Dict, Generator, List, Literal, Optional, Union, Set, TYPE_CHECKING
 
 
 from .data import (
     _TableStream,
+    RowBatch,
+    RowBatchGenerator,
     RowGenerator,
     Row,
     ClusterID,
@@ -34,13 +34,22 @@ from .errors import (
     build_pxl_exception,
 )
 
+from .filters import (
+    FilterExpr,
+    FilterStats,
+)
+
+# grpc, the cloud API and the gRPC stubs are imported where they are used so that
+# `import pxapi` stays fast for scripts that never touch them.
 from .proto import (
-    cloudapi_pb2 as cpb,
-    cloudapi_pb2_grpc,
     vizierapi_pb2 as vpb,
-    vizierapi_pb2_grpc,
 )
 
+if TYPE_CHECKING:
+    import grpc
+    import grpc.aio
+    from .proto import cloudapi_pb2 as cpb
+
 from .utils import (
     CryptoOptions,
     decode_row_batch,
@@ -73,15 +82,20 @@ class TableSub:
 
     def __init__(self,
                  name: str,
-                 table_gen: _TableStreamGenerator):
+                 table_gen: _TableStreamGenerator,
+                 filter_expr: Optional[FilterExpr] = None):
         self.table_name = name
         self._table_gen = table_gen
+        self._filter_expr = filter_expr
+        # Counts of the rows kept and dropped by `filter_expr`.
+        self.stats = FilterStats()
 
-    async def __aiter__(self) -> RowGenerator:
+    async def _table_stream(self) -> Union[_TableStream, None]:
+        """ Waits for the subscribed table. Returns None if the query errored. """
         table_stream = None
         async for t in self._table_gen:
             if t == QUERY_ERROR:
-                return
+                return None
             table = cast(_TableStream, t)
             if table.name == self.table_name:
                 table_stream = table
@@ -90,9 +104,34 @@ class TableSub:
         if table_stream is None:
             raise ValueError(
                 "Table '{}' not received".format(self.table_name))
+        return table_stream
 
-        async for row in table_stream:
-            yield row
+    async def __aiter__(self) -> RowGenerator:
+        async for batch in self.batches():
+            for row in batch.rows():
+                yield row
+
+    async def batches(self) -> RowBatchGenerator:
+        """
+        Returns an async generator that yields the table's data one `RowBatch` at a time.
+
+        Use this instead of iterating rows directly when you want column-wise access
+        to the data, e.g. to build pandas or Arrow tables. If the subscription has a
+        `FilterExpr`, batches only contain the matching rows and batches without
+        any matching rows are skipped.
+        """
+        table_stream = await self._table_stream()
+        if table_stream is None:
+            return
+
+        async for batch in table_stream.batches():
+            if self._filter_expr is not None:
+                filtered = batch.filter(self._filter_expr.mask(batch))
+                self.stats.record(filtered.num_rows, batch.num_rows - filtered.num_rows)
+                if filtered.num_rows == 0:
+                    continue
+                batch = filtered
+            yield batch
 
 
 TableType = Union[TableOrError, None]
@@ -113,8 +152,8 @@ class Conn:
             pixie_url: str,
             cluster_id: ClusterID,
             use_encryption: bool = True,
-            cluster_info: cpb.ClusterInfo = None,
-            channel_fn: Callable[[str], grpc.aio.Channel] = None,
+            cluster_info: 'cpb.ClusterInfo' = None,
+            channel_fn: Callable[[str], 'grpc.aio.Channel'] = None,
     ):
         self.token = token
         self.url = pixie_url
@@ -123,7 +162,7 @@ class Conn:
         self.cluster_info = cluster_info
         self._channel_fn = channel_fn
 
-        self._channel_cache: grpc.aio.Channel = None
+        self._channel_cache: 'grpc.aio.Channel' = None
 
         self._use_encryption = use_encryption
 
@@ -131,7 +170,7 @@ class Conn:
         """ Create a new ScriptExecutor for the script to run on this connection. """
         return ScriptExecutor(self, script_str, use_encryption=self._use_encryption)
 
-    def _get_grpc_channel(self) -> grpc.aio.Channel:
+    def _get_grpc_channel(self) -> 'grpc.aio.Channel':
         """
         Gets the grpc_channel for this connection.
         """
@@ -139,10 +178,12 @@ class Conn:
         # cache them, incase the loop changes between connection runs.
         return self._create_grpc_channel()
 
-    def _create_grpc_channel(self) -> grpc.aio.Channel:
+    def _create_grpc_channel(self) -> 'grpc.aio.Channel':
         """ Creates a grpc channel for this connection. """
         if self._channel_fn:
             return self._channel_fn(self.url)
+        import grpc
+        import grpc.aio
         creds = grpc.ssl_channel_credentials()
         return grpc.aio.secure_channel(self.url, creds)
 
@@ -168,7 +209,8 @@ class ScriptExecutor:
     and cannot allow multiple runs per object.
     """
 
-    def __init__(self, conn: Conn, pxl: str, use_encryption: bool):
+    def __init__(self, conn: Conn, pxl: str, use_encryption: bool,
+                 crypto_options: CryptoOptions = None):
         self._conn = conn
         self._pxl = pxl
 
@@ -187,44 +229,70 @@ class ScriptExecutor:
 
         # Tables that have been subbed.
         self._subscribed_tables: Set[str] = set()
+        # Filter stats of the subscriptions, keyed by table name.
+        self._filter_stats: Dict[str, FilterStats] = {}
 
         # Flag whether to subscribe to all tables.
         self._subscribe_all_tables = False
 
         # Whether to encrypt the execution or not.
         self._use_encryption: bool = use_encryption
-        self._crypto = None
+        # Generating the RSA key is expensive. Callers that execute scripts repeatedly
+        # can pass in the options to reuse the key, otherwise one is generated per run.
+        self._crypto = crypto_options
 
         self._table_q_subscribers: List[asyncio.Queue[TableType]] = []
         self._tasks: List[Callable[[], Awaitable[None]]] = []
 
-    def subscribe(self, table_name: str) -> TableSub:
+    def subscribe(self, table_name: str, filter_expr: Optional[FilterExpr] = None) -> TableSub:
         """ Returns an async generator that outputs rows for the table.
 
+        If `filter_expr` is set, only rows matching it are output. The expression is
+        evaluated on whole row batches before any `Row` objects are created. The
+        number of rows kept and dropped is available from `filter_stats()`.
+
         Raises:
             ValueError: If called on a table that's already been passed as arg to
                 `subscribe` or `add_callback`.
             ValueError: If called after `run()` or `run_async()` for a particular
                 `ScriptExecutor`
+            ValueError: If `filter_expr` is not a `FilterExpr`.
         """
         self._fail_on_multi_run()
         if self._is_table_subscribed(table_name):
             raise ValueError(
                 ("Already subscribed to '{}'. Wrap the first subscription "
                  "to enable multiple subscribers.").format(table_name))
+        if filter_expr is not None and not isinstance(filter_expr, FilterExpr):
+            raise ValueError(
+                "Unexpected type for 'filter_expr': {}".format(type(filter_expr)))
 
-        sub = TableSub(table_name, self._tables())
+        sub = TableSub(table_name, self._tables(), filter_expr)
         self._subscribed_tables.add(table_name)
+        self._filter_stats[table_name] = sub.stats
         return sub
 
+    def filter_stats(self, table_name: str) -> FilterStats:
+        """ Returns the counts of rows kept and dropped by the filter on `table_name`.
+
+        Raises:
+            KeyError: If `table_name` has not been subscribed to.
+        """
+        if table_name not in self._filter_stats:
+            raise KeyError("'{}' is not subscribed".format(table_name))
+        return self._filter_stats[table_name]
+
     def _add_run_task(self, task: Callable[[], Awaitable[None]]) -> None:
         """ Adds a task concurrently with async """
         self._tasks.append(task)
 
-    def add_callback(self, table_name: str, fn: Callable[[Row], None]) -> None:
+    def add_callback(self,
+                     table_name: str,
+                     fn: Callable[[Row], None],
+                     filter_expr: Optional[FilterExpr] = None) -> None:
         """
         Adds a callback fn that will be invoked on every row of `table_name` as
-        they arrive.
+        they arrive. If `filter_expr` is set, `fn` is only invoked on matching rows.
 
         Callbacks are not invoked until you call `run()` (or `run_async()`) on
         the object.
@@ -245,13 +313,37 @@ class ScriptExecutor:
             ValueError: If called after `run()` or `run_async()` for a particular
                 `ScriptExecutor`
         """
-        table_sub = self.subscribe(table_name)
+        table_sub = self.subscribe(table_name, filter_expr)
 
         async def callback_task() -> None:
             async for row in table_sub:
                 fn(row)
         self._add_run_task(callback_task)
 
+    def add_batch_callback(self,
+                           table_name: str,
+                           fn: Callable[[RowBatch], None],
+                           filter_expr: Optional[FilterExpr] = None) -> None:
+        """
+        Adds a callback fn that will be invoked on every `RowBatch` of `table_name` as
+        they arrive. If `filter_expr` is set, batches only contain matching rows.
+
+        Behaves like `add_callback` but hands over whole batches, which avoids creating
+        a `Row` for every record.
+
+        Raises:
+            ValueError: If called on a table that's already been passed as arg to
+                `subscribe`, `add_callback` or `add_batch_callback`.
+            ValueError: If called after `run()` or `run_async()` for a particular
+                `ScriptExecutor`
+        """
+        table_sub = self.subscribe(table_name, filter_expr)
+
+        async def callback_task() -> None:
+            async for batch in table_sub.batches():
+                fn(batch)
+        self._add_run_task(callback_task)
+
     def _is_table_subscribed(self, table_name: str) -> bool:
         return self._subscribe_all_tables or table_name in self._subscribed_tables
 
@@ -432,6 +524,8 @@ class ScriptExecutor:
 
     async def _run_conn(self, conn: Conn) -> None:
         """ Executes the script on a single connection. """
+        from .proto import vizierapi_pb2_grpc
+
         channel = conn._get_grpc_channel()
         stub = vizierapi_pb2_grpc.VizierServiceStub(channel)
 
@@ -440,7 +534,8 @@ class ScriptExecutor:
         req.query_str = self._pxl
 
         if self._use_encryption:
-            self._crypto = CryptoOptions()
+            if self._crypto is None:
+                self._crypto = CryptoOptions()
             req.encryption_options.CopyFrom(self._crypto.encrypt_options())
 
         async for res in stub.ExecuteScript(req, metadata=[
@@ -478,7 +573,7 @@ class Cluster:
     can access the name in a simple format.
     """
 
-    def __init__(self, cluster_id: str, cluster_info: cpb.ClusterInfo):
+    def __init__(self, cluster_id: str, cluster_info: 'cpb.ClusterInfo'):
         self.id = cluster_id
         self.info = cluster_info
 
@@ -504,30 +599,33 @@ class Client:
         token: str,
         server_url: str = DEFAULT_PIXIE_URL,
         use_encryption: bool = False,
-        channel_fn: Callable[[str], grpc.Channel] = None,
-        conn_channel_fn: Callable[[str], grpc.aio.Channel] = None,
+        channel_fn: Callable[[str], 'grpc.Channel'] = None,
+        conn_channel_fn: Callable[[str], 'grpc.aio.Channel'] = None,
     ):
         self._token = token
         self._server_url = server_url
         self._channel_fn = channel_fn
         self._conn_channel_fn = conn_channel_fn
-        self._cloud_channel_cache: grpc.Channel = None
+        self._cloud_channel_cache: 'grpc.Channel' = None
         self._use_encryption = use_encryption
 
-    def _create_cloud_channel(self) -> grpc.Channel:
+    def _create_cloud_channel(self) -> 'grpc.Channel':
         if self._channel_fn:
             return self._channel_fn(self._server_url)
+        import grpc
         return grpc.secure_channel(self._server_url, grpc.ssl_channel_credentials())
 
-    def _get_cloud_channel(self) -> grpc.Channel:
+    def _get_cloud_channel(self) -> 'grpc.Channel':
         if self._cloud_channel_cache is None:
             self._cloud_channel_cache = self._create_cloud_channel()
 
         return self._cloud_channel_cache
 
-    def _get_cluster(self, request: cpb.GetClusterInfoRequest) -> List[cpb.ClusterInfo]:
+    def _get_cluster(self, request: 'cpb.GetClusterInfoRequest') -> List['cpb.ClusterInfo']:
+        from .proto import cloudapi_pb2_grpc
+
         stub = cloudapi_pb2_grpc.VizierClusterInfoStub(self._get_cloud_channel())
-        response: cpb.GetClusterInfoResponse = stub.GetClusterInfo(request, metadata=[
+        response: 'cpb.GetClusterInfoResponse' = stub.GetClusterInfo(request, metadata=[
             ("pixie-api-key", self._token),
             ("pixie-api-client", "python")
         ])
@@ -535,6 +633,8 @@ class Client:
 
     def list_healthy_clusters(self) -> List[Cluster]:
         """ Lists all of the healthy clusters that you can access.  """
+        from .proto import cloudapi_pb2 as cpb
+
         healthy_clusters: List[Cluster] = []
         for c in self._get_cluster(cpb.GetClusterInfoRequest()):
             if c.status != cpb.CS_HEALTHY:
@@ -548,7 +648,9 @@ class Client:
 
         return healthy_clusters
 
-    def _get_cluster_info(self, cluster_id: ClusterID) -> cpb.ClusterInfo:
+    def _get_cluster_info(self, cluster_id: ClusterID) -> 'cpb.ClusterInfo':
+        from .proto import cloudapi_pb2 as cpb
+
         request = cpb.GetClusterInfoRequest(
             id=uuid_pb_from_string(cluster_id)
         )
@@ -557,7 +659,7 @@ class Client:
     def _create_cluster_conn(
         self,
         cluster_id: ClusterID,
-        cluster_info: cpb.ClusterInfo,
+        cluster_info: 'cpb.ClusterInfo',
     ) -> Conn:
         return Conn(
             self._token,
@@ -577,7 +679,7 @@ class Client:
         You may pass in a `ClusterID` string or a `Cluster` object that comes
         from `list_healthy_clusters()`.
         """
-        cluster_info: cpb.ClusterInfo = None
+        cluster_info: 'cpb.ClusterInfo' = None
         if isinstance(cluster, ClusterID):
             cluster_id = cast(ClusterID, cluster)
         elif isinstance(cluster, Cluster):
@@ -18,8 +18,10 @@ import asyncio
 import json
 import uuid
 
+from array import array
 from collections import OrderedDict
-from typing import Callable, Any, List, AsyncGenerator, Union
+from itertools import compress
+from typing import Callable, Any, Dict, List, AsyncGenerator, Generator, Optional, Sequence, Union
 
 from .proto import vizierapi_pb2 as vpb
 
@@ -28,6 +30,9 @@ from .proto import vizierapi_pb2 as vpb
 # and row index into the specific data type.
 ColumnFn = Callable[[vpb.Column, int], Any]
 
+# Function that transforms a Column into a list of all of its values.
+ColumnValuesFn = Callable[[vpb.Column], List[Any]]
+
 # The ID of the cluster.
 ClusterID = str
 
@@ -39,6 +44,7 @@ class _Relation:
     def __init__(self, relation: vpb.Relation) -> None:
         self._columns = relation.columns
         self._col_formatter_cache: List[ColumnFn] = []
+        self._col_values_cache: List[ColumnValuesFn] = []
         self._create_col_formatters()
 
     def get_key_idx(self, key: str) -> int:
@@ -73,13 +79,37 @@ class _Relation:
         raise ValueError("{} type not supported".format(column_type))
         return lambda x, i: ''
 
+    def _col_values_impl(self, idx: int) -> ColumnValuesFn:
+        column_type = self._columns[idx].column_type
+
+        if column_type == vpb.TIME64NS:
+            return lambda x: list(x.time64ns_data.data)
+        if column_type == vpb.FLOAT64:
+            return lambda x: list(x.float64_data.data)
+        if column_type == vpb.INT64:
+            return lambda x: list(x.int64_data.data)
+        if column_type == vpb.STRING:
+            return lambda x: list(x.string_data.data)
+        if column_type == vpb.UINT128:
+            return lambda x: [_encode_uint128_as_UUID(v) for v in x.uint128_data.data]
+        if column_type == vpb.BOOLEAN:
+            return lambda x: list(x.boolean_data.data)
+        raise ValueError("{} type not supported".format(column_type))
+
     def _create_col_formatters(self) -> None:
         for i in range(len(self._columns)):
             self._col_formatter_cache.append(self._col_formatter_impl(i))
+            self._col_values_cache.append(self._col_values_impl(i))
 
     def get_col_formatter(self, idx: int) -> ColumnFn:
         return self._col_formatter_cache[idx]
 
+    def get_col_values_fn(self, idx: int) -> ColumnValuesFn:
+        return self._col_values_cache[idx]
+
+    def get_col_type(self, idx: int) -> vpb.DataType:
+        return self._columns[idx].column_type
+
     def num_cols(self) -> int:
         return len(self._columns)
 
@@ -106,13 +136,19 @@ def _encode_uint128_as_UUID(uint128: vpb.UInt128) -> uuid.UUID:
     return uuid.UUID(bytes=int_to_bytes(uint128.high) + int_to_bytes(uint128.low))
 
 
+def _encode_uint128s_as_UUID_strs(values: Sequence[vpb.UInt128]) -> List[str]:
+    """ Formats UINT128s as UUID strings without creating intermediate UUID objects. """
+    hexes = ['%016x%016x' % (v.high, v.low) for v in values]
+    return [f'{h[:8]}-{h[8:12]}-{h[12:16]}-{h[16:20]}-{h[20:]}' for h in hexes]
+
+
 class _CustomEncoder(json.JSONEncoder):
     def default(self, o: Any) -> str:
         if isinstance(o, uuid.UUID):
             return str(o)
         if isinstance(o, vpb.UInt128):
             return str(_encode_uint128_as_UUID(o))
-        return json.JSONEncoder().encode(o)
+        return super().default(o)
 
 
 class Row:
@@ -172,6 +208,275 @@ class Row:
 RowGenerator = AsyncGenerator[Row, None]
 
 
+class DictionaryColumn:
+    """
+    DictionaryColumn is a dictionary-encoded STRING column: each value is stored
+    as an integer code that indexes into `dictionary`.
+
+    When the column was encoded with a shared `StringDictionary`, `dictionary`
+    is shared with the other columns encoded by it and may hold values that do
+    not appear in this column.
+    """
+
+    def __init__(self, codes: Sequence[int], dictionary: List[Any]):
+        self.codes = codes
+        self.dictionary = dictionary
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def __getitem__(self, i: int) -> Any:
+        return self.dictionary[self.codes[i]]
+
+    def values(self) -> List[Any]:
+        """ Returns the decoded values of the column. """
+        dictionary = self.dictionary
+        return [dictionary[c] for c in self.codes]
+
+    def to_pandas(self) -> Any:
+        """ Returns the column as a `pandas.Categorical`. Requires pandas to be installed. """
+        import pandas as pd
+        return pd.Categorical.from_codes(self.codes, categories=self.dictionary)
+
+    def to_arrow(self) -> Any:
+        """ Returns the column as a `pyarrow.DictionaryArray`. Requires pyarrow to be installed. """
+        import pyarrow as pa
+        return pa.DictionaryArray.from_arrays(
+            pa.array(self.codes, type=pa.int32()),
+            pa.array(self.dictionary, type=pa.binary()),
+        )
+
+
+class StringDictionary:
+    """
+    StringDictionary interns the values of STRING columns so that repeated values
+    are stored once and referenced by integer codes.
+
+    Pass the same StringDictionary when encoding successive batches of a column to
+    share codes across batches. The dictionary holds at most `max_size` values. If
+    encoding a batch would exceed that, the dictionary starts over with the values
+    of that batch, so memory stays bounded for long-running streams. Columns that
+    were encoded before the reset keep the old values and remain valid. A batch
+    with more than `max_size` distinct values on its own is encoded with a
+    dictionary private to that batch, and the shared dictionary is left untouched.
+
+    Examples:
+      >>> dictionary = pxapi.StringDictionary(max_size=1024)
+      >>> async for batch in script.subscribe("http_table").batches():
+      ...     pods = batch.dictionary_column("pod", dictionary)
+    """
+
+    def __init__(self, max_size: int = 65536):
+        if max_size <= 0:
+            raise ValueError("max_size must be positive, got {}".format(max_size))
+        self.max_size = max_size
+        self.reset()
+
+    def reset(self) -> None:
+        """ Drops all interned values. Previously encoded columns are unaffected. """
+        self._codes: Dict[Any, int] = {}
+        self.values: List[Any] = []
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def encode(self, values: Sequence[Any]) -> DictionaryColumn:
+        """
+        Dictionary-encodes `values`, adding unseen values to the dictionary.
+
+        If `values` hold more than `max_size` distinct values, they are encoded with
+        a dictionary of their own instead.
+        """
+        codes = self._codes
+        new_values = [v for v in dict.fromkeys(values) if v not in codes]
+        if new_values and len(self.values) + len(new_values) > self.max_size:
+            distinct_values = list(dict.fromkeys(values))
+            if len(distinct_values) > self.max_size:
+                return StringDictionary(max_size=len(distinct_values)).encode(values)
+            self.reset()
+            codes = self._codes
+            new_values = distinct_values
+
+        for v in new_values:
+            codes[v] = len(self.values)
+            self.values.append(v)
+        return DictionaryColumn(array('i', [codes[v] for v in values]), self.values)
+
+
+class RowBatch:
+    """
+    RowBatch is a batch of rows for a particular table, exposed column by column.
+
+    Reading whole columns out of a batch avoids creating a `Row` for every record,
+    which is considerably cheaper when you only need a few columns or want to hand
+    the data to pandas or Arrow. Get RowBatches from `TableSub.batches()` or
+    `ScriptExecutor.add_batch_callback()`.
+
+    Examples:
+      >>> async for batch in script.subscribe("http_table").batches():
+      ...     statuses = batch.column("resp_status")
+      ...     df = batch.to_pandas(dictionary_encode=True)
+    """
+
+    def __init__(self,
+                 table: '_TableStream',
+                 batch: vpb.RowBatchData,
+                 selection: Optional[Sequence[bool]] = None):
+        self._table = table
+        self.relation = table.relation
+        self.batch = batch
+        # Which rows of `batch` belong to this RowBatch. None selects every row.
+        self._selection = selection
+        self.num_rows = batch.num_rows if selection is None else sum(selection)
+
+    def column_names(self) -> List[str]:
+        """ Returns the names of the columns in the batch. """
+        return [self.relation.get_col_name(i) for i in range(self.relation.num_cols())]
+
+    def _col_idx(self, column: Union[str, int]) -> int:
+        if isinstance(column, str):
+            idx = self.relation.get_key_idx(column)
+            if idx == -1:
+                raise KeyError("'{}' not found in relation".format(column))
+            return idx
+        if isinstance(column, int):
+            return column
+        raise KeyError(
+            f"Unexpected key type for 'column': {type(column)}")
+
+    def column(self, column: Union[str, int]) -> List[Any]:
+        """
+        Returns all values of the specified column. Can specify column by name or by index.
+
+        Raises:
+            KeyError: If `column` does not exist in `self.relation`.
+        """
+        idx = self._col_idx(column)
+        values = self.relation.get_col_values_fn(idx)(self.batch.cols[idx])
+        if self._selection is not None:
+            return list(compress(values, self._selection))
+        return values
+
+    def _raw_column(self, idx: int) -> Sequence[Any]:
+        """ Returns the protobuf values of a column, e.g. without converting UINT128s to UUIDs. """
+        col = self.batch.cols[idx]
+        values = getattr(col, col.WhichOneof("col_data")).data
+        if self._selection is not None:
+            return list(compress(values, self._selection))
+        return values
+
+    def filter(self, mask: Sequence[bool]) -> 'RowBatch':
+        """
+        Returns a RowBatch with only the rows where `mask` is True.
+
+        The underlying data is not copied; the new batch only records which rows are selected.
+
+        Raises:
+            ValueError: If `mask` does not have an entry for every row.
+        """
+        if len(mask) != self.num_rows:
+            raise ValueError('Mismatch of mask length {} and number of rows {}'.format(
+                len(mask), self.num_rows))
+        if self._selection is None:
+            return RowBatch(self._table, self.batch, list(mask))
+        # Map the mask, which covers the selected rows only, back onto all rows of the batch.
+        it = iter(mask)
+        return RowBatch(self._table, self.batch, [bool(s and next(it)) for s in self._selection])
+
+    def dictionary_column(self,
+                          column: Union[str, int],
+                          dictionary: Optional[StringDictionary] = None) -> DictionaryColumn:
+        """
+        Returns the specified STRING column dictionary-encoded.
+
+        If `dictionary` is None the column is encoded with a dictionary private to
+        this batch, otherwise with the given (possibly shared) `StringDictionary`.
+
+        Raises:
+            KeyError: If `column` does not exist in `self.relation`.
+            ValueError: If `column` is not a STRING column.
+        """
+        idx = self._col_idx(column)
+        if self.relation.get_col_type(idx) != vpb.STRING:
+            raise ValueError("Column '{}' is not a STRING column".format(
+                self.relation.get_col_name(idx)))
+        if dictionary is None:
+            dictionary = StringDictionary(max_size=max(self.num_rows, 1))
+        return dictionary.encode(self.column(idx))
+
+    def rows(self) -> Generator[Row, None, None]:
+        """ Returns a generator of `Row` objects for every row in the batch. """
+        columns = [self.column(i) for i in range(self.relation.num_cols())]
+        for values in zip(*columns):
+            yield Row(self._table, list(values))
+
+    def _columns(self,
+                 dictionary_encode: bool,
+                 dictionaries: Optional[Dict[str, StringDictionary]]) -> Dict[str, Any]:
+        """ Returns the column name to column values (or DictionaryColumn) mapping. """
+        out: Dict[str, Any] = OrderedDict()
+        for idx, name in enumerate(self.column_names()):
+            if dictionary_encode and self.relation.get_col_type(idx) == vpb.STRING:
+                dictionary = None
+                if dictionaries is not None:
+                    dictionary = dictionaries.setdefault(name, StringDictionary())
+                out[name] = self.dictionary_column(idx, dictionary)
+            else:
+                out[name] = self.column(idx)
+        return out
+
+    def to_pandas(self,
+                  dictionary_encode: bool = False,
+                  dictionaries: Optional[Dict[str, StringDictionary]] = None) -> Any:
+        """
+        Returns the batch as a `pandas.DataFrame`. Requires pandas to be installed.
+
+        If `dictionary_encode` is set, STRING columns become `pandas.Categorical`
+        columns. `dictionaries` maps column names to the `StringDictionary` to encode
+        them with; pass the same dict for every batch to share dictionaries across
+        batches. Missing entries are created on demand.
+        """
+        import pandas as pd
+        columns = self._columns(dictionary_encode, dictionaries)
+        return pd.DataFrame(OrderedDict(
+            (name, col.to_pandas() if isinstance(col, DictionaryColumn) else col)
+            for name, col in columns.items()
+        ))
+
+    def to_arrow(self,
+                 dictionary_encode: bool = False,
+                 dictionaries: Optional[Dict[str, StringDictionary]] = None) -> Any:
+        """
+        Returns the batch as a `pyarrow.Table`. Requires pyarrow to be installed.
+
+        If `dictionary_encode` is set, STRING columns become `pyarrow.DictionaryArray`
+        columns. See `to_pandas()` for the meaning of `dictionaries`.
+        """
+        import pyarrow as pa
+        arrow_types = {
+            vpb.TIME64NS: pa.timestamp("ns"),
+            vpb.FLOAT64: pa.float64(),
+            vpb.INT64: pa.int64(),
+            vpb.STRING: pa.binary(),
+            vpb.UINT128: pa.string(),
+            vpb.BOOLEAN: pa.bool_(),
+        }
+        arrays = []
+        columns = self._columns(dictionary_encode, dictionaries)
+        for idx, col in enumerate(columns.values()):
+            if isinstance(col, DictionaryColumn):
+                arrays.append(col.to_arrow())
+                continue
+            column_type = self.relation.get_col_type(idx)
+            if column_type == vpb.UINT128:
+                col = [str(v) for v in col]
+            arrays.append(pa.array(col, type=arrow_types[column_type]))
+        return pa.Table.from_arrays(arrays, names=list(columns.keys()))
+
+
+RowBatchGenerator = AsyncGenerator[RowBatch, None]
+
+
 class _Rowbatch:
     def __init__(self, rb: vpb.RowBatchData, close_table: bool = False):
         self.batch = rb
@@ -212,12 +517,13 @@ class _TableStream:
             if rb.batch.eos:
                 break
 
-    async def __aiter__(self) -> RowGenerator:
+    async def batches(self) -> RowBatchGenerator:
         async for rb in self._row_batches():
-            batch = rb.batch
-            for i in range(batch.num_rows):
-                row = []
-                for ci, col in enumerate(batch.cols):
-                    format_fn = self.relation.get_col_formatter(ci)
-                    row.append(format_fn(col, i))
-                yield Row(self, row)
+            if rb.batch.num_rows == 0:
+                continue
+            yield RowBatch(self, rb.batch)
+
+    async def __aiter__(self) -> RowGenerator:
+        async for batch in self.batches():
+            for row in batch.rows():
+                yield row
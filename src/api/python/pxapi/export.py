@@ -0,0 +1,207 @@
+# Copyright 2018- The Pixie Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# SPDX-License-Identifier: Apache-2.0
+
+import csv
+import math
+import os
+from itertools import repeat
+from json.encoder import encode_basestring_ascii  # type: ignore[attr-defined]
+from typing import Any, Callable, List, Optional, Sequence, TextIO, Union
+
+from .data import RowBatch, _encode_uint128s_as_UUID_strs
+from .proto import vizierapi_pb2 as vpb
+
+
+# Number of characters buffered before they are written out.
+DEFAULT_BUFFER_SIZE = 1 << 20
+
+_JSON_NON_FINITE = {
+    math.inf: "Infinity",
+    -math.inf: "-Infinity",
+}
+
+
+def _json_float(v: float) -> str:
+    if math.isfinite(v):
+        return repr(v)
+    if math.isnan(v):
+        return "NaN"
+    return _JSON_NON_FINITE[v]
+
+
+def _decode_strs(values: Sequence[bytes]) -> List[str]:
+    return [v.decode("utf-8", "backslashreplace") for v in values]
+
+
+def _json_column(batch: RowBatch, idx: int) -> List[str]:
+    """ Encodes every value of a column as a JSON fragment. """
+    column_type = batch.relation.get_col_type(idx)
+    values = batch._raw_column(idx)
+    if column_type in (vpb.INT64, vpb.TIME64NS):
+        return list(map(str, values))
+    if column_type == vpb.FLOAT64:
+        return list(map(_json_float, values))
+    if column_type == vpb.BOOLEAN:
+        return ["true" if v else "false" for v in values]
+    if column_type == vpb.STRING:
+        return list(map(encode_basestring_ascii, _decode_strs(values)))
+    if column_type == vpb.UINT128:
+        return ['"' + v + '"' for v in _encode_uint128s_as_UUID_strs(values)]
+    raise ValueError("{} type not supported".format(column_type))
+
+
+def _csv_column(batch: RowBatch, idx: int) -> Sequence[Any]:
+    """ Returns the values of a column in the form they are written to CSV. """
+    column_type = batch.relation.get_col_type(idx)
+    values = batch._raw_column(idx)
+    if column_type == vpb.STRING:
+        return _decode_strs(values)
+    if column_type == vpb.UINT128:
+        return _encode_uint128s_as_UUID_strs(values)
+    return values
+
+
+class _BatchWriter:
+    """
+    Base class for the writers that serialize whole `RowBatch`es to a file or stream.
+
+    Serialized batches are collected in memory and written out in blocks of at least
+    `buffer_size` characters. Call `close()` (or use the writer as a context manager)
+    to write out the remaining data.
+    """
+
+    def __init__(self,
+                 out: Union[str, os.PathLike, TextIO],
+                 buffer_size: int = DEFAULT_BUFFER_SIZE):
+        if buffer_size <= 0:
+            raise ValueError("buffer_size must be positive, got {}".format(buffer_size))
+        self._owns_stream = isinstance(out, (str, os.PathLike))
+        if self._owns_stream:
+            self._stream: TextIO = open(out, "w", encoding="utf-8", newline="")
+        else:
+            self._stream = out
+        self._buffer_size = buffer_size
+        self._buffer: List[str] = []
+        self._buffered = 0
+        self._column_names: Optional[List[str]] = None
+        self.rows_written = 0
+
+    def write(self, data: str) -> None:
+        """ Buffers `data`, writing out the buffer once it is full. """
+        self._buffer.append(data)
+        self._buffered += len(data)
+        if self._buffered >= self._buffer_size:
+            self.flush()
+
+    def flush(self) -> None:
+        """ Writes out all buffered data. """
+        if self._buffer:
+            self._stream.write("".join(self._buffer))
+            self._buffer = []
+            self._buffered = 0
+        self._stream.flush()
+
+    def close(self) -> None:
+        """ Flushes the writer and closes the output if it was opened by the writer. """
+        self.flush()
+        if self._owns_stream:
+            self._stream.close()
+
+    def __enter__(self) -> '_BatchWriter':
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.close()
+
+    def _check_columns(self, batch: RowBatch) -> bool:
+        """ Returns whether this is the first batch written. """
+        names = batch.column_names()
+        if self._column_names is None:
+            self._column_names = names
+            return True
+        if names != self._column_names:
+            raise ValueError("Mismatch of batch columns {} and previously written columns {}".format(
+                names, self._column_names))
+        return False
+
+    def write_batch(self, batch: RowBatch) -> None:
+        """
+        Serializes all rows of `batch`.
+
+        Raises:
+            ValueError: If the batch has different columns than previously written batches.
+        """
+        raise NotImplementedError
+
+
+class NDJSONWriter(_BatchWriter):
+    """
+    NDJSONWriter writes row batches as newline delimited JSON, one object per row.
+
+    STRING values are decoded as UTF-8, with invalid bytes written as backslash escapes.
+    UINT128 values are written as UUID strings.
+
+    Examples:
+      >>> with pxapi.NDJSONWriter("/tmp/http.ndjson") as writer:
+      ...     script.add_batch_callback("http_table", writer.write_batch)
+      ...     script.run()
+    """
+
+    def write_batch(self, batch: RowBatch) -> None:
+        self._check_columns(batch)
+        if batch.num_rows == 0:
+            return
+        # Interleave the encoded key prefixes with the encoded column values so every
+        # line can be assembled with a single join.
+        parts: List[Any] = []
+        for idx, name in enumerate(batch.column_names()):
+            prefix = ("{" if idx == 0 else ",") + encode_basestring_ascii(name) + ":"
+            parts.append(repeat(prefix))
+            parts.append(_json_column(batch, idx))
+        parts.append(repeat("}\n"))
+        join: Callable[[Sequence[str]], str] = "".join
+        self.write(join(map(join, zip(*parts))))
+        self.rows_written += batch.num_rows
+
+
+class CSVWriter(_BatchWriter):
+    """
+    CSVWriter writes row batches as CSV, with a header row of column names.
+
+    Values are formatted like `NDJSONWriter` formats them. `csv_kwargs` are passed
+    on to `csv.writer`, e.g. to choose a different delimiter.
+
+    Examples:
+      >>> with pxapi.CSVWriter("/tmp/http.csv") as writer:
+      ...     script.add_batch_callback("http_table", writer.write_batch)
+      ...     script.run()
+    """
+
+    def __init__(self,
+                 out: Union[str, os.PathLike, TextIO],
+                 buffer_size: int = DEFAULT_BUFFER_SIZE,
+                 **csv_kwargs: Any):
+        super().__init__(out, buffer_size)
+        self._csv_writer = csv.writer(self, **csv_kwargs)
+
+    def write_batch(self, batch: RowBatch) -> None:
+        if self._check_columns(batch):
+            self._csv_writer.writerow(batch.column_names())
+        if batch.num_rows == 0:
+            return
+        columns = [_csv_column(batch, idx) for idx in range(batch.relation.num_cols())]
+        self._csv_writer.writerows(zip(*columns))
+        self.rows_written += batch.num_rows
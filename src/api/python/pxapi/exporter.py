@@ -0,0 +1,593 @@
+# Copyright 2018- The Pixie Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# SPDX-License-Identifier: Apache-2.0
+
+"""
+A long-running exporter that periodically executes PxL scripts and serves the
+results as Prometheus metrics.
+
+The exporter keeps everything that can be reused between executions warm: one
+gRPC channel per Vizier address, the encryption key and the prepared scripts
+with their metric mappings. Metrics are updated column-wise from each
+`RowBatch` as it arrives and `/metrics` is served from a separate thread, so
+scrapes never wait for in-flight queries.
+
+Run it with a JSON config (see `ExporterConfig`):
+
+    PX_API_KEY=... python -m pxapi.exporter --config exporter.json --port 9464
+"""
+
+import argparse
+import asyncio
+import bisect
+import json
+import logging
+import math
+import os
+import threading
+from collections import OrderedDict, defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from itertools import repeat
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple, TYPE_CHECKING
+
+from .client import Client, Conn, ScriptExecutor, DEFAULT_PIXIE_URL
+from .data import RowBatch
+from .proto import vizierapi_pb2 as vpb
+from .utils import CryptoOptions
+
+if TYPE_CHECKING:
+    import grpc
+    import grpc.aio
+
+
+log = logging.getLogger("pxapi.exporter")
+
+# The label values of a single sample, in the order of the metric's label names.
+LabelValues = Tuple[str, ...]
+
+DEFAULT_BUCKETS = (.005, .01, .025, .05, .1, .25, .5, 1.0, 2.5, 5.0, 10.0)
+
+METRIC_TYPES = ("gauge", "counter", "histogram")
+
+
+def _escape_label_value(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_float(value: float) -> str:
+    if math.isnan(value):
+        return "NaN"
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value))
+
+
+class _Metric:
+    """ Base class of the metrics, which render themselves in the Prometheus text format. """
+
+    type_name = ""
+
+    def __init__(self, name: str, help: str, label_names: Sequence[str]):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(label_names)
+        self._lock = threading.Lock()
+
+    def _labels(self, values: LabelValues, extra: Sequence[Tuple[str, str]] = ()) -> str:
+        pairs = list(zip(self.label_names, values)) + list(extra)
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{k}="{_escape_label_value(v)}"' for k, v in pairs) + "}"
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        lines = [
+            f"# HELP {self.name} {self.help}",
+            f"# TYPE {self.name} {self.type_name}",
+        ]
+        with self._lock:
+            lines.extend(self._samples())
+        return lines
+
+
+class Gauge(_Metric):
+    """ Gauge holds the latest value for each set of label values. """
+
+    type_name = "gauge"
+
+    def __init__(self, name: str, help: str, label_names: Sequence[str] = ()):
+        super().__init__(name, help, label_names)
+        self._values: Dict[LabelValues, float] = {}
+
+    def set(self, labels: LabelValues, value: float) -> None:
+        with self._lock:
+            self._values[labels] = value
+
+    def replace(self, values: Dict[LabelValues, float]) -> None:
+        """ Replaces all values at once, dropping label values that are no longer present. """
+        with self._lock:
+            self._values = values
+
+    def _samples(self) -> List[str]:
+        return [f"{self.name}{self._labels(k)} {_format_float(v)}" for k, v in self._values.items()]
+
+
+class Counter(_Metric):
+    """ Counter accumulates values for each set of label values. """
+
+    type_name = "counter"
+
+    def __init__(self, name: str, help: str, label_names: Sequence[str] = ()):
+        super().__init__(name, help, label_names)
+        self._values: Dict[LabelValues, float] = defaultdict(float)
+
+    def inc(self, labels: LabelValues, value: float = 1.0) -> None:
+        self.inc_many([(labels, value)])
+
+    def inc_many(self, samples: Iterable[Tuple[LabelValues, float]]) -> None:
+        with self._lock:
+            values = self._values
+            for labels, value in samples:
+                values[labels] += value
+
+    def _samples(self) -> List[str]:
+        return [f"{self.name}{self._labels(k)} {_format_float(v)}" for k, v in self._values.items()]
+
+
+class Histogram(_Metric):
+    """ Histogram counts observed values in cumulative buckets for each set of label values. """
+
+    type_name = "histogram"
+
+    def __init__(self, name: str, help: str, label_names: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help, label_names)
+        self.buckets = sorted(float(b) for b in buckets if not math.isinf(b))
+        # Per label values: the (non-cumulative) count for each bucket plus +Inf, and the sum.
+        self._counts: Dict[LabelValues, List[int]] = {}
+        self._sums: Dict[LabelValues, float] = defaultdict(float)
+
+    def observe(self, labels: LabelValues, value: float) -> None:
+        self.observe_many([(labels, value)])
+
+    def observe_many(self, samples: Iterable[Tuple[LabelValues, float]]) -> None:
+        buckets = self.buckets
+        with self._lock:
+            for labels, value in samples:
+                counts = self._counts.get(labels)
+                if counts is None:
+                    counts = self._counts[labels] = [0] * (len(buckets) + 1)
+                counts[bisect.bisect_left(buckets, value)] += 1
+                self._sums[labels] += value
+
+    def _samples(self) -> List[str]:
+        lines = []
+        bounds = [_format_float(b) for b in self.buckets] + ["+Inf"]
+        for labels, counts in self._counts.items():
+            total = 0
+            for bound, count in zip(bounds, counts):
+                total += count
+                lines.append(f"{self.name}_bucket{self._labels(labels, [('le', bound)])} {total}")
+            lines.append(f"{self.name}_sum{self._labels(labels)} {_format_float(self._sums[labels])}")
+            lines.append(f"{self.name}_count{self._labels(labels)} {total}")
+        return lines
+
+
+class MetricsRegistry:
+    """ MetricsRegistry holds the exported metrics and renders them for `/metrics`. """
+
+    def __init__(self) -> None:
+        self._metrics: Dict[str, _Metric] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        """
+        Registers `metric` and returns it. Registering a metric with the same name, type,
+        label names and buckets again returns the registered metric and keeps its values,
+        so the exporter can be restarted. Registering a different metric under the same
+        name raises a ValueError.
+        """
+        with self._lock:
+            registered = self._metrics.get(metric.name)
+            if registered is None:
+                self._metrics[metric.name] = metric
+                return metric
+        if (type(registered) is not type(metric)
+                or registered.label_names != metric.label_names
+                or getattr(registered, "buckets", None) != getattr(metric, "buckets", None)):
+            raise ValueError("Metric '{}' is already registered".format(metric.name))
+        return registered
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines: List[str] = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+class MetricMapping:
+    """
+    MetricMapping describes how a metric is computed from the rows of a table.
+
+    Every row produces one sample: the value is read from the `value` column and the
+    label values from the `labels` columns. Gauges keep the last value per label
+    values seen in the latest execution of the script, counters add up the values
+    and histograms observe them.
+    """
+
+    def __init__(self,
+                 table: str,
+                 name: str,
+                 type: str,
+                 value: str,
+                 labels: Sequence[str] = (),
+                 help: str = "",
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        if type not in METRIC_TYPES:
+            raise ValueError("Metric '{}' has unsupported type '{}', expected one of {}".format(
+                name, type, METRIC_TYPES))
+        self.table = table
+        self.name = name
+        self.type = type
+        self.value = value
+        self.labels = list(labels)
+        self.help = help or "{} of column '{}' in table '{}'".format(type, value, table)
+        self.buckets = list(buckets)
+
+    @classmethod
+    def from_dict(cls, config: Dict[str, Any]) -> 'MetricMapping':
+        return cls(**config)
+
+    def create_metric(self) -> _Metric:
+        if self.type == "gauge":
+            return Gauge(self.name, self.help, self.labels)
+        if self.type == "counter":
+            return Counter(self.name, self.help, self.labels)
+        return Histogram(self.name, self.help, self.labels, self.buckets)
+
+    def samples(self, batch: RowBatch) -> Iterable[Tuple[LabelValues, float]]:
+        """ Returns the (label values, value) sample of every row in `batch`. """
+        values = map(float, batch.column(self.value))
+        if not self.labels:
+            return zip(repeat(()), values)
+        return zip(zip(*[_label_column(batch, label) for label in self.labels]), values)
+
+
+def _label_column(batch: RowBatch, column: str) -> List[str]:
+    """ Returns the values of a column as label strings. """
+    idx = batch.relation.get_key_idx(column)
+    if idx == -1:
+        raise KeyError("'{}' not found in relation".format(column))
+    if batch.relation.get_col_type(idx) == vpb.STRING:
+        # Label columns are highly repetitive, so decode each distinct value once.
+        encoded = batch.dictionary_column(idx)
+        decoded = [v.decode("utf-8", "replace") for v in encoded.dictionary]
+        return [decoded[c] for c in encoded.codes]
+    return [str(v) for v in batch.column(idx)]
+
+
+class ScriptConfig:
+    """ ScriptConfig is a PxL script executed every `interval_s` seconds and the metrics it feeds. """
+
+    def __init__(self, name: str, pxl: str, interval_s: float, metrics: Sequence[MetricMapping]):
+        if interval_s <= 0:
+            raise ValueError("Script '{}' must have a positive interval_s".format(name))
+        if not metrics:
+            raise ValueError("Script '{}' has no metrics".format(name))
+        self.name = name
+        self.pxl = pxl
+        self.interval_s = interval_s
+        self.metrics = list(metrics)
+
+    @classmethod
+    def from_dict(cls, config: Dict[str, Any], base_dir: str = "") -> 'ScriptConfig':
+        pxl = config.get("pxl")
+        if pxl is None and "pxl_file" in config:
+            with open(os.path.join(base_dir, config["pxl_file"])) as f:
+                pxl = f.read()
+        if pxl is None:
+            raise ValueError("Script '{}' needs either 'pxl' or 'pxl_file'".format(config.get("name")))
+        return cls(
+            name=config["name"],
+            pxl=pxl,
+            interval_s=config.get("interval_s", 30),
+            metrics=[MetricMapping.from_dict(m) for m in config.get("metrics", [])],
+        )
+
+
+class ExporterConfig:
+    """
+    ExporterConfig is the configuration of an `Exporter`.
+
+    Example JSON config:
+
+        {
+          "cluster_id": "10000000-0000-0000-0000-000000000001",
+          "scripts": [{
+            "name": "http",
+            "pxl_file": "http.pxl",
+            "interval_s": 30,
+            "metrics": [{
+              "table": "http_table",
+              "name": "px_http_latency_ms",
+              "type": "histogram",
+              "value": "latency_ms",
+              "labels": ["service"],
+              "buckets": [10, 50, 100, 500, 1000]
+            }]
+          }]
+        }
+
+    `pxl_file` paths are relative to the config file.
+    """
+
+    def __init__(self,
+                 cluster_id: str,
+                 scripts: Sequence[ScriptConfig],
+                 server_url: str = DEFAULT_PIXIE_URL,
+                 use_encryption: bool = False):
+        names = [m.name for s in scripts for m in s.metrics]
+        duplicates = sorted({n for n in names if names.count(n) > 1})
+        if duplicates:
+            raise ValueError("Metrics defined more than once: {}".format(duplicates))
+        self.cluster_id = cluster_id
+        self.scripts = list(scripts)
+        self.server_url = server_url
+        self.use_encryption = use_encryption
+
+    @classmethod
+    def from_dict(cls, config: Dict[str, Any], base_dir: str = "") -> 'ExporterConfig':
+        return cls(
+            cluster_id=config["cluster_id"],
+            scripts=[ScriptConfig.from_dict(s, base_dir) for s in config.get("scripts", [])],
+            server_url=config.get("server_url", DEFAULT_PIXIE_URL),
+            use_encryption=config.get("use_encryption", False),
+        )
+
+    @classmethod
+    def from_file(cls, path: str) -> 'ExporterConfig':
+        with open(path) as f:
+            return cls.from_dict(json.load(f), base_dir=os.path.dirname(os.path.abspath(path)))
+
+
+class _ChannelPool:
+    """
+    _ChannelPool hands out one long-lived grpc.aio channel per address.
+
+    Asyncio channels are bound to the event loop they were created on, so the pool
+    must only be used from the exporter's loop.
+    """
+
+    def __init__(self, channel_fn: Optional[Callable[[str], 'grpc.aio.Channel']] = None) -> None:
+        self._channel_fn = channel_fn
+        self._channels: Dict[str, 'grpc.aio.Channel'] = {}
+
+    def get(self, url: str) -> 'grpc.aio.Channel':
+        if url not in self._channels:
+            self._channels[url] = self._create(url)
+        return self._channels[url]
+
+    def _create(self, url: str) -> 'grpc.aio.Channel':
+        if self._channel_fn:
+            return self._channel_fn(url)
+        import grpc
+        import grpc.aio
+        return grpc.aio.secure_channel(url, grpc.ssl_channel_credentials())
+
+    async def close(self) -> None:
+        for channel in self._channels.values():
+            await channel.close()
+        self._channels.clear()
+
+
+class _ExporterStatus:
+    """ _ExporterStatus holds the metrics the exporter reports about its own script executions. """
+
+    def __init__(self, registry: MetricsRegistry):
+        self.runs = Counter(
+            "pxapi_exporter_script_runs_total", "Successful executions of the script.", ["script"])
+        self.errors = Counter(
+            "pxapi_exporter_script_errors_total", "Failed executions of the script.", ["script"])
+        self.duration = Gauge(
+            "pxapi_exporter_script_duration_seconds", "Duration of the latest execution of the script.",
+            ["script"])
+        for metric in (self.runs, self.errors, self.duration):
+            registry.register(metric)
+
+
+class _ScriptJob:
+    """ _ScriptJob periodically executes a prepared script and updates its metrics. """
+
+    def __init__(self,
+                 config: ScriptConfig,
+                 conn: Conn,
+                 registry: MetricsRegistry,
+                 crypto: Optional[CryptoOptions],
+                 status: _ExporterStatus):
+        self.config = config
+        self._conn = conn
+        self._crypto = crypto
+        self._status = status
+        # The metric mappings grouped by the table that feeds them.
+        self._mappings: Dict[str, List[Tuple[MetricMapping, _Metric]]] = defaultdict(list)
+        for mapping in config.metrics:
+            metric = registry.register(mapping.create_metric())
+            self._mappings[mapping.table].append((mapping, metric))
+
+    async def run_once(self) -> None:
+        executor = ScriptExecutor(self._conn, self.config.pxl,
+                                  use_encryption=self._crypto is not None,
+                                  crypto_options=self._crypto)
+        # Gauges only reflect the latest execution, so collect their values and swap them in at the end.
+        gauge_values: Dict[str, Dict[LabelValues, float]] = defaultdict(dict)
+
+        def update(mappings: List[Tuple[MetricMapping, _Metric]], batch: RowBatch) -> None:
+            for mapping, metric in mappings:
+                samples = mapping.samples(batch)
+                if isinstance(metric, Gauge):
+                    gauge_values[metric.name].update(samples)
+                elif isinstance(metric, Counter):
+                    metric.inc_many(samples)
+                elif isinstance(metric, Histogram):
+                    metric.observe_many(samples)
+
+        for table, mappings in self._mappings.items():
+            executor.add_batch_callback(table, lambda batch, mappings=mappings: update(mappings, batch))
+
+        # Scripts must finish within their interval, streaming scripts are not supported.
+        await asyncio.wait_for(executor.run_async(), timeout=self.config.interval_s)
+
+        for mappings in self._mappings.values():
+            for _, metric in mappings:
+                if isinstance(metric, Gauge):
+                    metric.replace(gauge_values.get(metric.name, {}))
+
+    async def run_forever(self) -> None:
+        loop = asyncio.get_running_loop()
+        labels = (self.config.name,)
+        while True:
+            start = loop.time()
+            try:
+                await self.run_once()
+                self._status.runs.inc(labels)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                log.exception("Failed to execute script '%s'", self.config.name)
+                self._status.errors.inc(labels)
+            elapsed = loop.time() - start
+            self._status.duration.set(labels, elapsed)
+            await asyncio.sleep(max(0.0, self.config.interval_s - elapsed))
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    registry: MetricsRegistry
+
+    def do_GET(self) -> None:
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = self.registry.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        log.debug(format, *args)
+
+
+class Exporter:
+    """
+    Exporter periodically executes the configured PxL scripts and exposes the
+    resulting metrics for Prometheus to scrape.
+
+    Examples:
+      >>> exporter = Exporter(ExporterConfig.from_file("exporter.json"), token=API_TOKEN)
+      >>> exporter.serve(port=9464)
+      >>> exporter.run()
+    """
+
+    def __init__(self,
+                 config: ExporterConfig,
+                 token: str,
+                 channel_fn: Optional[Callable[[str], 'grpc.Channel']] = None,
+                 conn_channel_fn: Optional[Callable[[str], 'grpc.aio.Channel']] = None):
+        self.config = config
+        self.registry = MetricsRegistry()
+        self._token = token
+        # Channel functions for testing, see `Client`.
+        self._channel_fn = channel_fn
+        self._channels = _ChannelPool(conn_channel_fn)
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._status = _ExporterStatus(self.registry)
+        # The key is generated once and reused by every execution.
+        self._crypto = CryptoOptions() if config.use_encryption else None
+        self._jobs: List[_ScriptJob] = []
+
+    def serve(self, port: int, addr: str = "") -> ThreadingHTTPServer:
+        """ Serves `/metrics` on `addr:port` from a background thread. """
+        handler = type("_Handler", (_MetricsHandler,), {"registry": self.registry})
+        self._server = ThreadingHTTPServer((addr, port), handler)
+        threading.Thread(target=self._server.serve_forever, name="pxapi-exporter-http", daemon=True).start()
+        return self._server
+
+    def _connect(self) -> Conn:
+        client = Client(
+            token=self._token,
+            server_url=self.config.server_url,
+            use_encryption=self.config.use_encryption,
+            channel_fn=self._channel_fn,
+            conn_channel_fn=self._channels.get,
+        )
+        return client.connect_to_cluster(self.config.cluster_id)
+
+    async def run_async(self) -> None:
+        """
+        Executes the scripts until cancelled. It can be awaited again afterwards, e.g. to
+        reconnect, and the metrics keep their values.
+        """
+        conn = self._connect()
+        self._jobs = [
+            _ScriptJob(script, conn, self.registry, self._crypto, self._status)
+            for script in self.config.scripts
+        ]
+        try:
+            await asyncio.gather(*[job.run_forever() for job in self._jobs])
+        finally:
+            await self._channels.close()
+
+    def run(self) -> None:
+        """ Executes the scripts until interrupted. """
+        try:
+            asyncio.run(self.run_async())
+        finally:
+            if self._server is not None:
+                self._server.shutdown()
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Export the results of PxL scripts as Prometheus metrics.",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument("--config", "-c", required=True, help="Path to the JSON exporter config.")
+    parser.add_argument("--port", "-p", type=int, default=9464, help="Port to serve /metrics on.")
+    parser.add_argument("--addr", default="", help="Address to serve /metrics on.")
+    parser.add_argument("--token", default=os.getenv("PX_API_KEY"),
+                        help="Pixie API token. Defaults to the PX_API_KEY environment variable.")
+    parser.add_argument("--logging", default="info", choices=["debug", "info", "warning", "error"],
+                        help="Logging level.")
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    logging.basicConfig(level=args.logging.upper())
+    if not args.token:
+        raise ValueError("A Pixie API token is required, set --token or PX_API_KEY")
+    exporter = Exporter(ExporterConfig.from_file(args.config), token=args.token)
+    exporter.serve(args.port, args.addr)
+    log.info("Serving metrics on %s:%d/metrics", args.addr or "0.0.0.0", args.port)
+    exporter.run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+# Copyright 2018- The Pixie Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# SPDX-License-Identifier: Apache-2.0
+
+import operator
+import uuid
+from itertools import repeat
+from typing import Any, Callable, Iterable, List
+
+from .data import RowBatch
+from .proto import vizierapi_pb2 as vpb
+
+
+# A vectorized mask with one entry per row of a RowBatch.
+Mask = List[bool]
+
+
+class FilterExpr:
+    """
+    FilterExpr is a declarative predicate over the columns of a table.
+
+    Build expressions with `col()` and combine them with `&`, `|` and `~`
+    (Python's `and`, `or` and `not` cannot be overloaded). Expressions are
+    evaluated column-wise over a whole `RowBatch`, so rows that are filtered
+    out never get turned into `Row` objects.
+
+    Examples:
+      >>> expr = (col("resp_status") >= 500) & col("service").isin({"a", "b"})
+      >>> script.add_callback("http_table", fn, filter_expr=expr)
+    """
+
+    def mask(self, batch: RowBatch) -> Mask:
+        """ Returns whether each row of `batch` matches the expression. """
+        raise NotImplementedError
+
+    def __and__(self, other: 'FilterExpr') -> 'FilterExpr':
+        return _BinaryExpr(self, _check_expr(other), operator.and_)
+
+    def __or__(self, other: 'FilterExpr') -> 'FilterExpr':
+        return _BinaryExpr(self, _check_expr(other), operator.or_)
+
+    def __invert__(self) -> 'FilterExpr':
+        return _NotExpr(self)
+
+    def __bool__(self) -> bool:
+        raise ValueError(
+            "FilterExpr cannot be used as a bool. Use '&', '|' and '~' instead of 'and', 'or' and 'not'.")
+
+
+def _check_expr(expr: Any) -> FilterExpr:
+    if not isinstance(expr, FilterExpr):
+        raise ValueError("Expected a FilterExpr, got {}".format(type(expr)))
+    return expr
+
+
+def _coerce(batch: RowBatch, column: str, value: Any) -> Any:
+    """ Converts a user supplied value to the representation used by the column's data. """
+    idx = batch.relation.get_key_idx(column)
+    if idx == -1:
+        raise KeyError("'{}' not found in relation".format(column))
+    column_type = batch.relation.get_col_type(idx)
+    if column_type == vpb.STRING and isinstance(value, str):
+        return value.encode()
+    if column_type == vpb.UINT128 and isinstance(value, str):
+        return uuid.UUID(value)
+    return value
+
+
+class _CompareExpr(FilterExpr):
+    def __init__(self, column: str, op: Callable[[Any, Any], bool], value: Any):
+        self._column = column
+        self._op = op
+        self._value = value
+
+    def mask(self, batch: RowBatch) -> Mask:
+        values = batch.column(self._column)
+        value = _coerce(batch, self._column, self._value)
+        return list(map(self._op, values, repeat(value, len(values))))
+
+
+class _IsInExpr(FilterExpr):
+    def __init__(self, column: str, values: Iterable[Any]):
+        self._column = column
+        self._values = list(values)
+
+    def mask(self, batch: RowBatch) -> Mask:
+        values = frozenset(_coerce(batch, self._column, v) for v in self._values)
+        return list(map(values.__contains__, batch.column(self._column)))
+
+
+class _BinaryExpr(FilterExpr):
+    def __init__(self, left: FilterExpr, right: FilterExpr, op: Callable[[bool, bool], bool]):
+        self._left = left
+        self._right = right
+        self._op = op
+
+    def mask(self, batch: RowBatch) -> Mask:
+        return list(map(self._op, self._left.mask(batch), self._right.mask(batch)))
+
+
+class _NotExpr(FilterExpr):
+    def __init__(self, expr: FilterExpr):
+        self._expr = expr
+
+    def mask(self, batch: RowBatch) -> Mask:
+        return [not m for m in self._expr.mask(batch)]
+
+
+class ColumnRef:
+    """
+    ColumnRef refers to a column by name and builds `FilterExpr`s when compared
+    against a value. Create it with `col()`.
+
+    STRING columns may be compared against `str` or `bytes` values and UINT128
+    columns against UUID strings.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __eq__(self, value: Any) -> FilterExpr:  # type: ignore[override]
+        return _CompareExpr(self.name, operator.eq, value)
+
+    def __ne__(self, value: Any) -> FilterExpr:  # type: ignore[override]
+        return _CompareExpr(self.name, operator.ne, value)
+
+    def __lt__(self, value: Any) -> FilterExpr:
+        return _CompareExpr(self.name, operator.lt, value)
+
+    def __le__(self, value: Any) -> FilterExpr:
+        return _CompareExpr(self.name, operator.le, value)
+
+    def __gt__(self, value: Any) -> FilterExpr:
+        return _CompareExpr(self.name, operator.gt, value)
+
+    def __ge__(self, value: Any) -> FilterExpr:
+        return _CompareExpr(self.name, operator.ge, value)
+
+    def isin(self, values: Iterable[Any]) -> FilterExpr:
+        """ Matches rows whose value is one of `values`. """
+        return _IsInExpr(self.name, values)
+
+    __hash__ = None  # type: ignore[assignment]
+
+
+def col(name: str) -> ColumnRef:
+    """ Returns a reference to the column `name` for building `FilterExpr`s. """
+    return ColumnRef(name)
+
+
+class FilterStats:
+    """ FilterStats counts the rows kept and dropped by a subscription's `FilterExpr`. """
+
+    def __init__(self) -> None:
+        self.rows_kept = 0
+        self.rows_dropped = 0
+
+    def record(self, kept: int, dropped: int) -> None:
+        self.rows_kept += kept
+        self.rows_dropped += dropped
+
+    def __repr__(self) -> str:
+        return "FilterStats(rows_kept={}, rows_dropped={})".format(self.rows_kept, self.rows_dropped)
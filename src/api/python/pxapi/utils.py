@@ -15,7 +15,6 @@
 # SPDX-License-Identifier: Apache-2.0
 
 import uuid
-from authlib.jose import JsonWebKey, RSAKey, JsonWebEncryption
 
 from .proto import (
     uuid_pb2 as uuidpb,
@@ -39,6 +38,9 @@ def uuid_pb_to_string(pb: uuidpb.UUID) -> str:
 
 class CryptoOptions:
     def __init__(self):
+        # authlib's JOSE stack is slow to import, so only load it when encryption is used.
+        from authlib.jose import JsonWebKey, RSAKey
+
         rsa = RSAKey.generate_key(key_size=4096, is_private=True)
         self.jwk_public_key = JsonWebKey.import_key(rsa.as_pem(is_private=False))
         self.jwk_private_key = JsonWebKey.import_key(rsa.as_pem(is_private=True))
@@ -57,6 +59,8 @@ class CryptoOptions:
 
 
 def decode_row_batch(crypt: CryptoOptions, data) -> vpb.RowBatchData:
+    from authlib.jose import JsonWebEncryption
+
     jwe = JsonWebEncryption()
 
     rb = vpb.RowBatchData()
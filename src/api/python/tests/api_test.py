@@ -20,9 +20,9 @@ import unittest
 import uuid
 
 from concurrent import futures
-from typing import List, Any, Coroutine, Dict
+from typing import List, Any, Coroutine
 
-from pxapi import cloudapi_pb2_grpc, cpb, vizierapi_pb2_grpc, vpb, utils
+from pxapi import cloudapi_pb2_grpc, vizierapi_pb2_grpc, vpb
 import pxapi
 
 import test_utils
@@ -55,87 +55,12 @@ async def run_script_and_tasks(
     await asyncio.gather(*tasks)
 
 
-class VizierServiceFake(vizierapi_pb2_grpc.VizierServiceServicer):
-    def __init__(self) -> None:
-        self.cluster_id_to_fake_data: Dict[str,
-                                           List[test_utils.ExecResponse]] = {}
-        self.cluster_id_to_error: Dict[str, Exception] = {}
-
-    def add_fake_data(self, cluster_id: str, data: List[test_utils.ExecResponse]) -> None:
-        if cluster_id not in self.cluster_id_to_fake_data:
-            self.cluster_id_to_fake_data[cluster_id] = []
-        self.cluster_id_to_fake_data[cluster_id].extend(data)
-
-    def trigger_error(self, cluster_id: str, exc: Exception) -> None:
-        """ Adds an error that triggers after the data is yielded. """
-        self.cluster_id_to_error[cluster_id] = exc
-
-    def ExecuteScript(self, request: vpb.ExecuteScriptRequest, context: Any) -> Any:
-        cluster_id = request.cluster_id
-        assert cluster_id in self.cluster_id_to_fake_data, f"need data for cluster_id {cluster_id}"
-        data = self.cluster_id_to_fake_data[cluster_id]
-        opts = None
-        if request.HasField("encryption_options"):
-            opts = request.encryption_options
-        for d in data:
-            yield d.encrypted_script_response(opts)
-
-        # Trigger an error for the cluster ID if the user added one.
-        if cluster_id in self.cluster_id_to_error:
-            raise self.cluster_id_to_error[cluster_id]
-
-
-def create_cluster_info(
-    cluster_id: str,
-    cluster_name: str,
-    status: cpb.ClusterStatus = cpb.CS_HEALTHY,
-) -> cpb.ClusterInfo:
-    return cpb.ClusterInfo(
-        id=utils.uuid_pb_from_string(cluster_id),
-        status=status,
-        cluster_name=cluster_name,
-    )
-
-
-class CloudServiceFake(cloudapi_pb2_grpc.VizierClusterInfoServicer):
-    def __init__(self) -> None:
-        self.clusters = [
-            create_cluster_info(
-                test_utils.cluster_uuid1,
-                "cluster1",
-            ),
-            create_cluster_info(
-                test_utils.cluster_uuid2,
-                "cluster2",
-            ),
-            # One cluster marked as unhealthy.
-            create_cluster_info(
-                test_utils.cluster_uuid3,
-                "cluster3",
-                status=cpb.CS_UNHEALTHY,
-            ),
-        ]
-
-    def GetClusterInfo(
-        self,
-        request: cpb.GetClusterInfoRequest,
-        context: Any,
-    ) -> cpb.GetClusterInfoResponse:
-        if request.HasField('id'):
-            for c in self.clusters:
-                if c.id == request.id:
-                    return cpb.GetClusterInfoResponse(clusters=[c])
-            return cpb.GetClusterInfoResponse(clusters=[])
-
-        return cpb.GetClusterInfoResponse(clusters=self.clusters)
-
-
 class TestClient(unittest.TestCase):
     def setUp(self) -> None:
         # Create a fake server for the VizierService
         self.server = grpc.server(futures.ThreadPoolExecutor(max_workers=1))
-        self.fake_vizier_service = VizierServiceFake()
-        self.fake_cloud_service = CloudServiceFake()
+        self.fake_vizier_service = test_utils.VizierServiceFake()
+        self.fake_cloud_service = test_utils.CloudServiceFake()
 
         vizierapi_pb2_grpc.add_VizierServiceServicer_to_server(
             self.fake_vizier_service, self.server)
@@ -285,6 +210,39 @@ class TestClient(unittest.TestCase):
         loop.run_until_complete(
             run_script_and_tasks(script_executor, [process_table(http_tb)]))
 
+    def test_subscribe_with_filter(self) -> None:
+        # Connect to a single fake cluster.
+        conn = self.px_client.connect_to_cluster(
+            self.px_client.list_healthy_clusters()[0])
+
+        http_table1 = self.http_table_factory.create_table(test_utils.table_id1)
+        self.fake_vizier_service.add_fake_data(conn.cluster_id, [
+            http_table1.metadata_response(),
+            http_table1.row_batch_response([[b"foo", b"bar", b"baz"], [200, 500, 503]]),
+            # No row in this batch matches the filter.
+            http_table1.row_batch_response([[b"bat"], [404]]),
+            http_table1.end(),
+        ])
+
+        script_executor = conn.prepare_script(pxl_script)
+        http_tb = script_executor.subscribe(
+            "http", filter_expr=pxapi.col("resp_status") >= 500)
+
+        with self.assertRaisesRegex(ValueError, "Unexpected type for 'filter_expr'"):
+            script_executor.subscribe("stats", filter_expr="resp_status >= 500")
+
+        async def process_table(table_sub: pxapi.TableSub) -> None:
+            bodies = [row["resp_body"] async for row in table_sub]
+            self.assertEqual(bodies, [b"bar", b"baz"])
+
+        loop = asyncio.get_event_loop()
+        loop.run_until_complete(
+            run_script_and_tasks(script_executor, [process_table(http_tb)]))
+
+        stats = script_executor.filter_stats("http")
+        self.assertEqual(stats.rows_kept, 2)
+        self.assertEqual(stats.rows_dropped, 2)
+
     def test_one_conn_two_tables(self) -> None:
 
         # Connect to a single fake cluster.
@@ -15,11 +15,12 @@
 # SPDX-License-Identifier: Apache-2.0
 
 import asyncio
+import importlib.util
 import json
 import unittest
 from typing import List, Any
 
-from pxapi import data, vpb
+from pxapi import data, filters, vpb
 
 import test_utils as utils
 
@@ -101,6 +102,108 @@ class TestData(unittest.TestCase):
         loop = asyncio.get_event_loop()
         loop.run_until_complete(process_rows())
 
+    def test_row_batch(self) -> None:
+        table = data._TableStream("foo", data._Relation(self.relation),
+                                  subscribed=True)
+        foo_faker = utils.FakeTableFactory("foo", self.relation).create_table(utils.table_id1)
+        batch = data.RowBatch(table, foo_faker.row_batch(
+            [[b"foo", b"bar", b"foo", b"foo"], [200, 500, 301, 404]]))
+
+        self.assertEqual(batch.column_names(), ["resp_body", "resp_status"])
+        self.assertEqual(batch.column("resp_status"), [200, 500, 301, 404])
+        self.assertEqual(batch.column(0), [b"foo", b"bar", b"foo", b"foo"])
+        self.assertEqual([r["resp_status"] for r in batch.rows()], [200, 500, 301, 404])
+
+        # Encoding with a batch-local dictionary.
+        col = batch.dictionary_column("resp_body")
+        self.assertEqual(list(col.codes), [0, 1, 0, 0])
+        self.assertEqual(col.dictionary, [b"foo", b"bar"])
+        self.assertEqual(col.values(), [b"foo", b"bar", b"foo", b"foo"])
+
+        with self.assertRaisesRegex(ValueError, "not a STRING column"):
+            batch.dictionary_column("resp_status")
+
+        with self.assertRaisesRegex(KeyError, ".* not found in relation"):
+            batch.column("baz")
+
+    def test_string_dictionary(self) -> None:
+        dictionary = data.StringDictionary(max_size=3)
+
+        # Codes are shared across batches.
+        first = dictionary.encode([b"a", b"b", b"a"])
+        second = dictionary.encode([b"b", b"c"])
+        self.assertEqual(list(first.codes), [0, 1, 0])
+        self.assertEqual(list(second.codes), [1, 2])
+        self.assertEqual(len(dictionary), 3)
+
+        # Exceeding the bound starts a new dictionary, old columns stay valid.
+        third = dictionary.encode([b"d", b"a"])
+        self.assertEqual(list(third.codes), [0, 1])
+        self.assertEqual(third.dictionary, [b"d", b"a"])
+        self.assertEqual(second.values(), [b"b", b"c"])
+
+        # A batch with more distinct values than the bound is encoded with a
+        # dictionary of its own, and leaves the shared dictionary as it was.
+        fourth = dictionary.encode([b"w", b"x", b"y", b"z", b"w"])
+        self.assertEqual(list(fourth.codes), [0, 1, 2, 3, 0])
+        self.assertEqual(fourth.dictionary, [b"w", b"x", b"y", b"z"])
+        self.assertEqual(dictionary.values, [b"d", b"a"])
+        fifth = dictionary.encode([b"a", b"d"])
+        self.assertEqual(list(fifth.codes), [1, 0])
+
+        with self.assertRaisesRegex(ValueError, "max_size must be positive"):
+            data.StringDictionary(max_size=0)
+
+    def _shared_dictionary_column(self) -> data.DictionaryColumn:
+        """ Returns a column whose shared dictionary holds values the column doesn't use. """
+        dictionary = data.StringDictionary()
+        dictionary.encode([b"a", b"b", b"c"])
+        return dictionary.encode([b"c", b"a", b"c"])
+
+    @unittest.skipIf(importlib.util.find_spec("pandas") is None, "pandas is not installed")
+    def test_dictionary_column_to_pandas(self) -> None:
+        categorical = self._shared_dictionary_column().to_pandas()
+        self.assertEqual(list(categorical.categories), [b"a", b"b", b"c"])
+        self.assertEqual(list(categorical.codes), [2, 0, 2])
+        self.assertEqual(list(categorical), [b"c", b"a", b"c"])
+
+    @unittest.skipIf(importlib.util.find_spec("pyarrow") is None, "pyarrow is not installed")
+    def test_dictionary_column_to_arrow(self) -> None:
+        array = self._shared_dictionary_column().to_arrow()
+        self.assertEqual(array.dictionary.to_pylist(), [b"a", b"b", b"c"])
+        self.assertEqual(array.indices.to_pylist(), [2, 0, 2])
+        self.assertEqual(array.to_pylist(), [b"c", b"a", b"c"])
+
+    def test_filter_expr(self) -> None:
+        table = data._TableStream("foo", data._Relation(self.relation),
+                                  subscribed=True)
+        foo_faker = utils.FakeTableFactory("foo", self.relation).create_table(utils.table_id1)
+        batch = data.RowBatch(table, foo_faker.row_batch(
+            [[b"foo", b"bar", b"baz", b"bat"], [200, 500, 301, 404]]))
+
+        col = filters.col
+        self.assertEqual((col("resp_status") >= 400).mask(batch), [False, True, False, True])
+        # STRING columns can be compared against str values.
+        self.assertEqual(col("resp_body").isin({"foo", "bat"}).mask(batch), [True, False, False, True])
+        self.assertEqual(((col("resp_status") > 300) & ~(col("resp_body") == "bat")).mask(batch),
+                         [False, True, True, False])
+        self.assertEqual(((col("resp_status") == 200) | (col("resp_body") == b"baz")).mask(batch),
+                         [True, False, True, False])
+
+        with self.assertRaisesRegex(ValueError, "cannot be used as a bool"):
+            (col("resp_status") > 300) and (col("resp_status") < 400)
+
+        # Filtering twice keeps only the rows selected by both masks.
+        filtered = batch.filter((col("resp_status") > 250).mask(batch))
+        self.assertEqual(filtered.num_rows, 3)
+        filtered = filtered.filter((col("resp_body") != "baz").mask(filtered))
+        self.assertEqual(filtered.num_rows, 2)
+        self.assertEqual(filtered.column("resp_body"), [b"bar", b"bat"])
+        self.assertEqual([r["resp_status"] for r in filtered.rows()], [500, 404])
+
+        with self.assertRaisesRegex(ValueError, "Mismatch of mask length 1 and number of rows 2"):
+            filtered.filter([True])
+
     def test_unsubbed_table_stream(self) -> None:
         # Create the table stream, but it should be unsubscribed.
         table = data._TableStream("foo",
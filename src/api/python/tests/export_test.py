@@ -0,0 +1,86 @@
+# Copyright 2018- The Pixie Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# SPDX-License-Identifier: Apache-2.0
+
+import csv
+import io
+import json
+import unittest
+
+from pxapi import data, export, vpb
+
+import test_utils as utils
+
+
+class TestExport(unittest.TestCase):
+    def setUp(self) -> None:
+        relation = vpb.Relation(columns=[
+            utils.string_col("resp_body"),
+            utils.int64_col("resp_status"),
+            utils.uint128_col("upid"),
+        ])
+        self.table = data._TableStream("foo", data._Relation(relation), subscribed=True)
+        self.faker = utils.FakeTableFactory("foo", relation).create_table(utils.table_id1)
+
+    def _batch(self) -> data.RowBatch:
+        return data.RowBatch(self.table, self.faker.row_batch([
+            [b"foo", b"b\"ar\n", b"\x9f"],
+            [200, 500, 404],
+            [utils.make_upid()] * 3,
+        ]))
+
+    def test_ndjson_writer(self) -> None:
+        out = io.StringIO()
+        # Use a tiny buffer so that the writer flushes more than once.
+        with export.NDJSONWriter(out, buffer_size=16) as writer:
+            writer.write_batch(self._batch())
+            writer.write_batch(self._batch())
+            self.assertEqual(writer.rows_written, 6)
+
+        lines = out.getvalue().splitlines()
+        self.assertEqual(len(lines), 6)
+        upid = str(data._encode_uint128_as_UUID(utils.make_upid()))
+        self.assertEqual(json.loads(lines[0]), {"resp_body": "foo", "resp_status": 200, "upid": upid})
+        self.assertEqual(json.loads(lines[1])["resp_body"], "b\"ar\n")
+        # Invalid UTF-8 is written as backslash escapes.
+        self.assertEqual(json.loads(lines[2])["resp_body"], "\\x9f")
+
+    def test_csv_writer(self) -> None:
+        out = io.StringIO()
+        with export.CSVWriter(out) as writer:
+            writer.write_batch(self._batch())
+            writer.write_batch(self._batch().filter([False, True, False]))
+
+        rows = list(csv.reader(io.StringIO(out.getvalue())))
+        upid = str(data._encode_uint128_as_UUID(utils.make_upid()))
+        self.assertEqual(rows[0], ["resp_body", "resp_status", "upid"])
+        self.assertEqual(rows[1], ["foo", "200", upid])
+        self.assertEqual(rows[2], ["b\"ar\n", "500", upid])
+        self.assertEqual(len(rows), 5)
+        self.assertEqual(rows[4], ["b\"ar\n", "500", upid])
+
+    def test_mismatched_columns(self) -> None:
+        other_relation = vpb.Relation(columns=[utils.int64_col("resp_status")])
+        other_table = data._TableStream("bar", data._Relation(other_relation), subscribed=True)
+        other_faker = utils.FakeTableFactory("bar", other_relation).create_table(utils.table_id2)
+
+        writer = export.NDJSONWriter(io.StringIO())
+        writer.write_batch(self._batch())
+        with self.assertRaisesRegex(ValueError, "Mismatch of batch columns"):
+            writer.write_batch(data.RowBatch(other_table, other_faker.row_batch([[200]])))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,272 @@
+# Copyright 2018- The Pixie Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# SPDX-License-Identifier: Apache-2.0
+
+import asyncio
+import grpc
+import json
+import os
+import tempfile
+import unittest
+import urllib.error
+import urllib.request
+
+from concurrent import futures
+from typing import List
+
+from pxapi import cloudapi_pb2_grpc, data, exporter, vizierapi_pb2_grpc, vpb
+
+import test_utils as utils
+
+
+class TestExporter(unittest.TestCase):
+    def setUp(self) -> None:
+        relation = vpb.Relation(columns=[
+            utils.string_col("service"),
+            utils.int64_col("resp_status"),
+            utils.int64_col("latency_ms"),
+        ])
+        self.table = data._TableStream("http", data._Relation(relation), subscribed=True)
+        self.faker = utils.FakeTableFactory("http", relation).create_table(utils.table_id1)
+
+    def _batch(self) -> data.RowBatch:
+        return data.RowBatch(self.table, self.faker.row_batch([
+            [b"cart", b"cart", b"ui\"x"],
+            [200, 500, 200],
+            [10, 700, 40],
+        ]))
+
+    def test_metric_mappings(self) -> None:
+        registry = exporter.MetricsRegistry()
+        latency = exporter.MetricMapping(
+            table="http", name="latency_ms", type="histogram", value="latency_ms",
+            labels=["service"], buckets=[50, 500])
+        status = exporter.MetricMapping(
+            table="http", name="last_status", type="gauge", value="resp_status", labels=["service"])
+        count = exporter.MetricMapping(table="http", name="requests_total", type="counter", value="resp_status")
+
+        histogram = registry.register(latency.create_metric())
+        gauge = registry.register(status.create_metric())
+        counter = registry.register(count.create_metric())
+        histogram.observe_many(latency.samples(self._batch()))
+        gauge.replace(dict(status.samples(self._batch())))
+        counter.inc_many(count.samples(self._batch()))
+
+        lines = registry.render().splitlines()
+        self.assertIn("# TYPE latency_ms histogram", lines)
+        self.assertIn('latency_ms_bucket{service="cart",le="50.0"} 1', lines)
+        self.assertIn('latency_ms_bucket{service="cart",le="500.0"} 1', lines)
+        self.assertIn('latency_ms_bucket{service="cart",le="+Inf"} 2', lines)
+        self.assertIn('latency_ms_sum{service="cart"} 710.0', lines)
+        self.assertIn('latency_ms_count{service="cart"} 2', lines)
+        # Label values are escaped.
+        self.assertIn('last_status{service="ui\\"x"} 200.0', lines)
+        self.assertIn('last_status{service="cart"} 500.0', lines)
+        self.assertIn("requests_total 900.0", lines)
+
+        # Registering the same metric again returns the registered one, a different one raises.
+        self.assertIs(registry.register(latency.create_metric()), histogram)
+        with self.assertRaisesRegex(ValueError, "already registered"):
+            registry.register(exporter.Gauge("latency_ms", "", ["service"]))
+        with self.assertRaisesRegex(ValueError, "already registered"):
+            registry.register(exporter.Histogram("latency_ms", "", ["service"], buckets=[10]))
+
+    def test_config(self) -> None:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            with open(os.path.join(tmpdir, "http.pxl"), "w") as f:
+                f.write("import px")
+            config_path = os.path.join(tmpdir, "exporter.json")
+            with open(config_path, "w") as f:
+                json.dump({
+                    "cluster_id": utils.cluster_uuid1,
+                    "scripts": [{
+                        "name": "http",
+                        "pxl_file": "http.pxl",
+                        "interval_s": 10,
+                        "metrics": [{"table": "http", "name": "m", "type": "gauge", "value": "latency_ms"}],
+                    }],
+                }, f)
+            config = exporter.ExporterConfig.from_file(config_path)
+
+        self.assertEqual(config.cluster_id, utils.cluster_uuid1)
+        self.assertEqual(config.scripts[0].pxl, "import px")
+        self.assertEqual(config.scripts[0].interval_s, 10)
+        self.assertEqual(config.scripts[0].metrics[0].labels, [])
+
+        with self.assertRaisesRegex(ValueError, "unsupported type 'summary'"):
+            exporter.MetricMapping(table="http", name="m", type="summary", value="latency_ms")
+
+        mapping = exporter.MetricMapping(table="http", name="m", type="gauge", value="latency_ms")
+        script = exporter.ScriptConfig(name="http", pxl="", interval_s=10, metrics=[mapping])
+        with self.assertRaisesRegex(ValueError, "defined more than once"):
+            exporter.ExporterConfig(cluster_id=utils.cluster_uuid1, scripts=[script, script])
+
+    def test_serve(self) -> None:
+        mapping = exporter.MetricMapping(table="http", name="m", type="gauge", value="latency_ms")
+        config = exporter.ExporterConfig(
+            cluster_id=utils.cluster_uuid1,
+            scripts=[exporter.ScriptConfig(name="http", pxl="", interval_s=10, metrics=[mapping])])
+        px_exporter = exporter.Exporter(config, token="")
+        server = px_exporter.serve(port=0, addr="localhost")
+        try:
+            url = f"http://localhost:{server.server_address[1]}"
+            body = urllib.request.urlopen(url + "/metrics").read().decode()
+            self.assertIn("# TYPE pxapi_exporter_script_runs_total counter", body)
+
+            with self.assertRaises(urllib.error.HTTPError):
+                urllib.request.urlopen(url + "/foo")
+        finally:
+            server.shutdown()
+            server.server_close()
+
+
+ACCESS_TOKEN = "12345678-0000-0000-0000-987654321012"
+
+
+class TestScriptJob(unittest.TestCase):
+    def setUp(self) -> None:
+        # Serve the fake VizierService and cloud service.
+        self.server = grpc.server(futures.ThreadPoolExecutor(max_workers=1))
+        self.fake_vizier_service = utils.VizierServiceFake()
+        vizierapi_pb2_grpc.add_VizierServiceServicer_to_server(self.fake_vizier_service, self.server)
+        cloudapi_pb2_grpc.add_VizierClusterInfoServicer_to_server(utils.CloudServiceFake(), self.server)
+        self.port = self.server.add_insecure_port("[::]:0")
+        self.server.start()
+
+        self.num_conn_channels = 0
+        self.http_table_factory = utils.FakeTableFactory("http", vpb.Relation(columns=[
+            utils.string_col("service"),
+            utils.int64_col("resp_status"),
+        ]))
+        self.status = exporter.MetricMapping(
+            table="http", name="last_status", type="gauge", value="resp_status", labels=["service"])
+        self.requests = exporter.MetricMapping(
+            table="http", name="requests_total", type="counter", value="resp_status", labels=["service"])
+
+    def tearDown(self) -> None:
+        self.server.stop(None)
+
+    def _conn_channel_fn(self, url: str) -> grpc.aio.Channel:
+        self.num_conn_channels += 1
+        return grpc.aio.insecure_channel(url)
+
+    def _exporter(self, interval_s: float = 10, use_encryption: bool = False) -> exporter.Exporter:
+        script = exporter.ScriptConfig(
+            name="http", pxl="import px", interval_s=interval_s, metrics=[self.status, self.requests])
+        config = exporter.ExporterConfig(
+            cluster_id=utils.cluster_uuid1,
+            scripts=[script],
+            server_url=f"localhost:{self.port}",
+            use_encryption=use_encryption,
+        )
+        return exporter.Exporter(
+            config,
+            token=ACCESS_TOKEN,
+            channel_fn=lambda url: grpc.insecure_channel(url),
+            conn_channel_fn=self._conn_channel_fn,
+        )
+
+    def _job(self, px_exporter: exporter.Exporter) -> exporter._ScriptJob:
+        return exporter._ScriptJob(px_exporter.config.scripts[0], px_exporter._connect(), px_exporter.registry,
+                                   px_exporter._crypto, px_exporter._status)
+
+    def _set_data(self, cols: List[List]) -> None:
+        # Responses are encrypted in place, so every execution gets its own.
+        http_table = self.http_table_factory.create_table(utils.table_id1)
+        self.fake_vizier_service.cluster_id_to_fake_data[utils.cluster_uuid1] = [
+            http_table.metadata_response(),
+            http_table.row_batch_response(cols),
+            http_table.end(),
+        ]
+
+    def test_run_once(self) -> None:
+        px_exporter = self._exporter()
+        job = self._job(px_exporter)
+
+        async def run_twice() -> None:
+            self._set_data([[b"cart", b"ui"], [200, 500]])
+            await job.run_once()
+            lines = px_exporter.registry.render().splitlines()
+            self.assertIn('last_status{service="cart"} 200.0', lines)
+            self.assertIn('last_status{service="ui"} 500.0', lines)
+
+            self._set_data([[b"cart"], [404]])
+            await job.run_once()
+            await px_exporter._channels.close()
+
+        asyncio.run(run_twice())
+        lines = px_exporter.registry.render().splitlines()
+        # Gauges only hold the values of the latest execution, counters accumulate.
+        self.assertIn('last_status{service="cart"} 404.0', lines)
+        self.assertNotIn('last_status{service="ui"} 500.0', lines)
+        self.assertIn('requests_total{service="cart"} 604.0', lines)
+        self.assertIn('requests_total{service="ui"} 500.0', lines)
+        self.assertEqual(len(self.fake_vizier_service.requests), 2)
+
+    def test_reuse_channel_and_crypto(self) -> None:
+        px_exporter = self._exporter(use_encryption=True)
+        job = self._job(px_exporter)
+
+        async def run_twice() -> None:
+            for status in [200, 500]:
+                self._set_data([[b"cart"], [status]])
+                await job.run_once()
+            await px_exporter._channels.close()
+
+        asyncio.run(run_twice())
+        self.assertIn('last_status{service="cart"} 500.0', px_exporter.registry.render().splitlines())
+        # One channel and one key for every execution.
+        self.assertEqual(self.num_conn_channels, 1)
+        first, second = self.fake_vizier_service.requests
+        self.assertTrue(first.HasField("encryption_options"))
+        self.assertEqual(first.encryption_options, second.encryption_options)
+
+    def test_run_forever_errors(self) -> None:
+        px_exporter = self._exporter(interval_s=60)
+        job = self._job(px_exporter)
+        self._set_data([[b"cart"], [200]])
+        self.fake_vizier_service.trigger_error(utils.cluster_uuid1, ValueError("hi"))
+
+        async def run() -> None:
+            # The failed execution is counted and the job keeps running until cancelled.
+            with self.assertRaises(asyncio.TimeoutError):
+                await asyncio.wait_for(job.run_forever(), timeout=2)
+
+        asyncio.run(run())
+        lines = px_exporter.registry.render().splitlines()
+        self.assertIn('pxapi_exporter_script_errors_total{script="http"} 1.0', lines)
+        self.assertFalse([line for line in lines if line.startswith("pxapi_exporter_script_runs_total{")])
+        self.assertTrue([line for line in lines if line.startswith("pxapi_exporter_script_duration_seconds{")])
+
+    def test_run_async_twice(self) -> None:
+        px_exporter = self._exporter(interval_s=60)
+        self._set_data([[b"cart"], [200]])
+
+        async def run() -> None:
+            with self.assertRaises(asyncio.TimeoutError):
+                await asyncio.wait_for(px_exporter.run_async(), timeout=2)
+
+        # Restarting the exporter reuses its registered metrics.
+        asyncio.run(run())
+        self._set_data([[b"cart"], [200]])
+        asyncio.run(run())
+        lines = px_exporter.registry.render().splitlines()
+        self.assertIn('pxapi_exporter_script_runs_total{script="http"} 2.0', lines)
+        self.assertIn('requests_total{service="cart"} 400.0', lines)
+        self.assertEqual(self.num_conn_channels, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -15,11 +15,12 @@
 # SPDX-License-Identifier: Apache-2.0
 
 import grpc
-from typing import List, Any
+from typing import List, Any, Dict
 import json
 from authlib.jose import JsonWebKey, JsonWebEncryption
 
-from pxapi import vpb
+from pxapi import cloudapi_pb2_grpc, cpb, vizierapi_pb2_grpc, vpb
+from pxapi.utils import uuid_pb_from_string
 import pxapi
 
 
@@ -219,3 +220,81 @@ async def iterate_and_pass(table_sub: pxapi.TableSub) -> None:
     """ Processor that iterates over a subscription and does nothing. """
     async for _ in table_sub:
         pass
+
+
+class VizierServiceFake(vizierapi_pb2_grpc.VizierServiceServicer):
+    def __init__(self) -> None:
+        self.cluster_id_to_fake_data: Dict[str,
+                                           List[ExecResponse]] = {}
+        self.cluster_id_to_error: Dict[str, Exception] = {}
+        # The requests received, in order.
+        self.requests: List[vpb.ExecuteScriptRequest] = []
+
+    def add_fake_data(self, cluster_id: str, data: List[ExecResponse]) -> None:
+        if cluster_id not in self.cluster_id_to_fake_data:
+            self.cluster_id_to_fake_data[cluster_id] = []
+        self.cluster_id_to_fake_data[cluster_id].extend(data)
+
+    def trigger_error(self, cluster_id: str, exc: Exception) -> None:
+        """ Adds an error that triggers after the data is yielded. """
+        self.cluster_id_to_error[cluster_id] = exc
+
+    def ExecuteScript(self, request: vpb.ExecuteScriptRequest, context: Any) -> Any:
+        self.requests.append(request)
+        cluster_id = request.cluster_id
+        assert cluster_id in self.cluster_id_to_fake_data, f"need data for cluster_id {cluster_id}"
+        data = self.cluster_id_to_fake_data[cluster_id]
+        opts = None
+        if request.HasField("encryption_options"):
+            opts = request.encryption_options
+        for d in data:
+            yield d.encrypted_script_response(opts)
+
+        # Trigger an error for the cluster ID if the user added one.
+        if cluster_id in self.cluster_id_to_error:
+            raise self.cluster_id_to_error[cluster_id]
+
+
+def create_cluster_info(
+    cluster_id: str,
+    cluster_name: str,
+    status: cpb.ClusterStatus = cpb.CS_HEALTHY,
+) -> cpb.ClusterInfo:
+    return cpb.ClusterInfo(
+        id=uuid_pb_from_string(cluster_id),
+        status=status,
+        cluster_name=cluster_name,
+    )
+
+
+class CloudServiceFake(cloudapi_pb2_grpc.VizierClusterInfoServicer):
+    def __init__(self) -> None:
+        self.clusters = [
+            create_cluster_info(
+                cluster_uuid1,
+                "cluster1",
+            ),
+            create_cluster_info(
+                cluster_uuid2,
+                "cluster2",
+            ),
+            # One cluster marked as unhealthy.
+            create_cluster_info(
+                cluster_uuid3,
+                "cluster3",
+                status=cpb.CS_UNHEALTHY,
+            ),
+        ]
+
+    def GetClusterInfo(
+        self,
+        request: cpb.GetClusterInfoRequest,
+        context: Any,
+    ) -> cpb.GetClusterInfoResponse:
+        if request.HasField('id'):
+            for c in self.clusters:
+                if c.id == request.id:
+                    return cpb.GetClusterInfoResponse(clusters=[c])
+            return cpb.GetClusterInfoResponse(clusters=[])
+
+        return cpb.GetClusterInfoResponse(clusters=self.clusters)
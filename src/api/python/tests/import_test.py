@@ -0,0 +1,76 @@
+# Copyright 2018- The Pixie Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# SPDX-License-Identifier: Apache-2.0
+
+import json
+import os
+import subprocess
+import sys
+import unittest
+from typing import Set
+
+# Modules that `import pxapi` must not load. They are only needed for encryption,
+# listing clusters or executing scripts and are imported on first use.
+LAZY_MODULES = [
+    "grpc",
+    "grpc.aio",
+    "authlib.jose",
+    "pxapi.proto.cloudapi_pb2",
+    "pxapi.proto.cloudapi_pb2_grpc",
+    "pxapi.proto.vizierapi_pb2_grpc",
+]
+
+# Packages that `import pxapi` must not load any module of. Importing them
+# dominates the import time of pxapi, so a transitive import of any of their
+# submodules undoes the lazy loading above.
+LAZY_PACKAGES = ["grpc", "authlib", "pandas"]
+
+_PROBE = """
+import json, sys
+import pxapi
+print(json.dumps(sorted(sys.modules)))
+"""
+
+
+def _import_pxapi() -> Set[str]:
+    """ Imports pxapi in a fresh interpreter and returns the loaded modules. """
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+    out = subprocess.run([sys.executable, "-c", _PROBE], env=env, check=True,
+                         capture_output=True, text=True).stdout
+    return set(json.loads(out))
+
+
+class TestImport(unittest.TestCase):
+    def test_heavy_modules_are_lazy(self) -> None:
+        modules = _import_pxapi()
+        for module in LAZY_MODULES:
+            self.assertNotIn(module, modules, f"'import pxapi' should not import {module}")
+
+    def test_lazy_attributes(self) -> None:
+        import pxapi
+        self.assertTrue(hasattr(pxapi.cpb, "GetClusterInfoRequest"))
+        self.assertTrue(hasattr(pxapi.vizierapi_pb2_grpc, "VizierServiceStub"))
+        with self.assertRaisesRegex(AttributeError, "has no attribute 'foo'"):
+            pxapi.foo
+
+    def test_heavy_packages_are_lazy(self) -> None:
+        modules = _import_pxapi()
+        for package in LAZY_PACKAGES:
+            loaded = sorted(m for m in modules if m == package or m.startswith(package + "."))
+            self.assertEqual(loaded, [], f"'import pxapi' should not import {package}")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -14,19 +14,87 @@
 #
 # SPDX-License-Identifier: Apache-2.0
 
+import heapq
 import logging
+import math
 from collections import Counter
 from typing import Tuple
 
 from privy.providers.generic import GenericProvider
 
 
+class PIITypeHeap:
+    """Indexed min-heap of pii type counts, ordered by count and then by the order pii types were added in.
+
+    Counts only ever increase, so incrementing a count sifts its entry down from its indexed position in O(log n),
+    and the k lowest counts are found in O(k log k) by walking the heap from its root. Pii types not seen before
+    are added as a new leaf and sifted up."""
+
+    def __init__(self, pii_types: list[str]):
+        # entries are [count, order, pii_type], which compare by count and then by order
+        self.heap = [[0, order, pii_type] for order, pii_type in enumerate(pii_types)]
+        self.position = {pii_type: i for i, (_, _, pii_type) in enumerate(self.heap)}
+
+    def increment(self, pii_type: str, n: int = 1) -> None:
+        if pii_type not in self.position:
+            self.heap.append([n, len(self.heap), pii_type])
+            self.position[pii_type] = len(self.heap) - 1
+            self.sift_up(len(self.heap) - 1)
+            return
+        i = self.position[pii_type]
+        self.heap[i][0] += n
+        self.sift_down(i)
+
+    def sift_up(self, i: int) -> None:
+        heap = self.heap
+        while i > 0:
+            parent = (i - 1) // 2
+            if not heap[i] < heap[parent]:
+                return
+            heap[i], heap[parent] = heap[parent], heap[i]
+            self.position[heap[i][2]] = i
+            self.position[heap[parent][2]] = parent
+            i = parent
+
+    def sift_down(self, i: int) -> None:
+        heap = self.heap
+        while True:
+            smallest = i
+            for child in (2 * i + 1, 2 * i + 2):
+                if child < len(heap) and heap[child] < heap[smallest]:
+                    smallest = child
+            if smallest == i:
+                return
+            heap[i], heap[smallest] = heap[smallest], heap[i]
+            self.position[heap[i][2]] = i
+            self.position[heap[smallest][2]] = smallest
+            i = smallest
+
+    def lowest(self) -> Tuple[str, int]:
+        count, _, pii_type = self.heap[0]
+        return pii_type, count
+
+    def k_lowest(self, k: int) -> list[Tuple[str, int]]:
+        lowest = []
+        candidates = [(self.heap[0], 0)] if self.heap else []
+        while candidates and len(lowest) < k:
+            (count, _, pii_type), i = heapq.heappop(candidates)
+            lowest.append((pii_type, count))
+            for child in (2 * i + 1, 2 * i + 2):
+                if child < len(self.heap):
+                    heapq.heappush(candidates, (self.heap[child], child))
+        return lowest
+
+
 class DatasetAnalyzer:
     def __init__(self, providers: GenericProvider) -> None:
         # initialize counter of PII types in the generated dataset
         # initialize all pii type counts to 0
         self.count_pii_types = Counter(
             {k: 0 for k in providers.get_pii_types()})
+        self.pii_type_heap = PIITypeHeap(list(self.count_pii_types))
+        # running total of count_pii_types
+        self.num_pii_types = 0
         self.num_payloads = 0
         self.num_pii_payloads = 0
         self.num_payloads_this_spec = 0
@@ -37,14 +105,17 @@ class DatasetAnalyzer:
 
     def get_lowest_count_pii_type(self) -> Tuple[str, int]:
         """Get pii type with lowest count in the generated dataset"""
-        return min(self.count_pii_types.items(), key=lambda x: x[1])
+        return self.pii_type_heap.lowest()
 
     def k_lowest_pii_types(self, k) -> list[Tuple[str, int]]:
         """Get k pii types with lowest count in the generated dataset"""
-        return self.count_pii_types.most_common()[:-k - 1:-1]
+        return self.pii_type_heap.k_lowest(k)
 
     def update_pii_counters(self, pii_types) -> None:
         self.count_pii_types.update(pii_types)
+        for pii_type in pii_types:
+            self.pii_type_heap.increment(pii_type)
+        self.num_pii_types += len(pii_types)
         self.num_pii_payloads += 1
         self.num_pii_payloads_this_spec += 1
 
@@ -57,8 +128,47 @@ class DatasetAnalyzer:
         self.num_payloads_this_spec += 1
         if self.num_pii_payloads > 0:
             self.percent_pii = (self.num_pii_payloads / self.num_payloads) * 100
-            num_pii_types = sum(self.count_pii_types.values())
-            self.num_pii_types_per_pii_payload = num_pii_types / self.num_pii_payloads
+            self.num_pii_types_per_pii_payload = self.num_pii_types / self.num_pii_payloads
+
+    def num_pii_payloads_needed(self, percentage: int) -> int:
+        """Number of additional PII payloads after which round(percent_pii) reaches percentage"""
+        def reached(x: int) -> bool:
+            return self.num_payloads + x > 0 and \
+                round((self.num_pii_payloads + x) / (self.num_payloads + x) * 100) >= percentage
+
+        if percentage <= 0 or reached(0):
+            return 0
+        # solve (pii + x) / (payloads + x) >= percentage - 0.5, then correct for rounding
+        target = min(percentage - 0.5, 99.5) / 100
+        x = max(1, math.ceil((target * self.num_payloads - self.num_pii_payloads) / (1 - target)))
+        while not reached(x):
+            x += 1
+        while x > 1 and reached(x - 1):
+            x -= 1
+        return x
+
+    def get_state(self) -> dict:
+        """Dataset wide counters, e.g. to checkpoint a run. Spec specific metrics are reset after every spec."""
+        return {
+            "count_pii_types": dict(self.count_pii_types),
+            "num_payloads": self.num_payloads,
+            "num_pii_payloads": self.num_pii_payloads,
+            "percent_pii": self.percent_pii,
+            "num_pii_types_per_pii_payload": self.num_pii_types_per_pii_payload,
+        }
+
+    def restore_state(self, state: dict) -> None:
+        """Restore counters returned by get_state"""
+        self.count_pii_types = Counter(state["count_pii_types"])
+        self.pii_type_heap = PIITypeHeap(list(self.count_pii_types))
+        for pii_type, count in self.count_pii_types.items():
+            self.pii_type_heap.increment(pii_type, count)
+        self.num_pii_types = sum(self.count_pii_types.values())
+        self.num_payloads = state["num_payloads"]
+        self.num_pii_payloads = state["num_pii_payloads"]
+        self.percent_pii = state["percent_pii"]
+        self.num_pii_types_per_pii_payload = state["num_pii_types_per_pii_payload"]
+        self.reset_spec_specific_metrics()
 
     def print_metrics(self) -> None:
         self.log.info(
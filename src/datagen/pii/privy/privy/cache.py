@@ -0,0 +1,94 @@
+# Copyright 2018- The Pixie Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# SPDX-License-Identifier: Apache-2.0
+
+import hashlib
+import json
+import logging
+import pickle
+from pathlib import Path
+from typing import Any
+
+import schemathesis
+import yaml
+from schemathesis.specs.openapi.schemas import BaseOpenAPISchema
+from schemathesis.utils import StringDatesYAMLLoader
+
+from privy.generate.utils import atomic_write
+
+# bump to invalidate existing caches when the stored format changes
+CACHE_VERSION = 1
+
+
+class SpecCache:
+    """On-disk cache of parsed openAPI descriptors.
+
+    Loading a descriptor with schemathesis.from_path parses the whole JSON/YAML document with a pure-python YAML
+    loader, which for large specs takes longer than payload generation itself. SpecCache stores the parsed document
+    as a pickle keyed by a hash of the file contents (and the schemathesis version, which owns the YAML loader), so
+    that later runs, including runs with different generate types or regions, skip the parse and build the schema
+    with schemathesis.from_dict instead.
+    """
+
+    def __init__(self, cache_folder: Path):
+        self.cache_folder = Path(cache_folder)
+        self.hits = 0
+        self.misses = 0
+        self.log = logging.getLogger("privy")
+
+    def key(self, data: bytes) -> str:
+        h = hashlib.blake2b(digest_size=16)
+        h.update(f"{CACHE_VERSION}:{schemathesis.__version__}:".encode())
+        h.update(data)
+        return h.hexdigest()
+
+    def cache_path(self, key: str) -> Path:
+        return self.cache_folder / key[:2] / f"{key}.pickle"
+
+    @staticmethod
+    def parse(file: Path, data: bytes) -> dict[str, Any]:
+        """Parse a descriptor the way schemathesis.from_path does."""
+        text = data.decode("utf8")
+        if file.suffix == ".json":
+            try:
+                return json.loads(text)
+            except json.JSONDecodeError:
+                pass
+        return yaml.load(text, StringDatesYAMLLoader)
+
+    def load_raw(self, file: Path) -> dict[str, Any]:
+        """Return the parsed descriptor in file, parsing and caching it on a miss."""
+        with open(file, "rb") as f:
+            data = f.read()
+        path = self.cache_path(self.key(data))
+        try:
+            with open(path, "rb") as f:
+                raw = pickle.load(f)
+            self.hits += 1
+            return raw
+        except FileNotFoundError:
+            pass
+        except Exception:
+            self.log.warning(f"Ignoring unreadable spec cache entry {path}")
+        self.misses += 1
+        raw = self.parse(file, data)
+        with atomic_write(path, "wb") as f:
+            pickle.dump(raw, f, protocol=pickle.HIGHEST_PROTOCOL)
+        return raw
+
+    def load_schema(self, file: Path, **kwargs) -> BaseOpenAPISchema:
+        """Drop-in replacement for schemathesis.from_path(file, **kwargs)."""
+        file = Path(file)
+        return schemathesis.from_dict(self.load_raw(file), location=file.absolute().as_uri(), **kwargs)
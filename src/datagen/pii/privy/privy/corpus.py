@@ -0,0 +1,132 @@
+# Copyright 2018- The Pixie Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# SPDX-License-Identifier: Apache-2.0
+
+
+import json
+import logging
+from datetime import timedelta
+from pathlib import Path
+from typing import Optional
+
+from privy.generate.utils import atomic_write
+from privy.sharding import spec_key
+
+# bump to invalidate existing indexes when the stored format changes
+INDEX_VERSION = 1
+# generation seconds per byte of spec assumed before any spec of the corpus was timed
+DEFAULT_SECONDS_PER_BYTE = 1e-5
+
+
+class CorpusIndex:
+    """Persistent index of the openAPI specs of a corpus, recording each spec's size, operation count, parameter
+    count and the seconds its last generation took.
+
+    Sizes are recorded whenever the corpus is scanned, while operation counts, parameter counts and seconds are
+    recorded as specs are generated. Entries of specs whose size or modification time changed are reset. The index
+    estimates how long each spec takes to generate, from its last generation time, or from its size and the seconds
+    per byte of the timed specs, which ParallelPayloadGenerator uses to schedule the longest specs first and
+    Progress to estimate the remaining time of a run.
+    """
+
+    def __init__(self, path: Optional[Path] = None):
+        # in memory only when path is None
+        self.path = Path(path) if path else None
+        self.specs = {}
+        self.log = logging.getLogger("privy")
+        if self.path and self.path.exists():
+            try:
+                index = json.loads(self.path.read_text())
+                if index.get("version") == INDEX_VERSION:
+                    self.specs = index["specs"]
+            except (ValueError, KeyError):
+                self.log.warning(f"Ignoring unreadable corpus index {self.path}")
+
+    def scan(self, api_specs: list[Path], api_specs_folder: Path) -> None:
+        """Record the size of every spec, resetting the entries of specs that changed since they were indexed"""
+        for file in api_specs:
+            stat = Path(file).stat()
+            key = spec_key(file, api_specs_folder)
+            entry = self.specs.get(key)
+            if entry is None or entry["size"] != stat.st_size or entry["mtime_ns"] != stat.st_mtime_ns:
+                self.specs[key] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+    def record(self, key: str, seconds: float, operations: Optional[int] = None,
+               parameters: Optional[int] = None) -> None:
+        """Record the generation time of a scanned spec, and its operation and parameter counts if they are known,
+        i.e. unless its worker was killed"""
+        entry = self.specs.get(key)
+        if entry is None:
+            return
+        entry["seconds"] = round(seconds, 3)
+        if operations is not None:
+            entry.update(operations=operations, parameters=parameters)
+
+    def seconds_per_byte(self) -> float:
+        timed = [entry for entry in self.specs.values() if "seconds" in entry]
+        num_bytes = sum(entry["size"] for entry in timed)
+        if not num_bytes:
+            return DEFAULT_SECONDS_PER_BYTE
+        return sum(entry["seconds"] for entry in timed) / num_bytes
+
+    def estimates(self, api_specs: list[Path], api_specs_folder: Path) -> dict[Path, float]:
+        """Estimated seconds to generate each of the given scanned specs"""
+        seconds_per_byte = self.seconds_per_byte()
+        estimates = {}
+        for file in api_specs:
+            entry = self.specs[spec_key(file, api_specs_folder)]
+            estimates[file] = entry.get("seconds", entry["size"] * seconds_per_byte)
+        return estimates
+
+    def save(self) -> None:
+        if self.path is None:
+            return
+        with atomic_write(self.path) as f:
+            json.dump({"version": INDEX_VERSION, "specs": self.specs}, f, sort_keys=True)
+
+
+def longest_first(api_specs: list[Path], estimates: dict[Path, float]) -> list[Path]:
+    """Order specs by decreasing estimated generation time, so that a pool of workers doesn't end the run with one
+    worker generating a giant spec while the others sit idle"""
+    return sorted(api_specs, key=lambda file: -estimates[file])
+
+
+class Progress:
+    """Estimate the remaining time of a run from the estimated generation times of its specs left, calibrated by
+    how long the specs completed so far actually took compared to their estimates, and spread over the workers"""
+
+    def __init__(self, estimates: dict[Path, float], num_workers: int = 1):
+        self.remaining = dict(estimates)
+        self.estimated_remaining = sum(self.remaining.values())
+        self.num_workers = max(num_workers, 1)
+        self.estimated_done = 0.0
+        self.seconds_done = 0.0
+
+    def done(self, file: Path, seconds: float) -> None:
+        estimate = self.remaining.pop(file, 0.0)
+        self.estimated_remaining -= estimate
+        self.estimated_done += estimate
+        self.seconds_done += seconds
+
+    def eta(self) -> timedelta:
+        if not self.remaining:
+            return timedelta(0)
+        seconds = max(self.estimated_remaining, 0.0) / self.num_workers
+        if self.estimated_done:
+            seconds *= self.seconds_done / self.estimated_done
+        return timedelta(seconds=round(seconds))
+
+    def text(self) -> str:
+        return f"ETA {self.eta()}"
@@ -0,0 +1,140 @@
+# Copyright 2018- The Pixie Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# SPDX-License-Identifier: Apache-2.0
+
+import hashlib
+import json
+import logging
+import math
+from pathlib import Path
+from typing import Optional
+
+from privy.generate.utils import atomic_write
+
+# version of the state file format written by TemplateDeduplicator.save
+STATE_VERSION = 1
+# probability that the bloom filter reports a template it has never seen as a duplicate, at full capacity
+BLOOM_ERROR_RATE = 1e-6
+FINGERPRINT_SIZE = 16
+
+
+def fingerprint(payload_template: str) -> bytes:
+    """128-bit fingerprint of a serialized payload template"""
+    return hashlib.blake2b(payload_template.encode(), digest_size=FINGERPRINT_SIZE).digest()
+
+
+class BloomFilter:
+    """Fixed-size bloom filter over template fingerprints, sized for capacity entries at BLOOM_ERROR_RATE."""
+
+    def __init__(self, capacity: int = 0, num_bits: int = 0, num_hashes: int = 0):
+        self.num_bits = num_bits or max(8, math.ceil(-capacity * math.log(BLOOM_ERROR_RATE) / math.log(2) ** 2))
+        self.num_hashes = num_hashes or max(1, round(self.num_bits / capacity * math.log(2)))
+        self.bits = bytearray((self.num_bits + 7) // 8)
+
+    def positions(self, fingerprint: bytes) -> list[int]:
+        # the fingerprint is already a uniform hash, so derive all bit positions from its two halves
+        h1 = int.from_bytes(fingerprint[:8], "little")
+        h2 = int.from_bytes(fingerprint[8:], "little") | 1
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+
+    def add(self, fingerprint: bytes) -> bool:
+        """Set the bits of fingerprint, returning whether any of them was unset, i.e. fingerprint is new."""
+        new = False
+        for position in self.positions(fingerprint):
+            mask = 1 << (position & 7)
+            if not self.bits[position >> 3] & mask:
+                self.bits[position >> 3] |= mask
+                new = True
+        return new
+
+    def __contains__(self, fingerprint: bytes) -> bool:
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self.positions(fingerprint))
+
+
+class TemplateDeduplicator:
+    """Set of the payload templates generated so far, optionally persisted across runs.
+
+    Templates are kept as 128-bit fingerprints rather than as their serialized text, so memory grows by a fixed
+    amount per template instead of with template size. For very large runs, bloom_capacity switches to a bloom
+    filter of fixed size, at the cost of dropping a unique template with probability BLOOM_ERROR_RATE.
+
+    When state_file is given, fingerprints of a previous run are loaded from it, so that an incremental run (e.g.
+    after adding specs) skips templates that run already emitted, and save writes the updated state back. State
+    files should only be shared between runs with the same --generate_types.
+    """
+
+    def __init__(self, bloom_capacity: int = 0, state_file: Optional[Path] = None):
+        self.state_file = Path(state_file) if state_file else None
+        self.fingerprints = set()
+        self.bloom = BloomFilter(bloom_capacity) if bloom_capacity else None
+        self.count = 0
+        # when set (see privy.manifest), new fingerprints are also appended to this binary file
+        self.journal = None
+        self.log = logging.getLogger("privy")
+        if self.state_file and self.state_file.exists():
+            self.load()
+
+    def add(self, fingerprint: bytes) -> bool:
+        """Record fingerprint, returning whether it was new."""
+        if self.bloom is not None:
+            new = self.bloom.add(fingerprint)
+        else:
+            new = fingerprint not in self.fingerprints
+            self.fingerprints.add(fingerprint)
+        self.count += new
+        if new and self.journal is not None:
+            self.journal.write(fingerprint)
+        return new
+
+    def __contains__(self, fingerprint: bytes) -> bool:
+        if self.bloom is not None:
+            return fingerprint in self.bloom
+        return fingerprint in self.fingerprints
+
+    def __len__(self) -> int:
+        return self.count
+
+    def load(self) -> None:
+        with open(self.state_file, "rb") as f:
+            header = json.loads(f.readline())
+            if header["version"] != STATE_VERSION:
+                raise ValueError(f"Unsupported dedup state version {header['version']} in {self.state_file}")
+            body = f.read()
+        if header["bloom"]:
+            if self.bloom is None:
+                raise ValueError(f"{self.state_file} holds a bloom filter, set --dedup_bloom_capacity to use it")
+            # keep the geometry of the stored filter, whatever capacity this run asked for
+            self.bloom = BloomFilter(num_bits=header["bloom"]["bits"], num_hashes=header["bloom"]["hashes"])
+            self.bloom.bits[:] = body
+            self.count = header["count"]
+        else:
+            for i in range(0, len(body), FINGERPRINT_SIZE):
+                self.add(body[i:i + FINGERPRINT_SIZE])
+        self.log.info(f"Loaded {self.count} payload template fingerprints from {self.state_file}")
+
+    def save(self) -> None:
+        """Atomically write the fingerprints to state_file"""
+        if not self.state_file:
+            return
+        header = {"version": STATE_VERSION, "count": self.count, "bloom": None}
+        if self.bloom is not None:
+            header["bloom"] = {"bits": self.bloom.num_bits, "hashes": self.bloom.num_hashes}
+            body = bytes(self.bloom.bits)
+        else:
+            body = b"".join(sorted(self.fingerprints))
+        with atomic_write(self.state_file, "wb") as f:
+            f.write(f"{json.dumps(header)}\n".encode())
+            f.write(body)
+        self.log.info(f"Saved {self.count} payload template fingerprints to {self.state_file}")
@@ -15,20 +15,25 @@
 # SPDX-License-Identifier: Apache-2.0
 
 import argparse
-import csv
 import logging
 import tarfile
-from collections import defaultdict
 from pathlib import Path
 from typing import Any, Tuple
 
 import requests
 
-from privy.generate.utils import (PrivyFileType, PrivyWriter, check_percentage,
-                                  check_positive)
+from privy.generate.utils import (check_file_size, check_non_negative,
+                                  check_percentage, check_positive)
+from privy.generate.writers import (COMPRESSIONS, OUTPUT_FORMATS,
+                                    get_out_files, open_privy_writers)
+from privy.hooks import PARAMETER_TYPES
+from privy.manifest import RunManifest, resume_options
+from privy.markup import HTML_LAYOUTS, XML_ATTRIBUTE_STYLES
+from privy.parallel import ParallelPayloadGenerator
 from privy.payload import PayloadGenerator
-from privy.providers.english_us import English_US
-from privy.providers.german_de import German_DE
+from privy.providers.regions import REGIONS, load_region
+from privy.sql import SQL_DIALECTS
+from privy.watchdog import OFFENDERS_FILE, read_offenders
 
 
 def parse_args():
@@ -58,10 +63,7 @@ def parse_args():
         "--region",
         "-r",
         required=False,
-        choices=[
-            "english_us",
-            "german_de",
-        ],
+        choices=list(REGIONS),
         default="english_us",
         help="""Which language/region specific providers to use for PII generation.""",
     )
@@ -88,6 +90,77 @@ def parse_args():
         help="Absolute path to output folder. By default, saves to bazel cache for this runtime.",
     )
 
+    parser.add_argument(
+        "--output_format",
+        "-of",
+        required=False,
+        choices=OUTPUT_FORMATS,
+        default="csv",
+        help="""Format of the output files. csv writes payloads to csv files quoted with |, templates to text files
+        and spans to json lines files. jsonl writes json lines and parquet writes parquet files, both with typed
+        has_pii, pii_types and spans fields.""",
+    )
+
+    parser.add_argument(
+        "--sql_dialects",
+        nargs="+",
+        required=False,
+        choices=list(SQL_DIALECTS),
+        default=list(SQL_DIALECTS),
+        help="SQL dialects to write sql payloads in, choosing one at random for every query.",
+    )
+
+    parser.add_argument(
+        "--xml_root",
+        required=False,
+        default="root",
+        help="""Name of the root element of xml payloads, which is preceded by an XML declaration. Set to an empty
+        string to write the parameters of xml payloads without a root element or declaration.""",
+    )
+
+    parser.add_argument(
+        "--xml_attribute_style",
+        required=False,
+        choices=XML_ATTRIBUTE_STYLES,
+        default="type",
+        help="""Attributes of the elements of xml payloads. type adds a type attribute naming the type of each
+        value, e.g. <id type="str">, and none omits them.""",
+    )
+
+    parser.add_argument(
+        "--html_layout",
+        required=False,
+        choices=HTML_LAYOUTS,
+        default="rows",
+        help="""Layout of the tables of html payloads. rows puts each parameter in its own row of name and value,
+        columns puts the parameter names in the header row and their values in the row below.""",
+    )
+
+    parser.add_argument(
+        "--html_table_attributes",
+        required=False,
+        default='border="1"',
+        help="Attributes of the table elements of html payloads.",
+    )
+
+    parser.add_argument(
+        "--compression",
+        "-c",
+        required=False,
+        choices=COMPRESSIONS,
+        default="none",
+        help="Compression of jsonl and parquet output files.",
+    )
+
+    parser.add_argument(
+        "--max_file_size",
+        required=False,
+        default=0,
+        type=check_file_size,
+        help="""Roll jsonl and parquet output over to a new numbered file once it reaches this size, e.g. 512M.
+        To disable, set to 0.""",
+    )
+
     parser.add_argument(
         "--api_specs",
         "-a",
@@ -96,6 +169,40 @@ def parse_args():
         help="Absolute path to folder to download openapi specs into. Privy checks if this folder already exists.",
     )
 
+    parser.add_argument(
+        "--spec_cache",
+        "-sc",
+        required=False,
+        default=None,
+        help="""Absolute path to folder to cache parsed openapi specs in, keyed by file content. Defaults to a
+        spec_cache folder in --api_specs.""",
+    )
+
+    parser.add_argument(
+        "--no_spec_cache",
+        action="store_true",
+        required=False,
+        default=False,
+        help="Parse every openapi spec from scratch instead of using the parsed spec cache.",
+    )
+
+    parser.add_argument(
+        "--corpus_index",
+        required=False,
+        default=None,
+        help="""Absolute path to the corpus index file, recording the size, operation count, parameter count and last
+        generation time of every openapi spec. Used to generate the longest specs first with --num_processes or
+        --multi_threaded, and to estimate the remaining time of a run. Defaults to corpus_index.json in --api_specs.""",
+    )
+
+    parser.add_argument(
+        "--no_corpus_index",
+        action="store_true",
+        required=False,
+        default=False,
+        help="Don't read or write the corpus index, estimating the generation time of every spec from its size.",
+    )
+
     parser.add_argument(
         "--fake_persons_file_path",
         "-fp",
@@ -113,6 +220,68 @@ def parse_args():
         help="Generate data multithreaded",
     )
 
+    parser.add_argument(
+        "--engine",
+        required=False,
+        choices=[
+            "direct",
+            "hypothesis",
+        ],
+        default="direct",
+        help="""How to build payload templates for each API operation. direct walks the operation's parameters and
+        assigns data providers to them, only using hypothesis to generate values for regex patterns. hypothesis draws
+        a full request for each operation with hypothesis and schemathesis first, which is much slower.""",
+    )
+
+    parser.add_argument(
+        "--parameter_types",
+        nargs="+",
+        required=False,
+        choices=PARAMETER_TYPES,
+        default=PARAMETER_TYPES,
+        help="""Types of API request parameters to generate payloads for. Each request yields one payload per type,
+        e.g. its query parameters or its request body, with nested objects and arrays in request bodies flattened
+        into dotted parameter names for sql and proto payloads.""",
+    )
+
+    parser.add_argument(
+        "--num_processes",
+        "-np",
+        required=False,
+        default=0,
+        type=check_non_negative,
+        help="""Generate data in a pool of this many worker processes, each writing its own shard of the dataset.
+        Shards are deduplicated and merged into the output files at the end. To disable, set to 0.""",
+    )
+
+    parser.add_argument(
+        "--spec_time_limit",
+        required=False,
+        default=0,
+        type=check_non_negative,
+        help="""Kill worker processes that spend more than this many seconds on one openAPI descriptor, keeping the
+        payloads they generated so far and recording the descriptor in out_folder/data/offenders.jsonl. Unlike
+        --timeout, this also stops descriptors stuck in a single operation. Requires --num_processes. To disable,
+        set to 0.""",
+    )
+
+    parser.add_argument(
+        "--spec_memory_limit",
+        required=False,
+        default=0,
+        type=check_non_negative,
+        help="""Kill worker processes using more than this many MiB of memory, like --spec_time_limit. Requires
+        --num_processes. To disable, set to 0.""",
+    )
+
+    parser.add_argument(
+        "--ignore_offenders",
+        action="store_true",
+        required=False,
+        help="""Add the openAPI descriptors recorded in out_folder/data/offenders.jsonl by earlier runs to
+        --ignore_spec.""",
+    )
+
     parser.add_argument(
         "--num_additional_pii_types",
         "-n",
@@ -149,7 +318,9 @@ def parse_args():
         "-p",
         nargs='+',
         required=False,
-        help="PII types to match and generate. If not specified, all available PII types will be matched.",
+        help="""PII types to match and generate. If not specified, all available PII types will be matched. Other
+        PII types are generated as non-PII, and specs and operations without any parameters matching the given
+        PII types are skipped.""",
     )
 
     parser.add_argument(
@@ -171,6 +342,82 @@ def parse_args():
         to generate per unique payload template.""",
     )
 
+    parser.add_argument(
+        "--value_pool_size",
+        "-vp",
+        required=False,
+        default=0,
+        type=check_non_negative,
+        help="""Sample the values of each data provider from a pool of this many values, generated in bulk on first
+        use, instead of generating a new value every time. Larger pools give more varied datasets, smaller pools
+        generate faster. To disable, set to 0.""",
+    )
+
+    parser.add_argument(
+        "--dedup_state",
+        "-ds",
+        required=False,
+        default=None,
+        help="""Path to a file holding the fingerprints of the payload templates generated so far. Templates found in
+        it are skipped, and new ones are added to it at the end of the run, so that incremental runs (e.g. after
+        adding API specs) only generate new templates. Use one file per set of --generate_types.""",
+    )
+
+    parser.add_argument(
+        "--dedup_bloom_capacity",
+        "-dbc",
+        required=False,
+        default=0,
+        type=check_non_negative,
+        help="""Deduplicate payload templates with a fixed-size bloom filter sized for this many templates, instead of
+        an exact set of fingerprints that grows with the dataset. To disable, set to 0.""",
+    )
+
+    parser.add_argument(
+        "--seed",
+        required=False,
+        default=None,
+        type=int,
+        help="""Seed for python's, faker's and hypothesis' random number generators. Each spec is generated with
+        its own seed derived from this seed and the spec's path, so seeded single process runs are reproducible.""",
+    )
+
+    parser.add_argument(
+        "--shard_index",
+        required=False,
+        default=0,
+        type=check_non_negative,
+        help="""Index of the shard of openapi specs to generate, between 0 and shard_count - 1. Specs are assigned to
+        shards deterministically, balancing the total spec size per shard.""",
+    )
+
+    parser.add_argument(
+        "--shard_count",
+        required=False,
+        default=1,
+        type=check_positive,
+        help="""Number of shards to split the openapi specs into, e.g. one per machine of a distributed run.
+        Output files of sharded runs are suffixed with the shard index.""",
+    )
+
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        required=False,
+        help="""Resume an interrupted run from the manifest it wrote to out_folder, skipping the specs it completed and
+        dropping the records of the spec it was interrupted in. Must be run with the same arguments.""",
+    )
+
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        required=False,
+        help="""Record the time spent per openAPI descriptor in each phase of generation (loading the descriptor,
+        hypothesis draws, assigning providers, converting and parsing templates, writing output), the number of
+        payloads, templates and spans generated and the peak memory use in out_folder/data/profile.json, and log the
+        slowest descriptors. Not supported by --multi_threaded.""",
+    )
+
     parser.add_argument(
         "--ignore_spec",
         "-ig",
@@ -180,30 +427,40 @@ def parse_args():
         help="OpenAPI specs to ignore. If not specified, all specs will be matched.",
     )
 
-    return parser.parse_args()
+    args = parser.parse_args()
+    if args.shard_index >= args.shard_count:
+        parser.error(f"--shard_index {args.shard_index} must be less than --shard_count {args.shard_count}")
+    if args.output_format == "csv" and (args.compression != "none" or args.max_file_size):
+        parser.error("--compression and --max_file_size require --output_format jsonl or parquet")
+    if (args.spec_time_limit or args.spec_memory_limit) and not args.num_processes:
+        parser.error("--spec_time_limit and --spec_memory_limit require --num_processes")
+    if args.resume and (args.num_processes or args.multi_threaded or args.output_format == "parquet"):
+        parser.error("--resume is only supported by single-threaded runs with --output_format csv or jsonl")
+    if args.profile and args.multi_threaded:
+        parser.error("--profile is not supported by --multi_threaded")
+    return args
 
 
-def generate(args: argparse.Namespace, out_files: dict[str, Tuple[Any]], api_specs_folder: Path) -> None:
-    headers = ["payload", "has_pii", "pii_types"]
-    file_writers = defaultdict(list)
+def generate(args: argparse.Namespace, out_files: dict[str, Tuple[Any]], api_specs_folder: Path,
+             manifest_path: Path) -> None:
+    api_specs_folder = api_specs_folder / "APIs"
+    if args.num_processes:
+        ParallelPayloadGenerator(api_specs_folder, out_files, args).generate_payloads()
+        return
+    manifest, resuming = None, False
+    # parquet files can't be appended to, and threads complete specs out of order, so those runs aren't checkpointed
+    if not args.multi_threaded and args.output_format != "parquet":
+        manifest = RunManifest(manifest_path, resume_options(args))
+        resuming = manifest.start(args.resume)
     try:
-        for generate_type, out_files in out_files.items():
-            for file in out_files:
-                file_type, file_path = file[0], file[1]
-                Path(file_path).parent.mkdir(parents=True, exist_ok=True)
-                open_file = open(file_path, 'w')
-                csv_writer = csv.writer(open_file, quotechar="|")
-                if file_type == PrivyFileType.PAYLOADS:
-                    csv_writer.writerow(headers)
-                file_writers[generate_type].append(PrivyWriter(file_type, open_file, csv_writer))
-        api_specs_folder = api_specs_folder / "APIs"
-        payload_generator = PayloadGenerator(api_specs_folder, file_writers, args)
-        payload_generator.generate_payloads()
-    # ------ Close File Handles --------
+        with open_privy_writers(out_files, mode="a" if resuming else "w", write_header=not resuming,
+                                output_format=args.output_format, compression=args.compression,
+                                max_file_size=args.max_file_size) as file_writers:
+            payload_generator = PayloadGenerator(api_specs_folder, file_writers, args, manifest)
+            payload_generator.generate_payloads()
     finally:
-        for writers in file_writers.values():
-            for privy_writer in writers:
-                privy_writer.open_file.close()
+        if manifest:
+            manifest.close()
 
 
 def main(args):
@@ -225,25 +482,36 @@ def main(args):
         with requests.get(openapi_directory_link, stream=True) as rx, tarfile.open(fileobj=rx.raw, mode="r:gz") as tar:
             tar.extractall(api_specs_folder.parent)
 
+    # ------ Parsed OpenAPI spec cache -------
+    if args.no_spec_cache:
+        args.spec_cache = None
+    elif args.spec_cache is None:
+        args.spec_cache = Path(args.api_specs) / "spec_cache"
+
+    # ------ Spec sizes and generation times -------
+    if args.no_corpus_index:
+        args.corpus_index = None
+    elif args.corpus_index is None:
+        args.corpus_index = Path(args.api_specs) / "corpus_index.json"
+
+    # ------ Skip descriptors killed in earlier runs -------
+    if args.ignore_offenders:
+        offenders = read_offenders(Path(args.out_folder) / "data" / OFFENDERS_FILE)
+        args.ignore_spec = sorted(set(args.ignore_spec) | {offender["spec"] for offender in offenders})
+        log.info(f"Ignoring {len(offenders)} descriptors recorded in {OFFENDERS_FILE}")
+
     # ------- Choose Providers --------
-    args.region = {
-        "english_us": English_US,
-        "german_de": German_DE,
-    }.get(args.region)(pii_types=args.pii_types)
+    args.region_name = args.region
+    args.region = load_region(args.region_name, args.pii_types, args.value_pool_size)
 
     # ------ Initialize File Handles --------
-    out_files = {}
     for generate_type in args.generate_types:
         log.info(f"Generating {generate_type.upper()} dataset")
-        payloads_file = Path(args.out_folder) / "data" / \
-            f"{generate_type.lower()}-payloads.csv"
-        templates_file = Path(args.out_folder) / "data" / \
-            f"{generate_type.lower()}-templates.txt"
-        spans_file = Path(args.out_folder) / "data" / \
-            f"{generate_type.lower()}-spans.json"
-        out_files[generate_type] = [(PrivyFileType.PAYLOADS, payloads_file), (PrivyFileType.TEMPLATES, templates_file),
-                                    (PrivyFileType.SPANS, spans_file)]
-    generate(args, out_files, api_specs_folder)
+    suffix = f"-{args.shard_index:05d}-of-{args.shard_count:05d}" if args.shard_count > 1 else ""
+    out_folder = Path(args.out_folder) / "data"
+    out_files = get_out_files(out_folder, args.generate_types, suffix, args.output_format, args.compression)
+    args.profile = out_folder / f"profile{suffix}.json" if args.profile else None
+    generate(args, out_files, api_specs_folder, out_folder / f"manifest{suffix}.jsonl")
 
 
 if __name__ == "__main__":
@@ -15,9 +15,31 @@
 # SPDX-License-Identifier: Apache-2.0
 
 import argparse
+import base64
+import json
+import os
+import tempfile
+from contextlib import contextmanager
 from dataclasses import dataclass
 from enum import Enum
-from typing import Any, TextIO
+from pathlib import Path
+from typing import IO, Any, Iterator, TextIO
+
+
+@contextmanager
+def atomic_write(path: Path, mode: str = "w") -> Iterator[IO]:
+    """Open a temporary file next to path for writing, and replace path with it once the block completes, so that
+    readers, e.g. concurrent workers, never see a partially written file and an interrupted write keeps the
+    previous one intact"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    try:
+        with os.fdopen(fd, mode) as f:
+            yield f
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
 
 
 def check_positive(arg) -> int:
@@ -27,6 +49,13 @@ def check_positive(arg) -> int:
     return iarg
 
 
+def check_non_negative(arg) -> int:
+    iarg = int(arg)
+    if iarg < 0:
+        raise argparse.ArgumentTypeError(f"{arg} must be a non-negative int")
+    return iarg
+
+
 def check_percentage(arg) -> int:
     iarg = int(arg)
     if iarg < 0 or iarg > 99:
@@ -35,17 +64,73 @@ def check_percentage(arg) -> int:
     return iarg
 
 
+def check_file_size(arg) -> int:
+    """Parse a file size in bytes, optionally with a K, M or G suffix, e.g. 512M"""
+    units = {"k": 1 << 10, "m": 1 << 20, "g": 1 << 30}
+    size = str(arg).strip().lower().removesuffix("b")
+    try:
+        isize = int(float(size[:-1]) * units[size[-1]]) if size and size[-1] in units else int(size)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"{arg} must be a file size like 1000000, 512M or 2G") from None
+    if isize < 0:
+        raise argparse.ArgumentTypeError(f"{arg} must be a non-negative file size")
+    return isize
+
+
 class PrivyFileType(Enum):
     """Enum for the different types of http parameters that can be generated.
     Used to keep track of the pii types generated for each payload."""
     PAYLOADS = 1
     TEMPLATES = 2
     SPANS = 3
+    # binary payloads with the byte offsets of their spans, only written for binary generate types, e.g. proto
+    BINARY = 4
+
+
+def binary_record(payload: bytes, spans: list[dict], message: str, template_id: int, encode: bool = False) -> dict:
+    """Record of a binary payload, with the payload base64 encoded for text formats if encode is set."""
+    return {
+        "payload": base64.b64encode(payload).decode() if encode else payload,
+        "spans": spans,
+        "message": message,
+        "template_id": template_id,
+    }
 
 
 @dataclass()
 class PrivyWriter:
-    """PrivyWriter holds the open file and csv writer for output data files."""
+    """PrivyWriter holds the open file and csv writer for output data files.
+
+    Payloads are written as csv rows quoted with |, templates as lines of text, and spans and binary payloads as json
+    lines, the latter base64 encoded. See privy.generate.writers for the compressed json lines and parquet writers,
+    which share the write_* interface."""
     file_type: PrivyFileType
     open_file: TextIO
     csv_writer: Any
+
+    def write_payload(self, payload: str, has_pii: bool, pii_types: list[str]) -> None:
+        self.csv_writer.writerow([payload, str(int(has_pii)), ",".join(pii_types)])
+
+    def write_template(self, template: str) -> None:
+        self.open_file.write(f"{template}\n")
+
+    def write_span(self, span) -> None:
+        """Write a presidio FakerSpansResult."""
+        self.open_file.write(f"{span.toJSON()}\n")
+
+    def write_binary(self, payload: bytes, spans: list[dict], message: str, template_id: int) -> None:
+        """Write a binary payload, e.g. a serialized protobuf message, with the byte offsets of its spans."""
+        self.open_file.write(f"{json.dumps(binary_record(payload, spans, message, template_id, encode=True))}\n")
+
+    def checkpoint(self) -> dict:
+        """Flush written records, returning the state resume needs to truncate the file back to this point."""
+        self.open_file.flush()
+        return {"offset": self.open_file.tell()}
+
+    def resume(self, state: dict) -> None:
+        """Drop records written after the checkpoint state, for a file opened in append mode."""
+        self.open_file.truncate(state["offset"])
+        self.open_file.seek(0, os.SEEK_END)
+
+    def close(self) -> None:
+        self.open_file.close()
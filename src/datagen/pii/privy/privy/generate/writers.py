@@ -0,0 +1,343 @@
+# Copyright 2018- The Pixie Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# SPDX-License-Identifier: Apache-2.0
+
+import base64
+import csv
+import dataclasses
+import gzip
+import io
+import json
+import os
+from collections import defaultdict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+import zstandard
+
+from privy.generate.utils import PrivyFileType, PrivyWriter, binary_record
+
+PAYLOAD_HEADERS = ["payload", "has_pii", "pii_types"]
+OUTPUT_FORMATS = ["csv", "jsonl", "parquet"]
+COMPRESSIONS = ["none", "gzip", "zstd"]
+# generate types that are also written as binary payloads
+BINARY_GENERATE_TYPES = ["proto"]
+# output is written to disk in blocks of this many bytes
+WRITE_BUFFER_SIZE = 1 << 20
+# records buffered in memory before they are written out as one parquet row group
+PARQUET_ROW_GROUP_SIZE = 1 << 16
+
+
+def file_extensions(output_format: str, compression: str = "none") -> dict[PrivyFileType, str]:
+    if output_format == "csv":
+        return {PrivyFileType.PAYLOADS: ".csv", PrivyFileType.TEMPLATES: ".txt", PrivyFileType.SPANS: ".json",
+                PrivyFileType.BINARY: ".json"}
+    if output_format == "jsonl":
+        extension = {"none": ".jsonl", "gzip": ".jsonl.gz", "zstd": ".jsonl.zst"}[compression]
+    else:
+        extension = ".parquet"
+    return {file_type: extension for file_type in PrivyFileType}
+
+
+def get_out_files(out_folder: Path, generate_types: list[str], suffix: str = "", output_format: str = "csv",
+                  compression: str = "none") -> dict[str, list[tuple[PrivyFileType, Path]]]:
+    """Map each generate type to the payloads, templates and spans files, and binary payloads file of binary generate
+    types, it is written to in out_folder."""
+    extensions = file_extensions(output_format, compression)
+    out_files = {}
+    for generate_type in generate_types:
+        out_files[generate_type] = [
+            (file_type, Path(out_folder) / f"{generate_type.lower()}-{file_type.name.lower()}{suffix}{extension}")
+            for file_type, extension in extensions.items()
+            if file_type != PrivyFileType.BINARY or generate_type in BINARY_GENERATE_TYPES
+        ]
+    return out_files
+
+
+def span_to_dict(span) -> dict:
+    """Convert a presidio FakerSpansResult into a dict with a list of span dicts, instead of a json encoded string."""
+    return {
+        "fake": span.fake,
+        "spans": [dataclasses.asdict(s) for s in span.spans],
+        "template": span.template,
+        "template_id": span.template_id,
+    }
+
+
+class RollingFile:
+    """Binary output file that rolls over to a new numbered part once max_file_size bytes have been written to it.
+
+    With max_file_size 0, path is written to directly. Otherwise parts are named like json-payloads-00001.jsonl.gz.
+    Sizes are those of the (compressed) bytes handed to the OS so far, so parts may exceed max_file_size by up to
+    one buffered block."""
+
+    def __init__(self, path: Path, max_file_size: int = 0):
+        self.path = Path(path)
+        self.max_file_size = max_file_size
+        self.part = -1
+        self.raw = None
+        # size of the part the next open appends to, set by resume
+        self.append_offset = 0
+
+    def part_path(self) -> Path:
+        if not self.max_file_size:
+            return self.path
+        name, _, extension = self.path.name.partition(".")
+        return self.path.with_name(f"{name}-{self.part:05d}.{extension}")
+
+    def open(self) -> io.BufferedWriter:
+        """Start the next part, returning the buffered raw file to write it to."""
+        self.part += 1
+        path = self.part_path()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        if self.append_offset:
+            self.raw = open(path, "ab", buffering=WRITE_BUFFER_SIZE)
+            self.raw.truncate(self.append_offset)
+            self.raw.seek(0, os.SEEK_END)
+            self.append_offset = 0
+        else:
+            self.raw = open(path, "wb", buffering=WRITE_BUFFER_SIZE)
+        return self.raw
+
+    def checkpoint(self) -> dict:
+        """Flush the current part, returning the part and size that resume truncates the output back to."""
+        if self.raw is None:
+            # the next write starts a new part
+            return {"part": self.part + 1, "offset": 0}
+        self.raw.flush()
+        return {"part": self.part, "offset": self.raw.tell()}
+
+    def resume(self, state: dict) -> None:
+        """Continue writing from a checkpoint, deleting any part started after it."""
+        part, offset = state["part"], state["offset"]
+        if self.max_file_size:
+            self.part = part + 1 if offset else part
+            while self.part_path().exists():
+                os.unlink(self.part_path())
+                self.part += 1
+        elif not offset and self.path.exists():
+            os.unlink(self.path)
+        self.part = part - 1
+        self.append_offset = offset
+
+    def full(self) -> bool:
+        return bool(self.max_file_size) and self.raw.tell() >= self.max_file_size
+
+    def close(self) -> None:
+        if self.raw is not None:
+            self.raw.close()
+            self.raw = None
+
+
+class JSONLWriter:
+    """Write payloads, templates or spans as (gzip or zstd compressed) json lines with typed fields.
+
+    payloads: {"payload": str, "has_pii": bool, "pii_types": [str]}
+    templates: {"template": str}
+    spans: {"fake": str, "spans": [{"value": str, "start": int, "end": int, "type": str}], "template": str,
+            "template_id": int}
+    binary: {"payload": base64 encoded str, "spans": [{"value": str, "start": int, "end": int, "type": str}],
+             "message": str, "template_id": int}, with the start and end byte offsets of spans in the payload
+    """
+
+    def __init__(self, file_type: PrivyFileType, path: Path, compression: str = "none", max_file_size: int = 0):
+        self.file_type = file_type
+        self.compression = compression
+        self.file = RollingFile(path, max_file_size)
+        self.stream = None
+
+    def open_stream(self):
+        raw = self.file.raw or self.file.open()
+        if self.compression == "gzip":
+            return gzip.GzipFile(fileobj=raw, mode="wb")
+        if self.compression == "zstd":
+            return zstandard.ZstdCompressor().stream_writer(raw, closefd=False)
+        return raw
+
+    def end_stream(self) -> None:
+        """Finish the compressed stream, e.g. a gzip member, leaving the underlying file open."""
+        if self.stream is not None and self.stream is not self.file.raw:
+            self.stream.close()
+        self.stream = None
+
+    def close_stream(self) -> None:
+        self.end_stream()
+        self.file.close()
+
+    def write_record(self, record: dict) -> None:
+        if self.stream is None:
+            self.stream = self.open_stream()
+        self.stream.write(json.dumps(record, default=str).encode() + b"\n")
+        if self.file.full():
+            self.close_stream()
+
+    def write_payload(self, payload: str, has_pii: bool, pii_types: list[str]) -> None:
+        self.write_record({"payload": payload, "has_pii": has_pii, "pii_types": pii_types})
+
+    def write_template(self, template: str) -> None:
+        self.write_record({"template": template})
+
+    def write_span(self, span) -> None:
+        self.write_record(span_to_dict(span))
+
+    def write_binary(self, payload: bytes, spans: list[dict], message: str, template_id: int) -> None:
+        self.write_record(binary_record(payload, spans, message, template_id, encode=True))
+
+    def checkpoint(self) -> dict:
+        # gzip members and zstd frames can be concatenated, so end the current one and append a new one on resume
+        self.end_stream()
+        return self.file.checkpoint()
+
+    def resume(self, state: dict) -> None:
+        self.file.resume(state)
+
+    def close(self) -> None:
+        self.close_stream()
+
+
+class ParquetWriter:
+    """Write payloads, templates, spans or binary payloads to parquet files with the same typed columns as JSONLWriter,
+    except for binary payloads, which aren't base64 encoded.
+
+    Records are buffered column-wise and written as one row group every PARQUET_ROW_GROUP_SIZE records."""
+
+    def __init__(self, file_type: PrivyFileType, path: Path, compression: str = "none", max_file_size: int = 0):
+        self.file_type = file_type
+        self.compression = compression
+        self.file = RollingFile(path, max_file_size)
+        self.writer = None
+        self.schema = {
+            PrivyFileType.PAYLOADS: pa.schema([
+                ("payload", pa.string()),
+                ("has_pii", pa.bool_()),
+                ("pii_types", pa.list_(pa.string())),
+            ]),
+            PrivyFileType.TEMPLATES: pa.schema([("template", pa.string())]),
+            PrivyFileType.SPANS: pa.schema([
+                ("fake", pa.string()),
+                ("spans", pa.list_(pa.struct([
+                    ("value", pa.string()),
+                    ("start", pa.int64()),
+                    ("end", pa.int64()),
+                    ("type", pa.string()),
+                ]))),
+                ("template", pa.string()),
+                ("template_id", pa.int64()),
+            ]),
+            PrivyFileType.BINARY: pa.schema([
+                ("payload", pa.binary()),
+                ("spans", pa.list_(pa.struct([
+                    ("value", pa.string()),
+                    ("start", pa.int64()),
+                    ("end", pa.int64()),
+                    ("type", pa.string()),
+                ]))),
+                ("message", pa.string()),
+                ("template_id", pa.int64()),
+            ]),
+        }[file_type]
+        self.columns = {name: [] for name in self.schema.names}
+        self.num_buffered = 0
+
+    def write_record(self, record: dict) -> None:
+        for name, values in self.columns.items():
+            values.append(record[name])
+        self.num_buffered += 1
+        if self.num_buffered >= PARQUET_ROW_GROUP_SIZE:
+            self.flush()
+
+    def flush(self) -> None:
+        if not self.num_buffered:
+            return
+        if self.writer is None:
+            self.writer = pq.ParquetWriter(self.file.open(), self.schema, compression=self.compression.upper())
+        self.writer.write_table(pa.table(self.columns, schema=self.schema))
+        self.columns = {name: [] for name in self.schema.names}
+        self.num_buffered = 0
+        if self.file.full():
+            self.close_part()
+
+    def close_part(self) -> None:
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+        self.file.close()
+
+    def write_payload(self, payload: str, has_pii: bool, pii_types: list[str]) -> None:
+        self.write_record({"payload": payload, "has_pii": has_pii, "pii_types": pii_types})
+
+    def write_template(self, template: str) -> None:
+        self.write_record({"template": template})
+
+    def write_span(self, span) -> None:
+        self.write_record(span_to_dict(span))
+
+    def write_binary(self, payload: bytes, spans: list[dict], message: str, template_id: int) -> None:
+        self.write_record(binary_record(payload, spans, message, template_id))
+
+    def close(self) -> None:
+        self.flush()
+        self.close_part()
+
+
+def open_writer(file_type: PrivyFileType, file_path: Path, mode: str = "w", write_header: bool = True,
+                output_format: str = "csv", compression: str = "none", max_file_size: int = 0):
+    if output_format == "jsonl":
+        return JSONLWriter(file_type, file_path, compression, max_file_size)
+    if output_format == "parquet":
+        return ParquetWriter(file_type, file_path, compression, max_file_size)
+    Path(file_path).parent.mkdir(parents=True, exist_ok=True)
+    open_file = open(file_path, mode, buffering=WRITE_BUFFER_SIZE)
+    csv_writer = csv.writer(open_file, quotechar="|")
+    if write_header and file_type == PrivyFileType.PAYLOADS:
+        csv_writer.writerow(PAYLOAD_HEADERS)
+    return PrivyWriter(file_type, open_file, csv_writer)
+
+
+@contextmanager
+def open_privy_writers(out_files: dict[str, list[tuple[PrivyFileType, Path]]], mode: str = "w",
+                       write_header: bool = True, output_format: str = "csv", compression: str = "none",
+                       max_file_size: int = 0) -> Iterator[dict[str, list[PrivyWriter]]]:
+    """Open a writer of output_format for every output file, closing all of them on exit.
+
+    The csv format appends to existing files with mode "a". jsonl and parquet files are always created from scratch,
+    and rolled over to a new part every max_file_size bytes if given."""
+    file_writers = defaultdict(list)
+    try:
+        for generate_type, files in out_files.items():
+            for file_type, file_path in files:
+                file_writers[generate_type].append(open_writer(
+                    file_type, file_path, mode, write_header, output_format, compression, max_file_size))
+        yield file_writers
+    finally:
+        for writers in file_writers.values():
+            for privy_writer in writers:
+                privy_writer.close()
+
+
+def read_binary_record(line: str) -> dict:
+    """Inverse of PrivyWriter.write_binary for a line of a csv format binary payloads file."""
+    record = json.loads(line)
+    record["payload"] = base64.b64decode(record["payload"])
+    return record
+
+
+def read_csv_payload(row: list[str]) -> tuple[str, bool, list[str]]:
+    """Inverse of PrivyWriter.write_payload for a row read with csv.reader(quotechar="|")."""
+    payload, has_pii, pii_types = row
+    return payload, has_pii == "1", pii_types.split(",") if pii_types else []
@@ -15,16 +15,19 @@
 # SPDX-License-Identifier: Apache-2.0
 
 import ast
+import dataclasses
 import logging
 import random
 from copy import deepcopy
 from enum import Enum
-from typing import Optional, Tuple, Union
+from typing import Any, Optional, Tuple, Union
 
 import schemathesis
-from hypothesis import given
+from hypothesis import given, seed
 from hypothesis import strategies as st
 
+from privy.profile import Profiler
+
 
 class ParamType(Enum):
     """Enum for the different types of http parameters that can be generated.
@@ -33,6 +36,28 @@ class ParamType(Enum):
     QUERY = 2
     HEADER = 3
     COOKIE = 4
+    BODY = 5
+
+
+# attribute holding each type of parameter on a schemathesis APIOperation and Case
+PARAMETER_ATTRIBUTES = {
+    ParamType.PATH: "path_parameters",
+    ParamType.QUERY: "query",
+    ParamType.HEADER: "headers",
+    ParamType.COOKIE: "cookies",
+    ParamType.BODY: "body",
+}
+PARAMETER_TYPES = [parameter_type.name.lower() for parameter_type in ParamType]
+# how deeply nested objects, arrays and references of request body schemas are walked
+MAX_BODY_DEPTH = 8
+
+
+@dataclasses.dataclass()
+class CompiledOperation:
+    """Payload template of each type of parameter of an api operation, and the pii types each template contains"""
+
+    templates: dict[ParamType, dict]
+    pii_types: dict[ParamType, set[str]]
 
 
 class SchemaHooks:
@@ -54,26 +79,12 @@ class SchemaHooks:
             # overwrite default schemathesis strategies (data generators)
 
             def tune_case(case):
-                # -------- PATH PARAMETERS --------
-                for path_param in op.path_parameters:
-                    name = path_param.definition.get("name", None)
-                    enum = path_param.definition.get("enum", None)
-                    schema = path_param.definition.get("schema", None)
-                    type_ = path_param.definition.get("type", None)
-                    self.schema_analyzer.assign_parameters(
-                        name, enum, schema, type_, case.path_parameters, ParamType.PATH
-                    )
-                # -------- QUERY PARAMETERS --------
-                for query_param in op.query:
-                    name = query_param.definition.get("name", None)
-                    enum = query_param.definition.get("enum", None)
-                    schema = query_param.definition.get("schema", None)
-                    type_ = query_param.definition.get("type", None)
-                    self.schema_analyzer.assign_parameters(
-                        name, enum, schema, type_, case.query, ParamType.QUERY
-                    )
-                # todo @benkilimnik: generate cookies, headers
-                # todo @benkilimnik: parse multi-component schemas that have property params for each component
+                # path, query, header, cookie and body templates are compiled once per operation and reused by
+                # every case drawn for it
+                compiled = self.schema_analyzer.compile_operation(op)
+                self.schema_analyzer.load_operation(compiled)
+                for parameter_type, template in compiled.templates.items():
+                    setattr(case, PARAMETER_ATTRIBUTES[parameter_type], deepcopy(template))
                 return case
 
             return strategy.map(tune_case)
@@ -82,14 +93,16 @@ class SchemaHooks:
         """Analyze an openapi schema and assign pii values to the corresponding parameter_name in the case_attr"""
 
         def __init__(self, args):
-            self.pii_types = {
-                ParamType.PATH: set(),
-                ParamType.QUERY: set(),
-                ParamType.HEADER: set(),
-                ParamType.COOKIE: set(),
-            }
+            self.pii_types = {parameter_type: set() for parameter_type in ParamType}
+            # types of parameters to generate payloads for
+            self.parameter_types = [ParamType[parameter_type.upper()] for parameter_type in args.parameter_types]
+            # compiled operations of each spec by location, then http method and path
+            self.operations = {}
             self.providers = args.region
+            self.seeded = args.seed is not None
             self.log = logging.getLogger("privy")
+            # set by PayloadGenerator, see privy.profile
+            self.profiler = Profiler()
 
         def deepcopy_pii_types(self, parameter_type: ParamType) -> list[str]:
             """deepcopy pii_types list for a given parameter_type"""
@@ -111,6 +124,98 @@ class SchemaHooks:
         def clear_pii_types(self, parameter_type: ParamType) -> None:
             self.pii_types[parameter_type].clear()
 
+        def compile_operation(self, operation) -> CompiledOperation:
+            """resolve the full parameter tree of an api operation into a payload template for each parameter type,
+            once per operation, so that every case and augmented case of the operation reuses it. Values drawn from
+            enums and regex patterns are drawn once, too."""
+            operations = self.operations.setdefault(operation.schema.location, {})
+            key = (operation.method.upper(), operation.path)
+            compiled = operations.get(key)
+            if compiled is None:
+                compiled = CompiledOperation({}, {})
+                for parameter_type in self.parameter_types:
+                    self.clear_pii_types(parameter_type)
+                    if parameter_type == ParamType.BODY:
+                        compiled.templates[parameter_type] = self.assign_body(operation)
+                    else:
+                        compiled.templates[parameter_type] = self.assign_operation_parameters(
+                            getattr(operation, PARAMETER_ATTRIBUTES[parameter_type]), {}, parameter_type)
+                    compiled.pii_types[parameter_type] = self.deepcopy_pii_types(parameter_type)
+                operations[key] = compiled
+            return compiled
+
+        def load_operation(self, compiled: CompiledOperation) -> None:
+            """track the pii types of a compiled operation's templates as the pii types of the current case"""
+            for parameter_type, pii_types in compiled.pii_types.items():
+                self.overwrite_pii_types(parameter_type, set(pii_types))
+
+        def release_operations(self, location: str) -> None:
+            """drop the compiled operations of a spec once its payloads are generated"""
+            self.operations.pop(location, None)
+
+        def assign_body(self, operation) -> dict:
+            """assign providers to the request body of an api operation, preferring json bodies, and walking
+            nested objects and arrays. Bodies with an array at their root are represented by one item."""
+            bodies = sorted(operation.body, key=lambda body: "json" not in body.media_type)
+            if not bodies:
+                return {}
+            body = bodies[0]
+            if isinstance(body.definition, list):
+                # swagger 2.0 form data, a list of parameters
+                return self.assign_operation_parameters(body.definition, {}, ParamType.BODY)
+            with self.profiler.phase("hooks"):
+                template = self.assign_schema(None, body.definition.get("schema"), operation.schema.resolver, 0)
+            while isinstance(template, list):
+                template = template[0] if template else {}
+            return template if isinstance(template, dict) else {}
+
+        def assign_schema(self, name: Optional[str], schema: Optional[dict], resolver, depth: int) -> Any:
+            """assign providers to a json schema, returning a template of the same shape. Objects map each of their
+            properties to its template, arrays hold the template of one item, and the values of other schemas are
+            assigned like parameters named after the property or array they belong to."""
+            if not isinstance(schema, dict) or depth > MAX_BODY_DEPTH:
+                return None
+            if "$ref" in schema:
+                _, schema = resolver.resolve(schema["$ref"])
+                return self.assign_schema(name, schema, resolver, depth + 1)
+            for keyword in ["oneOf", "anyOf"]:
+                if schema.get(keyword):
+                    return self.assign_schema(name, schema[keyword][0], resolver, depth + 1)
+            if schema.get("allOf"):
+                template = {}
+                rest = {keyword: value for keyword, value in schema.items() if keyword != "allOf"}
+                for subschema in [*schema["allOf"], *([rest] if "properties" in rest else [])]:
+                    value = self.assign_schema(name, subschema, resolver, depth + 1)
+                    if isinstance(value, dict):
+                        template.update(value)
+                return template
+            if "properties" in schema or schema.get("type") == "object":
+                template = {}
+                for property_name, property_schema in (schema.get("properties") or {}).items():
+                    value = self.assign_schema(property_name, property_schema, resolver, depth + 1)
+                    if value is not None:
+                        template[property_name] = value
+                return template
+            if "items" in schema or schema.get("type") == "array":
+                value = self.assign_schema(name, schema.get("items"), resolver, depth + 1)
+                return [] if value is None else [value]
+            if not name:
+                return None
+            case_attr = {}
+            self.assign_parameters(name, schema.get("enum"), schema, schema.get("type"), case_attr, ParamType.BODY)
+            return case_attr.get(name)
+
+        def assign_operation_parameters(self, parameters, case_attr: dict, parameter_type: ParamType) -> dict:
+            """assign a provider to every parameter of an api operation (e.g. op.query) in the case_attr"""
+            with self.profiler.phase("hooks"):
+                for parameter in parameters:
+                    name = parameter.definition.get("name", None)
+                    enum = parameter.definition.get("enum", None)
+                    schema = parameter.definition.get("schema", None)
+                    type_ = parameter.definition.get("type", None)
+                    self.assign_parameters(name, enum, schema, type_, case_attr, parameter_type)
+            return case_attr
+
         def assign_parameters(self, name: str, enum: Optional[Union[str, list]], schema: Optional[dict],
                               type_: Optional[Union[str, bool]], case_attr: dict, parameter_type: ParamType):
             """assign a provider to a given parameter_name in the case_attr"""
@@ -125,6 +230,25 @@ class SchemaHooks:
             # Check schema for pattern keyword and use provided regex if present
             if self.check_for_regex_pattern(name, schema, case_attr):
                 return case_attr[name]
+            # Check for a non-pii alias matching the whole parameter name
+            if name and self.lookup_nonpii_provider(keyword=name, parameter_name=name, case_attr=case_attr):
+                return case_attr[name]
+            # Check for aliases contained in the parameter name, e.g. paymentId or customerEmailAddress. Of the pii
+            # and non-pii aliases covering the end of the name, the longer one wins, so orderState is not a state
+            if name and self.lookup_nonpii_provider(
+                keyword=name, parameter_name=name, case_attr=case_attr, match_substring=True
+            ):
+                return case_attr[name]
+            # Schema types like string are non-pii aliases themselves, so the schema and type of the parameter are
+            # checked for non-pii keywords after the pii aliases contained in its name
+            if name and self.lookup_pii_provider(
+                keyword=name,
+                parameter_name=name,
+                case_attr=case_attr,
+                parameter_type=parameter_type,
+                match_substring=True,
+            ):
+                return case_attr[name]
             # Check for non-pii keywords
             if self.check_for_nonpii_keywords(name, schema, type_, case_attr):
                 return case_attr[name]
@@ -177,9 +301,8 @@ class SchemaHooks:
 
         def check_for_nonpii_keywords(self, name: str, schema: Optional[dict],
                                       type_: Optional[Union[str, bool]], case_attr: dict) -> Optional[bool]:
-            """check if a given parameter name or schema contains a non-pii keyword and, if so, assign pii"""
-            if name and self.lookup_nonpii_provider(keyword=name, parameter_name=name, case_attr=case_attr):
-                return True
+            """check if a given parameter schema or type contains a non-pii keyword and, if so, assign pii. The
+            parameter name itself is checked by assign_parameters."""
             if schema:
                 if isinstance(schema, str):
                     if self.lookup_nonpii_provider(
@@ -203,10 +326,14 @@ class SchemaHooks:
                     return True
 
         def lookup_pii_provider(self, keyword: str, parameter_name: str, case_attr: dict,
-                                parameter_type: ParamType) -> Optional[Tuple[str, str]]:
+                                parameter_type: ParamType, match_substring: bool = False) -> Optional[Tuple[str, str]]:
             """lookup pii provider for a given keyword and, if a match is found, assign pii for this parameter_name
-            and add this pii type to the pii_types list for this parameter_type"""
-            pii = self.providers.get_pii_provider(keyword)
+            and add this pii type to the pii_types list for this parameter_type. With match_substring, match
+            aliases contained in the keyword rather than the whole keyword."""
+            if match_substring:
+                pii = self.providers.match_pii_provider(keyword)
+            else:
+                pii = self.providers.get_pii_provider(keyword)
             if pii:
                 self.log.debug(
                     f"{parameter_name} |matched this pii provider| {pii.template_name}"
@@ -216,11 +343,14 @@ class SchemaHooks:
                 self.add_pii_type(parameter_type, pii.template_name)
                 return (parameter_name, pii.template_name)
 
-        def lookup_nonpii_provider(self, keyword: str, parameter_name: str,
-                                   case_attr: dict) -> Optional[Tuple[str, str]]:
+        def lookup_nonpii_provider(self, keyword: str, parameter_name: str, case_attr: dict,
+                                   match_substring: bool = False) -> Optional[Tuple[str, str]]:
             """lookup nonpii provider for a given keyword and, if a match is found,
             assign nonpii for this parameter_name"""
-            nonpii = self.providers.get_nonpii_provider(keyword)
+            if match_substring:
+                nonpii = self.providers.match_nonpii_provider(keyword)
+            else:
+                nonpii = self.providers.get_nonpii_provider(keyword)
             if nonpii:
                 self.log.debug(
                     f"{parameter_name} |matched this nonpii provider| {nonpii.template_name}"
@@ -234,19 +364,26 @@ class SchemaHooks:
             if name and schema:
                 for schema_key, schema_val in schema.items():
                     if schema_key == "pattern":
-                        self.generate_value_from_regex(
-                            parameter_name=name, regex=schema_val, case_attr=case_attr
-                        )
+                        with self.profiler.phase("draw"):
+                            self.generate_value_from_regex(
+                                parameter_name=name, regex=schema_val, case_attr=case_attr
+                            )
                         return True
 
-        @given(data=st.data())
-        def generate_value_from_regex(self, parameter_name: str, regex: str, case_attr: dict, data) -> None:
+        def generate_value_from_regex(self, parameter_name: str, regex: str, case_attr: dict) -> None:
             """generate a value from a regex pattern"""
-            regex_value = data.draw(st.from_regex(regex, fullmatch=True))
+            @given(data=st.data())
+            def draw(data) -> None:
+                case_attr[parameter_name] = data.draw(st.from_regex(regex, fullmatch=True))
+
+            if self.seeded:
+                # draw from the seeded global RNG instead of hypothesis' own unseeded one. The seed is set on a
+                # function of this call only, since the threads of --multi_threaded runs share the analyzer's class
+                draw = seed(random.getrandbits(64))(draw)
+            draw()
             self.log.debug(
-                f"{parameter_name} |matched regex| {regex} |generated| {regex_value}"
+                f"{parameter_name} |matched regex| {regex} |generated| {case_attr[parameter_name]}"
             )
-            case_attr[parameter_name] = regex_value
 
         def check_for_enum(self, name: str, enum: Optional[Union[str, list]], schema: Optional[dict],
                            case_attr: dict) -> Optional[bool]:
@@ -0,0 +1,156 @@
+# Copyright 2018- The Pixie Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# SPDX-License-Identifier: Apache-2.0
+
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Iterator
+
+from privy.analyze import DatasetAnalyzer
+from privy.dedup import FINGERPRINT_SIZE, TemplateDeduplicator
+
+MANIFEST_VERSION = 1
+# arguments that change which payloads a run generates, or how it writes them. Runs can only be resumed with the
+# same values, so that the resumed dataset matches the one an uninterrupted run would have generated.
+RESUME_OPTIONS = [
+    "generate_types", "region_name", "pii_types", "output_format", "compression", "max_file_size", "seed",
+    "shard_index", "shard_count", "engine", "spans_per_template", "fuzz_payloads", "num_additional_pii_types",
+    "equalize_pii_distribution_to_percentage", "value_pool_size", "dedup_bloom_capacity", "ignore_spec", "xml_root",
+    "xml_attribute_style", "html_layout", "html_table_attributes", "sql_dialects", "parameter_types", "api_specs",
+    "timeout", "fake_persons_file_path",
+]
+
+
+def resume_options(args) -> dict:
+    return {option: getattr(args, option) for option in RESUME_OPTIONS}
+
+
+class RunManifest:
+    """Journal of the progress of a single process privy run, so that an interrupted run can be resumed.
+
+    The manifest is a json lines file. Its first line holds the options of the run, and a line is appended after
+    every completed spec, recording the spec, the size of every output file, the DatasetAnalyzer counters and the
+    number of template fingerprints generated so far. The fingerprints themselves are appended to a separate binary
+    journal as they are generated, rather than rewriting the whole set after every spec.
+
+    Resuming truncates the output files and the fingerprint journal back to the last recorded spec, dropping records
+    of the spec that was interrupted, restores the analyzer counters and template deduplicator, and skips the
+    completed specs. Since seeded runs seed every spec on its own, the resumed dataset is the same as that of an
+    uninterrupted run.
+    """
+
+    def __init__(self, path: Path, options: dict):
+        self.path = Path(path)
+        self.journal_path = self.path.with_suffix(".fingerprints")
+        # round trip through json, so that options compare equal to those loaded from a manifest
+        self.options = json.loads(json.dumps(options, default=str))
+        self.completed = set()
+        self.last_checkpoint = None
+        self.file = None
+        self.journal = None
+        self.deduplicator = None
+        self.log = logging.getLogger("privy")
+
+    def start(self, resume: bool) -> bool:
+        """Open the manifest for writing, returning whether the run continues from the checkpoint of a previous run"""
+        size = self.load() if resume and self.path.exists() else 0
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        if self.last_checkpoint is None:
+            self.completed = set()
+            self.file = open(self.path, "w")
+            self.write_line({"version": MANIFEST_VERSION, "options": self.options})
+            return False
+        # drop a line that was only partially written when the run was interrupted
+        self.file = open(self.path, "a")
+        self.file.truncate(size)
+        self.file.seek(0, os.SEEK_END)
+        self.log.info(f"Resuming run from {self.path}, skipping {len(self.completed)} completed specs")
+        return True
+
+    def load(self) -> int:
+        """Read the completed specs and last checkpoint, returning the size of the manifest up to its last full line"""
+        size = 0
+        with open(self.path, "rb") as f:
+            for i, line in enumerate(f):
+                if not line.endswith(b"\n"):
+                    break
+                entry = json.loads(line)
+                size += len(line)
+                if i == 0:
+                    self.check_header(entry)
+                else:
+                    self.completed.add(entry["spec"])
+                    self.last_checkpoint = entry
+        return size
+
+    def check_header(self, header: dict) -> None:
+        if header["version"] != MANIFEST_VERSION:
+            raise ValueError(f"Unsupported manifest version {header['version']} in {self.path}")
+        changed = [option for option in RESUME_OPTIONS if header["options"].get(option) != self.options[option]]
+        if changed:
+            raise ValueError(f"Cannot resume the run in {self.path} with different values for: {', '.join(changed)}")
+
+    @staticmethod
+    def writers(file_writers: dict) -> Iterator[tuple[str, object]]:
+        for generate_type, privy_writers in file_writers.items():
+            for writer in privy_writers:
+                yield f"{generate_type}-{writer.file_type.name.lower()}", writer
+
+    def restore(self, file_writers: dict, analyzer: DatasetAnalyzer, deduplicator: TemplateDeduplicator) -> None:
+        """Restore output files, analyzer and deduplicator to the last checkpoint, if any, and start journaling
+        the fingerprints of new templates."""
+        offset = 0
+        if self.last_checkpoint is not None:
+            for key, writer in self.writers(file_writers):
+                writer.resume(self.last_checkpoint["writers"][key])
+            analyzer.restore_state(self.last_checkpoint["analyzer"])
+            offset = self.last_checkpoint["fingerprints"]
+            with open(self.journal_path, "rb") as f:
+                fingerprints = f.read(offset)
+            for i in range(0, len(fingerprints), FINGERPRINT_SIZE):
+                deduplicator.add(fingerprints[i:i + FINGERPRINT_SIZE])
+        self.journal = open(self.journal_path, "ab" if offset else "wb")
+        self.journal.truncate(offset)
+        self.journal.seek(0, os.SEEK_END)
+        deduplicator.journal = self.journal
+        self.deduplicator = deduplicator
+
+    def record(self, spec: str, file_writers: dict, analyzer: DatasetAnalyzer) -> None:
+        """Checkpoint the run after spec was completed"""
+        writers = {key: writer.checkpoint() for key, writer in self.writers(file_writers)}
+        self.journal.flush()
+        # the line is only written once the output files and journal it refers to are, so a complete line is always
+        # safe to resume from
+        self.write_line({
+            "spec": spec,
+            "writers": writers,
+            "analyzer": analyzer.get_state(),
+            "fingerprints": self.journal.tell(),
+        })
+        self.completed.add(spec)
+
+    def write_line(self, entry: dict) -> None:
+        self.file.write(f"{json.dumps(entry)}\n")
+        self.file.flush()
+
+    def close(self) -> None:
+        if self.deduplicator is not None:
+            self.deduplicator.journal = None
+        for f in [self.file, self.journal]:
+            if f is not None:
+                f.close()
+        self.file = self.journal = None
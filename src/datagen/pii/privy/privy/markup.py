@@ -0,0 +1,185 @@
+# Copyright 2018- The Pixie Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# SPDX-License-Identifier: Apache-2.0
+
+import re
+from functools import lru_cache
+from html import escape as escape_html
+from typing import Any, Optional, Union
+
+XML_DECLARATION = '<?xml version="1.0" encoding="UTF-8" ?>'
+XML_ESCAPES = str.maketrans({"&": "&amp;", '"': "&quot;", "'": "&apos;", "<": "&lt;", ">": "&gt;"})
+# XML names, without the colon, which parsers treat as a namespace prefix
+XML_NAME_START = "A-Za-z_À-ÖØ-öø-˿Ͱ-ͽͿ-῿‌-‍⁰-↏" \
+    "Ⰰ-⿯、-퟿豈-﷏ﷰ-�"
+XML_NAME = re.compile(f"[{XML_NAME_START}][{XML_NAME_START}\\-.0-9·̀-ͯ‿-⁀]*")
+XML_TYPES = {str: "str", int: "int", float: "float", bool: "bool", type(None): "null", dict: "dict", list: "list"}
+XML_ATTRIBUTE_STYLES = ["type", "none"]
+HTML_LAYOUTS = ["rows", "columns"]
+
+
+def escape_xml(value: str) -> str:
+    return value.translate(XML_ESCAPES)
+
+
+@lru_cache(maxsize=4096)
+def xml_element_name(key: str) -> tuple[str, str]:
+    """Element name and name attribute for a parameter name, fixing invalid XML names like dicttoxml does: numeric
+    names are prefixed with n, spaces replaced by underscores, and otherwise the name is moved into the name
+    attribute of a key element."""
+    key = escape_xml(key)
+    if XML_NAME.fullmatch(key):
+        return key, ""
+    if key.isdigit():
+        return f"n{key}", ""
+    if XML_NAME.fullmatch(key.replace(" ", "_")):
+        return key.replace(" ", "_"), ""
+    return "key", f' name="{key}"'
+
+
+class XMLRenderer:
+    """Render payload templates as XML in a single pass, producing the same XML as dicttoxml.
+
+    root is the name of the root element, which is preceded by an XML declaration. Without a root, the parameters
+    are rendered as a sequence of elements. With type_attributes, every element has a type attribute naming the
+    type of its value, e.g. <id type="str">.
+    """
+
+    def __init__(self, root: str = "root", type_attributes: bool = True):
+        self.root = root
+        self.type_attributes = type_attributes
+
+    def render(self, payload: dict) -> str:
+        out = []
+        if self.root:
+            out.append(f"{XML_DECLARATION}<{self.root}>")
+        self.render_dict(payload, out)
+        if self.root:
+            out.append(f"</{self.root}>")
+        return "".join(out)
+
+    def render_dict(self, payload: dict, out: list[str]) -> None:
+        for key, value in payload.items():
+            name, attributes = xml_element_name(str(key))
+            self.render_element(name, attributes, value, out)
+
+    def render_element(self, name: str, attributes: str, value: Any, out: list[str]) -> None:
+        if self.type_attributes:
+            attributes = f'{attributes} type="{XML_TYPES.get(type(value), "number")}"'
+        out.append(f"<{name}{attributes}>")
+        if isinstance(value, str):
+            out.append(value.translate(XML_ESCAPES))
+        elif isinstance(value, dict):
+            self.render_dict(value, out)
+        elif isinstance(value, (list, tuple, set)):
+            for item in value:
+                self.render_element("item", "", item, out)
+        elif value is not None:
+            out.append(str(value))
+        out.append(f"</{name}>")
+
+
+class HTMLRenderer:
+    """Render payload templates as HTML tables in a single pass.
+
+    With the rows layout, every parameter is a row with a header and a value cell, which is the table json2html
+    produces. With the columns layout, the parameter names form the header row of the table and their values the
+    single row of its body. Nested objects become nested tables. Lists of objects with the same keys, like the
+    array items of request bodies, become a table with a header row and one row per object, as json2html clubs
+    them, and other lists become unordered lists.
+    """
+
+    def __init__(self, table_attributes: str = 'border="1"', layout: str = "rows"):
+        self.table_start = f"<table {table_attributes}>"
+        self.columns = layout == "columns"
+
+    def render(self, payload: dict) -> str:
+        out = []
+        self.render_value(payload, out)
+        return "".join(out)
+
+    def render_value(self, value: Any, out: list[str]) -> None:
+        if isinstance(value, str):
+            out.append(escape_html(value))
+        elif isinstance(value, dict):
+            if self.columns:
+                self.render_columns(value, out)
+            else:
+                self.render_rows(value, out)
+        elif isinstance(value, (list, tuple)):
+            keys = self.club_keys(value)
+            if keys is not None:
+                self.render_club(value, keys, out)
+            elif value:
+                out.append("<ul>")
+                for item in value:
+                    out.append("<li>")
+                    self.render_value(item, out)
+                    out.append("</li>")
+                out.append("</ul>")
+        else:
+            out.append(str(value))
+
+    @staticmethod
+    def club_keys(items: Union[list, tuple]) -> Optional[list]:
+        """keys of the first of a non-empty list of objects, if every object has the same keys"""
+        if not items or not all(isinstance(item, dict) for item in items):
+            return None
+        keys = list(items[0])
+        if any(item.keys() != items[0].keys() for item in items):
+            return None
+        return keys
+
+    def render_club(self, items: Union[list, tuple], keys: list, out: list[str]) -> None:
+        out.append(f"{self.table_start}<thead><tr><th>")
+        out.append("</th><th>".join(escape_html(str(key)) for key in keys))
+        out.append("</th></tr></thead><tbody>")
+        for item in items:
+            out.append("<tr><td>")
+            for i, key in enumerate(keys):
+                if i:
+                    out.append("</td><td>")
+                self.render_value(item[key], out)
+            out.append("</td></tr>")
+        out.append("</tbody></table>")
+
+    def render_rows(self, payload: dict, out: list[str]) -> None:
+        if not payload:
+            return
+        out.append(self.table_start)
+        for key, value in payload.items():
+            if isinstance(value, str):
+                out.append(f"<tr><th>{escape_html(str(key))}</th><td>{escape_html(value)}</td></tr>")
+                continue
+            out.append(f"<tr><th>{escape_html(str(key))}</th><td>")
+            self.render_value(value, out)
+            out.append("</td></tr>")
+        out.append("</table>")
+
+    def render_columns(self, payload: dict, out: list[str]) -> None:
+        if not payload:
+            return
+        out.append(f"{self.table_start}<thead><tr>")
+        for key in payload:
+            out.append(f"<th>{escape_html(str(key))}</th>")
+        out.append("</tr></thead><tbody><tr>")
+        for value in payload.values():
+            if isinstance(value, str):
+                out.append(f"<td>{escape_html(value)}</td>")
+                continue
+            out.append("<td>")
+            self.render_value(value, out)
+            out.append("</td>")
+        out.append("</tr></tbody></table>")
@@ -0,0 +1,248 @@
+# Copyright 2018- The Pixie Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# SPDX-License-Identifier: Apache-2.0
+
+import argparse
+import csv
+import json
+import logging
+import os
+import shutil
+import time
+from pathlib import Path
+from typing import Optional
+
+from alive_progress import alive_bar
+from presidio_evaluator.data_generator.faker_extensions.data_objects import \
+    FakerSpansResult
+
+from privy.analyze import DatasetAnalyzer
+from privy.corpus import CorpusIndex, Progress, longest_first
+from privy.dedup import TemplateDeduplicator
+from privy.generate.utils import PrivyFileType
+from privy.generate.writers import (get_out_files, open_privy_writers,
+                                    read_binary_record, read_csv_payload)
+from privy.payload import PayloadGenerator, find_api_specs
+from privy.profile import Profiler
+from privy.providers.regions import load_region
+from privy.sharding import shard_specs, spec_key
+from privy.watchdog import OFFENDERS_FILE, SupervisedPool, record_offender
+
+INDEX_FILE = "index.jsonl"
+
+# per-process generator state, created by _init_worker in each worker process
+_worker = None
+
+
+class _ShardWorker:
+    """Generates payloads for the specs assigned to one worker process into that worker's own shard files."""
+
+    def __init__(self, api_specs_folder: Path, args: argparse.Namespace, out_files, shard_dir: Path):
+        self.args = args
+        self.out_files = out_files
+        self.shard_dir = shard_dir
+        self.payload_generator = PayloadGenerator(api_specs_folder, {}, args)
+
+    def run(self, file: Path) -> tuple[int, Optional[dict], Optional[dict]]:
+        """Generate payloads for one spec, appending them to this worker's shard. Returns the number of spans, the
+        profile record of the spec when profiling, and its generation time and counts unless it is ignored."""
+        route = self.payload_generator.route
+        analyzer = self.payload_generator.analyzer
+        with open_privy_writers(self.out_files, mode="a", write_header=False) as file_writers, \
+                open(self.shard_dir / INDEX_FILE, "a") as index_file:
+            route.file_writers, route.index_file = file_writers, index_file
+            try:
+                stats = self.payload_generator.parse_openapi_descriptor(file, self.args.timeout)
+            finally:
+                route.file_writers, route.index_file = {}, None
+        num_payloads = analyzer.num_payloads_this_spec
+        analyzer.reset_spec_specific_metrics()
+        profiler = self.payload_generator.profiler
+        return num_payloads, profiler.specs.pop() if profiler.specs else None, stats
+
+
+def _init_worker(api_specs_folder: Path, args: dict, out_files, shards_folder: Path) -> None:
+    global _worker
+    logging.basicConfig(level=logging.WARNING)
+    logging.getLogger("privy").setLevel(args["logging"].upper())
+    args = argparse.Namespace(**args)
+    args.region = load_region(args.region_name, args.pii_types, args.value_pool_size)
+    shard_dir = shards_folder / f"shard-{os.getpid()}"
+    _worker = _ShardWorker(api_specs_folder, args, get_out_files(shard_dir, list(out_files)), shard_dir)
+
+
+def _run_spec(file: Path) -> tuple[int, Optional[dict], Optional[dict]]:
+    return _worker.run(file)
+
+
+class ParallelPayloadGenerator:
+    """Generate payloads from openAPI specs in a pool of worker processes.
+
+    Hypothesis and faker work is CPU-bound, so unlike the multi-threaded mode of PayloadGenerator each worker is a
+    separate process with its own region, PayloadGenerator, DatasetAnalyzer and SchemaHooks state. Workers append to
+    their own csv shard files, which are merged into out_files once every spec has been generated. Templates generated
+    by more than one worker are only kept once, and the PII distribution statistics of the merged dataset are
+    rebuilt from the kept templates.
+
+    Specs are handed to workers longest first, by the generation times of earlier runs recorded in the corpus index,
+    or their size, so that the run doesn't end with one worker generating a giant spec while the others sit idle.
+
+    Workers exceeding --spec_time_limit or --spec_memory_limit on a spec are killed and replaced. The templates they
+    completed for that spec are still merged, and the spec is recorded in the offenders report, from which
+    --ignore_offenders adds it to --ignore_spec in later runs.
+    """
+
+    def __init__(self, api_specs_folder: Path, out_files, args: argparse.Namespace):
+        self.api_specs_folder = api_specs_folder
+        self.out_files = out_files
+        self.args = args
+        self.log = logging.getLogger("privy")
+        self.shards_folder = Path(next(iter(out_files.values()))[0][1]).parent / "shards"
+        self.offenders_path = self.shards_folder.parent / OFFENDERS_FILE
+        self.analyzer = DatasetAnalyzer(args.region)
+        # templates emitted by previous runs, which workers load and skip on their own
+        self.deduplicator = TemplateDeduplicator(args.dedup_bloom_capacity, args.dedup_state)
+        # collects the profile records of workers, see privy.profile
+        self.profiler = Profiler(args.profile)
+
+    def worker_args(self) -> dict:
+        """Picklable subset of args that workers rebuild their generator state from, using args.region_name."""
+        return {k: v for k, v in vars(self.args).items() if k != "region"}
+
+    def generate_payloads(self) -> None:
+        api_specs = shard_specs(find_api_specs(self.api_specs_folder), self.api_specs_folder,
+                                self.args.shard_index, self.args.shard_count)
+        self.log.info(
+            f"Generating synthetic request payloads from {len(api_specs)} files in {self.api_specs_folder} "
+            f"using {self.args.num_processes} processes")
+        corpus = CorpusIndex(self.args.corpus_index)
+        corpus.scan(api_specs, self.api_specs_folder)
+        estimates = corpus.estimates(api_specs, self.api_specs_folder)
+        api_specs = longest_first(api_specs, estimates)
+        progress = Progress(estimates, self.args.num_processes)
+        self.log.info(f"Estimated time to generate {len(api_specs)} files: {progress.eta()}")
+        shutil.rmtree(self.shards_folder, ignore_errors=True)
+        self.shards_folder.mkdir(parents=True)
+        pool = SupervisedPool(
+            self.args.num_processes, _run_spec, _init_worker,
+            (self.api_specs_folder, self.worker_args(), self.out_files, self.shards_folder),
+            time_limit=self.args.spec_time_limit, memory_limit=self.args.spec_memory_limit << 20,
+        )
+        try:
+            with alive_bar(len(api_specs)) as progress_bar:
+                for file, result, offense in pool.map(api_specs):
+                    key = spec_key(file, self.api_specs_folder)
+                    if offense:
+                        record_offender(self.offenders_path, {"spec": key, **offense})
+                        # the worker was killed along with its profile of the spec
+                        self.profiler.add_spec({"spec": key, "status": offense["reason"],
+                                                "seconds": offense["seconds"]})
+                        corpus.record(key, offense["seconds"])
+                        seconds = offense["seconds"]
+                    else:
+                        num_payloads, profile_record, stats = result
+                        self.log.info(f"Generated {num_payloads} payloads from {file}")
+                        if profile_record:
+                            self.profiler.add_spec(profile_record)
+                        if stats:
+                            corpus.record(key, **stats)
+                        seconds = stats["seconds"] if stats else 0.0
+                    progress.done(file, seconds)
+                    progress_bar.text(progress.text())
+                    progress_bar()
+        finally:
+            corpus.save()
+        merge_start = time.perf_counter()
+        self.merge_shards()
+        self.deduplicator.save()
+        shutil.rmtree(self.shards_folder)
+        self.profiler.write(merge_seconds=time.perf_counter() - merge_start)
+
+    def shard_dirs(self) -> list[Path]:
+        return sorted(p for p in self.shards_folder.iterdir() if p.is_dir())
+
+    def merge_shards(self) -> None:
+        """Merge worker shards into out_files, dropping templates already emitted by another worker."""
+        shard_dirs = self.shard_dirs()
+        self.log.info(f"Merging {len(shard_dirs)} shards into {self.shards_folder.parent}")
+        seen = {generate_type: TemplateDeduplicator(self.args.dedup_bloom_capacity) for generate_type in self.out_files}
+        with open_privy_writers(self.out_files, output_format=self.args.output_format,
+                                compression=self.args.compression,
+                                max_file_size=self.args.max_file_size) as file_writers:
+            for shard_dir in shard_dirs:
+                with open(shard_dir / INDEX_FILE) as index_file:
+                    # the last line is incomplete if the worker was killed while writing it
+                    entries = [json.loads(line) for line in index_file if line.endswith("\n")]
+                shard_files = get_out_files(shard_dir, list(self.out_files))
+                for generate_type, privy_writers in file_writers.items():
+                    type_entries = [e for e in entries if e["type"] == generate_type]
+                    keep = []
+                    for entry in type_entries:
+                        key = bytes.fromhex(entry["key"])
+                        keep.append(seen[generate_type].add(key))
+                        if keep[-1]:
+                            self.deduplicator.add(key)
+                    for (_, shard_file), writer in zip(shard_files[generate_type], privy_writers):
+                        self.merge_shard_file(shard_file, writer, type_entries, keep)
+                    self.replay_analyzer(type_entries, keep)
+        self.analyzer.print_metrics()
+        self.log.info(f"{sum(len(keys) for keys in seen.values())} unique payload templates generated.")
+
+    def merge_shard_file(self, shard_file: Path, writer, entries: list[dict], keep: list[bool]) -> None:
+        if not shard_file.exists():
+            return
+        with open(shard_file, newline="") as f:
+            if writer.file_type == PrivyFileType.PAYLOADS:
+                reader = csv.reader(f, quotechar="|")
+                for entry, kept in zip(entries, keep):
+                    for _ in range(entry["payloads"]):
+                        row = next(reader)
+                        if kept:
+                            writer.write_payload(*read_csv_payload(row))
+            elif writer.file_type == PrivyFileType.TEMPLATES:
+                for entry, kept in zip(entries, keep):
+                    template = "".join(f.readline() for _ in range(entry["templates"]))
+                    if kept:
+                        writer.write_template(template[:-1])
+            elif writer.file_type == PrivyFileType.SPANS:
+                # template ids are the running payload count, so renumber them against the merged dataset
+                template_id = self.analyzer.num_payloads
+                for entry, kept in zip(entries, keep):
+                    for _ in range(entry["spans"]):
+                        line = f.readline()
+                        if kept:
+                            span = FakerSpansResult.fromJSON(line)
+                            span.template_id = template_id
+                            template_id += 1
+                            writer.write_span(span)
+            elif writer.file_type == PrivyFileType.BINARY:
+                template_id = self.analyzer.num_payloads
+                for entry, kept in zip(entries, keep):
+                    for _ in range(entry["spans"]):
+                        line = f.readline()
+                        if kept:
+                            record = read_binary_record(line)
+                            writer.write_binary(record["payload"], record["spans"], record["message"], template_id)
+                            template_id += 1
+
+    def replay_analyzer(self, entries: list[dict], keep: list[bool]) -> None:
+        """Update the merged DatasetAnalyzer as PayloadRoute would have for every kept template."""
+        for entry, kept in zip(entries, keep):
+            if not kept:
+                continue
+            for _ in range(entry["spans"]):
+                if entry["pii_types"]:
+                    self.analyzer.update_pii_counters(entry["pii_types"])
+                self.analyzer.update_payload_counts()
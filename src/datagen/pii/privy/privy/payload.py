@@ -23,10 +23,11 @@ import warnings
 from copy import deepcopy
 from datetime import timedelta
 from pathlib import Path
+from typing import Optional
 
 import schemathesis
 from alive_progress import alive_bar
-from hypothesis import HealthCheck, Verbosity, given, settings
+from hypothesis import HealthCheck, Verbosity, given, seed, settings
 from hypothesis import strategies as st
 from joblib import Parallel, delayed
 from schemathesis import DataGenerationMethod
@@ -35,87 +36,192 @@ from tqdm import tqdm
 from tqdm_joblib import tqdm_joblib
 
 from privy.analyze import DatasetAnalyzer
+from privy.cache import SpecCache
+from privy.corpus import CorpusIndex, Progress, longest_first
 from privy.generate.utils import PrivyWriter
-from privy.hooks import ParamType, SchemaHooks
+from privy.hooks import PARAMETER_ATTRIBUTES, ParamType, SchemaHooks
+from privy.manifest import RunManifest
+from privy.prescreen import PIIPrescreener
+from privy.profile import Profiler
 from privy.providers.generic import Provider
 from privy.route import PayloadRoute
+from privy.sharding import seed_generators, shard_specs, spec_key, spec_seed
 
 
 # todo @benkilimnik add fine grained warning filter for schemathesis
 warnings.filterwarnings("ignore")
 
+API_SPEC_FILES = ["openapi.json", "swagger.json", "openapi.yaml", "swagger.yaml"]
+
+
+def find_api_specs(api_specs_folder: Path) -> list[Path]:
+    """Retrieve openapi descriptor files in api_specs_folder, in sorted directory walk order."""
+    api_specs = []
+    for dirpath, dirnames, files in os.walk(api_specs_folder):
+        # walk in a filesystem independent order, so that seeded runs are reproducible
+        dirnames.sort()
+        for desc in sorted(filter(lambda f: f in API_SPEC_FILES, files)):
+            api_specs.append(Path(dirpath) / desc)
+    return api_specs
+
 
 class PayloadGenerator:
 
-    def __init__(self, api_specs_folder: Path, file_writers: dict[str, PrivyWriter], args):
+    def __init__(self, api_specs_folder: Path, file_writers: dict[str, PrivyWriter], args,
+                 manifest: RunManifest = None):
         self.args = args
+        # checkpoints single-threaded runs after every spec, see privy.manifest
+        self.manifest = manifest
         self.api_specs_folder = api_specs_folder
         self.log = logging.getLogger("privy")
         self.analyzer = DatasetAnalyzer(args.region)
         self.route = PayloadRoute(file_writers, self.analyzer, args)
         self.hook = SchemaHooks(args).schema_analyzer
+        # times the phases of generating each spec when --profile is set, see privy.profile
+        self.profiler = Profiler(args.profile)
+        self.route.profiler = self.hook.profiler = self.profiler
+        self.spec_cache = SpecCache(args.spec_cache) if args.spec_cache else None
+        # sizes, operation counts and generation times of the specs, see privy.corpus
+        self.corpus = None
+        # skips specs and operations without parameters matching --pii_types, see privy.prescreen
+        self.prescreener = PIIPrescreener(args.region) if args.pii_types else None
+        self.spec_seed = None
         self.api_specs = []
         self.http_types = ["get", "head", "post", "put",
                            "delete", "connect", "options", "trace", "patch"]
 
     def generate_payloads(self):
         """Generate synthetic API request payloads from openAPI specs."""
-        num_files = sum(len(files)
-                        for _, _, files in os.walk(self.api_specs_folder))
+        self.api_specs = shard_specs(find_api_specs(self.api_specs_folder), self.api_specs_folder,
+                                     self.args.shard_index, self.args.shard_count)
+        num_files = len(self.api_specs)
         self.log.info(
             f"Generating synthetic request payloads from {num_files} files in {self.api_specs_folder}")
-        # Retrieve openapi descriptor files
-        for dirpath, _, files in os.walk(self.api_specs_folder):
-            descriptors = filter(lambda f: f in [
-                                 "openapi.json", "swagger.json", "openapi.yaml", "swagger.yaml"], files)
-            for desc in descriptors:
-                file = Path(dirpath) / desc
-                self.api_specs.append(file)
-        # multi-threaded
-        if self.args.multi_threaded:
-            with tqdm_joblib(tqdm(total=num_files, position=0, leave=True)) as progress_bar:
-                Parallel(n_jobs=10, prefer='threads')(
-                    delayed(self.parse_openapi_descriptor)(file, self.args.timeout) for file in self.api_specs
-                )
-                progress_bar.update()
-        # single-threaded
-        else:
-            with alive_bar(num_files) as progress_bar:
-                for file in self.api_specs:
-                    self.parse_openapi_descriptor(file, self.args.timeout)
-                    self.analyzer.print_metrics()
-                    self.analyzer.reset_spec_specific_metrics()
-                    self.log.info(
-                        f"{len(self.route.unique_payload_templates)} unique payload templates generated so far.")
-                    progress_bar()
-
-    def parse_openapi_descriptor(self, file: Path, timeout: int):
+        self.corpus = CorpusIndex(self.args.corpus_index)
+        self.corpus.scan(self.api_specs, self.api_specs_folder)
+        try:
+            # multi-threaded
+            if self.args.multi_threaded:
+                # threads pick up specs in order, so start with the ones that take longest
+                api_specs = longest_first(self.api_specs, self.corpus.estimates(self.api_specs, self.api_specs_folder))
+                with tqdm_joblib(tqdm(total=num_files, position=0, leave=True)) as progress_bar:
+                    Parallel(n_jobs=10, prefer='threads')(
+                        delayed(self.generate_and_index)(file) for file in api_specs
+                    )
+                    progress_bar.update()
+            # single-threaded
+            else:
+                api_specs = self.api_specs
+                if self.manifest:
+                    self.manifest.restore(self.route.file_writers, self.analyzer, self.route.deduplicator)
+                    api_specs = [file for file in api_specs
+                                 if spec_key(file, self.api_specs_folder) not in self.manifest.completed]
+                progress = Progress(self.corpus.estimates(api_specs, self.api_specs_folder))
+                self.log.info(f"Estimated time to generate {len(api_specs)} files: {progress.eta()}")
+                with alive_bar(len(api_specs)) as progress_bar:
+                    for file in api_specs:
+                        stats = self.generate_and_index(file)
+                        self.analyzer.print_metrics()
+                        self.analyzer.reset_spec_specific_metrics()
+                        self.log.info(
+                            f"{len(self.route.deduplicator)} unique payload templates generated so far.")
+                        if self.manifest:
+                            self.manifest.record(spec_key(file, self.api_specs_folder), self.route.file_writers,
+                                                 self.analyzer)
+                        progress.done(file, stats["seconds"] if stats else 0.0)
+                        progress_bar.text(progress.text())
+                        progress_bar()
+        finally:
+            self.corpus.save()
+        self.route.deduplicator.save()
+        self.profiler.write()
+
+    def generate_and_index(self, file: Path) -> Optional[dict]:
+        """Generate the payloads of one spec and record its generation time and size in the corpus index"""
+        stats = self.parse_openapi_descriptor(file, self.args.timeout)
+        if stats:
+            self.corpus.record(spec_key(file, self.api_specs_folder), **stats)
+        return stats
+
+    def parse_openapi_descriptor(self, file: Path, timeout: int) -> Optional[dict]:
+        with self.profiler.spec(spec_key(file, self.api_specs_folder)):
+            return self.generate_spec(file, timeout)
+
+    def prescreen_operation(self, operation) -> bool:
+        """whether to generate payloads for an api operation, i.e. unless no parameter matches --pii_types"""
+        if self.prescreener is None or self.prescreener.operation_matches(operation):
+            return True
+        self.log.debug(f"Skipping {operation.verbose_name}, no parameters match --pii_types")
+        return False
+
+    def count_operations(self, schema: BaseOpenAPISchema) -> tuple[int, int]:
+        """number of operations of a spec, and of their path, query, header and cookie parameters and request
+        bodies"""
+        operations = parameters = 0
+        for path in schema.keys():
+            for http_type in self.http_types:
+                method = schema[path].get(http_type, None)
+                if method:
+                    operations += 1
+                    parameters += len(method.path_parameters) + len(method.query) + len(method.headers) + \
+                        len(method.cookies) + bool(len(method.body))
+        return operations, parameters
+
+    def generate_spec(self, file: Path, timeout: int) -> Optional[dict]:
+        """Generate the payloads of one spec, returning its generation seconds, operation count and parameter
+        count, or None if it is ignored"""
         self.log.info(f"Generating {file}...")
         # If descriptor is in ignore list, skip it
         for ignore in self.args.ignore_spec:
             if ignore in str(file):
                 self.log.info(f"Ignoring {file}")
-                return
+                return None
+        # derive the RNG seeds for this spec from the global seed and the spec alone, so that its draws don't depend
+        # on how many values the specs generated before it drew. Its payloads still do, through the analyzer counts
+        # that drive PII equalization and the templates the deduplicator has already seen
+        if self.args.seed is not None:
+            self.spec_seed = spec_seed(self.args.seed, spec_key(file, self.api_specs_folder))
+            seed_generators(self.spec_seed, self.args.region.custom_faker)
         start = time.time()
+        schema = None
+        operations = parameters = 0
         try:
-            schema = schemathesis.from_path(
-                file, data_generation_methods=[DataGenerationMethod.positive]
-            )
+            if self.prescreener:
+                with self.profiler.phase("load"):
+                    raw = self.spec_cache.load_raw(file) if self.spec_cache else \
+                        SpecCache.parse(file, file.read_bytes())
+                if not self.prescreener.matches(raw):
+                    self.log.info(f"Skipping {file}, no parameters match --pii_types")
+                    return None
+                with self.profiler.phase("load"):
+                    schema = schemathesis.from_dict(raw, location=file.absolute().as_uri(),
+                                                    data_generation_methods=[DataGenerationMethod.positive])
+            else:
+                load_schema = self.spec_cache.load_schema if self.spec_cache else schemathesis.from_path
+                with self.profiler.phase("load"):
+                    schema = load_schema(
+                        file, data_generation_methods=[DataGenerationMethod.positive]
+                    )
             self.parse_http_methods(
                 schema=schema, start=time.time(), timeout=timeout)
+            operations, parameters = self.count_operations(schema)
             end = time.time()
             self.log.info(f"Success in {round(end - start, 2)} seconds")
         except Exception:
             end = time.time()
+            self.profiler.fail()
             self.log.warning(f"Failed to generate {file}")
             self.log.warning(f"Failed after {round(end - start, 2)} seconds")
             self.log.warning(traceback.format_exc())
+        if schema is not None:
+            self.hook.release_operations(schema.location)
+        return {"seconds": end - start, "operations": operations, "parameters": parameters}
 
     def insert_pii(self, pii: Provider, case_attr: dict, parameter_type: ParamType) -> None:
         """Assign a pii value to a parameter for the input case attribute (e.g. case.path_parameters)."""
         self.log.debug(f"|Inserting additional pii type| {pii.template_name}")
         if pii.aliases:
-            alias = random.choice(list(pii.aliases))
+            alias = random.choice(sorted(pii.aliases))
         else:
             alias = pii.template_name
         case_attr[alias] = f"{{{{{pii.template_name}}}}}"
@@ -148,8 +254,27 @@ class PayloadGenerator:
         case_attr = dict(case_attr)
         return case_attr
 
+    def write_case(self, case: dict[ParamType, dict]) -> None:
+        """write the payload templates of one generated request, one per parameter type (e.g. its path parameters
+        or request body), to csv and equalize the pii distribution"""
+        for parameter_type, case_attr in case.items():
+            self.route.write_payload_to_csv(
+                case_attr, self.hook.has_pii(parameter_type), self.hook.get_pii_types(parameter_type)
+            )
+        # ------ EQUALIZE PII DISTRIBUTION ------
+        # often in pii requests, the parameters are not given pii keywords for security reasons
+        # to account for this we insert additional random pii fields in requests we know contain pii
+        # until {equalize_to_percentage}% of payloads contain PII
+        self.equalize_pii_distribution(case)
+
     def parse_http_methods(self, schema: BaseOpenAPISchema, start: float, timeout: int):
         """instantiate synthetic request payload and choose data providers for a given openapi spec"""
+        if self.args.engine == "direct":
+            self.extract_templates(schema, start, timeout)
+            return
+
+        # seeded runs don't replay examples saved in the hypothesis database by previous runs
+        seeded = {"database": None} if self.spec_seed is not None else {}
 
         @settings(
             verbosity=Verbosity.quiet,
@@ -157,6 +282,7 @@ class PayloadGenerator:
             max_examples=1,
             suppress_health_check=(
                 HealthCheck.too_slow, HealthCheck.data_too_large, HealthCheck.filter_too_much),
+            **seeded,
         )
         @given(data=st.data())
         @schema.parametrize()
@@ -168,26 +294,20 @@ class PayloadGenerator:
             # matched with appropriate data providers to instantiate unique synthetic payloads
             case = data.draw(strategy)
             # write generated request parameters to csv
-            self.route.write_payload_to_csv(
-                case.path_parameters, self.hook.has_pii(
-                    ParamType.PATH), self.hook.get_pii_types(ParamType.PATH)
-            )
-            self.route.write_payload_to_csv(
-                case.query, self.hook.has_pii(
-                    ParamType.QUERY), self.hook.get_pii_types(ParamType.QUERY)
-            )
-            # ------ EQUALIZE PII DISTRIBUTION ------
-            # often in pii requests, the parameters are not given pii keywords for security reasons
-            # to account for this we insert additional random pii fields in requests we know contain pii
-            # until {equalize_to_percentage}% of payloads contain PII
-            self.equalize_pii_distribution(case.path_parameters, case.query)
+            self.write_case({parameter_type: getattr(case, PARAMETER_ATTRIBUTES[parameter_type])
+                             for parameter_type in self.hook.parameter_types})
+        if self.spec_seed is not None:
+            generate_fake_data = seed(self.spec_seed)(generate_fake_data)
         # generate data for every API path
         for path in schema.keys():
             for http_type in self.http_types:
                 method = schema[path].get(http_type, None)
-                if method:
+                if method and self.prescreen_operation(method):
                     try:
-                        generate_fake_data(method)
+                        # hypothesis' own overhead counts as draw time, while the hooks assigning providers and
+                        # the payload templates written from the drawn case are timed as phases of their own
+                        with self.profiler.phase("draw"):
+                            generate_fake_data(method)
                         if time.time() - start > timeout:
                             self.log.warning(
                                 f"HTTP method of OpenAPI spec took too long to parse. Timeout of {timeout} reached.")
@@ -196,27 +316,60 @@ class PayloadGenerator:
                         self.log.warning(traceback.format_exc())
                         continue
 
-    def equalize_pii_distribution(self, path_parameters, query) -> None:
+    def extract_templates(self, schema: BaseOpenAPISchema, start: float, timeout: int):
+        """instantiate synthetic request payloads by walking the parameters of each api operation directly.
+
+        The before_generate_case hook overwrites every value hypothesis draws with the operation's compiled
+        templates, so instead of drawing a case per operation, compile them directly. Hypothesis is only used to draw
+        values for parameters with a regex pattern."""
+        for path in schema.keys():
+            for http_type in self.http_types:
+                method = schema[path].get(http_type, None)
+                if method and self.prescreen_operation(method):
+                    try:
+                        compiled = self.hook.compile_operation(method)
+                        self.hook.load_operation(compiled)
+                        self.write_case(compiled.templates)
+                    except Exception:
+                        self.log.warning(traceback.format_exc())
+                        for parameter_type in ParamType:
+                            self.hook.clear_pii_types(parameter_type)
+                        continue
+                    if time.time() - start > timeout:
+                        self.log.warning(
+                            f"HTTP method of OpenAPI spec took too long to parse. Timeout of {timeout} reached.")
+                        return
+
+    def write_augmented_case(self, case: dict[ParamType, dict]) -> None:
+        """write copies of the given parameters with additional PII inserted"""
+        for parameter_type, case_attr in case.items():
+            if case_attr:
+                original_pii_types = self.hook.deepcopy_pii_types(parameter_type)
+                pii_case_attr = self.generate_pii_case(deepcopy(case_attr), parameter_type)
+                self.route.write_payload_to_csv(
+                    pii_case_attr, self.hook.has_pii(parameter_type), self.hook.get_pii_types(parameter_type)
+                )
+                self.hook.overwrite_pii_types(parameter_type, original_pii_types)
+
+    def equalize_pii_distribution(self, case: dict[ParamType, dict]) -> None:
         """insert additional random pii fields into payloads we know contain pii until
             {equalize_to_percentage}% of payloads contain PII"""
-        while round(self.analyzer.percent_pii) < self.args.equalize_pii_distribution_to_percentage:
-            if not path_parameters and not query:
+        percentage = self.args.equalize_pii_distribution_to_percentage
+        # every augmented case adds spans_per_template PII payloads per generate type and non-empty parameter type
+        payloads_per_case = self.args.spans_per_template * len(self.route.file_writers) * \
+            sum(bool(case_attr) for case_attr in case.values())
+        while payloads_per_case:
+            num_needed = self.analyzer.num_pii_payloads_needed(percentage)
+            if not num_needed:
                 break
-            self.log.debug(f"Equalizing PII distribution because {round(self.analyzer.percent_pii)}% is not \
-                           {self.args.equalize_pii_distribution_to_percentage}%")
-            original_path_pii_types = self.hook.deepcopy_pii_types(ParamType.PATH)
-            original_query_pii_types = self.hook.deepcopy_pii_types(ParamType.QUERY)
-            if path_parameters:
-                pii_path_params = self.generate_pii_case(deepcopy(path_parameters), ParamType.PATH)
-                self.route.write_payload_to_csv(
-                    pii_path_params, self.hook.has_pii(ParamType.PATH), self.hook.get_pii_types(ParamType.PATH)
-                )
-                self.hook.overwrite_pii_types(ParamType.PATH, original_path_pii_types)
-            if query:
-                pii_path_params = self.generate_pii_case(deepcopy(query), ParamType.QUERY)
-                self.route.write_payload_to_csv(
-                    pii_path_params, self.hook.has_pii(ParamType.QUERY), self.hook.get_pii_types(ParamType.QUERY)
-                )
-                self.hook.overwrite_pii_types(ParamType.QUERY, original_query_pii_types)
-        self.hook.clear_pii_types(ParamType.PATH)
-        self.hook.clear_pii_types(ParamType.QUERY)
+            num_cases = -(-num_needed // payloads_per_case)
+            self.log.debug(f"Equalizing PII distribution with {num_cases} cases because \
+                           {round(self.analyzer.percent_pii)}% is not {percentage}%")
+            num_pii_payloads = self.analyzer.num_pii_payloads
+            for _ in range(num_cases):
+                self.write_augmented_case(case)
+            if self.analyzer.num_pii_payloads == num_pii_payloads:
+                # every augmented case was a duplicate
+                break
+        for parameter_type in case:
+            self.hook.clear_pii_types(parameter_type)
@@ -0,0 +1,94 @@
+# Copyright 2018- The Pixie Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# SPDX-License-Identifier: Apache-2.0
+
+
+from typing import Any
+
+from privy.providers.generic import GenericProvider
+
+
+class PIIPrescreener:
+    """Cheaply tell whether an openAPI spec or operation can produce payloads with any of the region's pii types.
+
+    With --pii_types, a region only has providers for the requested pii types, so specs and operations with no
+    parameter matching one of them only produce payloads without PII, besides those PII is inserted into to
+    equalize the PII distribution. The prescreen walks the raw document for the same keywords SchemaAnalyzer
+    looks up in the provider alias index (parameter and property names, matching exactly or by alias, and the
+    string values of schemas, e.g. format: email), before schemathesis builds the schema or hypothesis draws
+    anything. It never misses a parameter SchemaAnalyzer would assign pii to, but may keep specs that only mention
+    a pii keyword, e.g. in a response.
+    """
+
+    def __init__(self, region: GenericProvider):
+        self.region = region
+        # whether each name or keyword matches a pii provider, since the same names recur across a corpus
+        self.names = {}
+        self.keywords = {}
+
+    def name_matches(self, name: str) -> bool:
+        matches = self.names.get(name)
+        if matches is None:
+            matches = self.names[name] = bool(self.region.get_pii_provider(name)
+                                              or self.region.match_pii_provider(name))
+        return matches
+
+    def keyword_matches(self, keyword: str) -> bool:
+        matches = self.keywords.get(keyword)
+        if matches is None:
+            matches = self.keywords[keyword] = bool(self.region.get_pii_provider(keyword))
+        return matches
+
+    def matches(self, document: Any, resolver=None) -> bool:
+        """Whether any parameter or property name, or string value, in a raw openAPI document or part of it matches
+        a pii provider. Given a resolver, $refs are followed, e.g. from an operation's body to its components."""
+        stack = [document]
+        # yaml anchors may share nodes, or make them recursive
+        seen = set()
+        while stack:
+            node = stack.pop()
+            if isinstance(node, list):
+                stack.extend(node)
+                continue
+            if not isinstance(node, dict) or id(node) in seen:
+                continue
+            seen.add(id(node))
+            if resolver is not None and isinstance(node.get("$ref"), str):
+                _, resolved = resolver.resolve(node["$ref"])
+                stack.append(resolved)
+            name = node.get("name")
+            if isinstance(name, str) and self.name_matches(name):
+                return True
+            properties = node.get("properties")
+            if isinstance(properties, dict) and any(self.name_matches(str(key)) for key in properties):
+                return True
+            for value in node.values():
+                if isinstance(value, str):
+                    if self.keyword_matches(value):
+                        return True
+                else:
+                    stack.append(value)
+        return False
+
+    def operation_matches(self, operation) -> bool:
+        """Whether any parameter or request body of a schemathesis APIOperation can be assigned pii"""
+        definitions = [parameter.definition for parameter in operation.iter_parameters()]
+        for body in operation.body:
+            if isinstance(body.definition, list):
+                # swagger 2.0 form data, a list of parameters
+                definitions.extend(parameter.definition for parameter in body.definition)
+            else:
+                definitions.append(body.definition)
+        return self.matches(definitions, operation.schema.resolver)
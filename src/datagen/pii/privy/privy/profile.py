@@ -0,0 +1,161 @@
+# Copyright 2018- The Pixie Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# SPDX-License-Identifier: Apache-2.0
+
+import json
+import logging
+import resource
+import sys
+import time
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+from typing import Optional
+
+# phases of generating a spec, in the order they happen for each payload template:
+# load: parsing the openapi descriptor, draw: hypothesis drawing cases and regex values, hooks: assigning providers
+# to operation parameters, convert: converting templates to json/xml/sql/html, parse: rendering spans from templates,
+# write: writing payloads, templates and spans to the output files
+PHASES = ["load", "draw", "hooks", "convert", "parse", "write"]
+COUNTS = ["payloads", "templates", "spans"]
+# number of specs listed in the slowest_specs summary of the report
+SLOWEST_SPECS = 20
+
+_DISABLED = nullcontext()
+
+
+def peak_rss() -> int:
+    """Peak resident set size of this process in bytes"""
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on linux, bytes on macOS
+    return max_rss if sys.platform == "darwin" else max_rss * 1024
+
+
+class _Phase:
+    """Context manager timing one phase, pausing the enclosing phase so that every second is attributed to exactly
+    one phase, e.g. hypothesis drawing a regex value while assigning providers counts as draw, not hooks time."""
+    __slots__ = ("profiler", "name")
+
+    def __init__(self, profiler: "Profiler", name: str):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        stack, phases = self.profiler.stack, self.profiler.spec_record["phases"]
+        now = time.perf_counter()
+        if stack:
+            phases[stack[-1][0]] += now - stack[-1][1]
+        stack.append([self.name, now])
+
+    def __exit__(self, *exc):
+        stack, phases = self.profiler.stack, self.profiler.spec_record["phases"]
+        now = time.perf_counter()
+        name, start = stack.pop()
+        phases[name] += now - start
+        if stack:
+            stack[-1][1] = now
+
+
+class Profiler:
+    """Record the time spent per spec and per phase of payload generation, and the records written per spec.
+
+    Profiling is disabled unless a report path is given, in which case the report is written there as JSON by write:
+    totals per phase and count, the peak memory use, the SLOWEST_SPECS slowest specs and a record per spec.
+    """
+
+    def __init__(self, path: Optional[Path] = None):
+        self.path = Path(path) if path else None
+        self.specs = []
+        self.spec_record = None
+        self.stack = []
+        self.start = time.perf_counter()
+        self.log = logging.getLogger("privy")
+
+    @contextmanager
+    def spec(self, key: str):
+        """Profile the generation of one spec"""
+        if not self.path:
+            yield
+            return
+        self.spec_record = {
+            "spec": key,
+            "status": "ok",
+            "phases": dict.fromkeys(PHASES, 0.0),
+            "counts": dict.fromkeys(COUNTS, 0),
+        }
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            record = self.spec_record
+            record["seconds"] = time.perf_counter() - start
+            record["phases"]["other"] = max(0.0, record["seconds"] - sum(record["phases"].values()))
+            record["peak_rss"] = peak_rss()
+            self.specs.append(record)
+            self.spec_record = None
+            self.stack.clear()
+
+    def phase(self, name: str):
+        if self.spec_record is None:
+            return _DISABLED
+        return _Phase(self, name)
+
+    def count(self, name: str, n: int = 1) -> None:
+        if self.spec_record is not None:
+            self.spec_record["counts"][name] += n
+
+    def fail(self) -> None:
+        if self.spec_record is not None:
+            self.spec_record["status"] = "failed"
+
+    def add_spec(self, record: dict) -> None:
+        """Add the record of a spec profiled in another process, e.g. a worker of privy.parallel"""
+        self.specs.append(record)
+
+    def report(self, **extra) -> dict:
+        phases = dict.fromkeys([*PHASES, "other"], 0.0)
+        counts = dict.fromkeys(COUNTS, 0)
+        for record in self.specs:
+            for phase, seconds in record.get("phases", {}).items():
+                phases[phase] += seconds
+            for name, n in record.get("counts", {}).items():
+                counts[name] += n
+        slowest = sorted(self.specs, key=lambda record: record["seconds"], reverse=True)[:SLOWEST_SPECS]
+        return {
+            "wall_seconds": time.perf_counter() - self.start,
+            "spec_seconds": sum(record["seconds"] for record in self.specs),
+            "num_specs": len(self.specs),
+            "num_failed_specs": sum(record["status"] != "ok" for record in self.specs),
+            "phases": phases,
+            "counts": counts,
+            "peak_rss": max([peak_rss(), *(record.get("peak_rss", 0) for record in self.specs)]),
+            **extra,
+            "slowest_specs": [{k: record[k] for k in ["spec", "seconds", "status"]} for record in slowest],
+            "specs": self.specs,
+        }
+
+    def write(self, **extra) -> None:
+        """Write the report to path, if profiling is enabled, and log where time was spent"""
+        if not self.path:
+            return
+        report = self.report(**extra)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, "w") as f:
+            json.dump(report, f, indent=2)
+        total = report["spec_seconds"] or 1
+        self.log.info("Time per phase: " + ", ".join(
+            f"{phase} {seconds:.1f}s ({seconds / total:.0%})" for phase, seconds in report["phases"].items()))
+        for record in report["slowest_specs"]:
+            self.log.info(f"{record['seconds']:8.1f}s {record['spec']} ({record['status']})")
+        self.log.info(f"Wrote profile of {report['num_specs']} specs to {self.path}")
@@ -0,0 +1,209 @@
+# Copyright 2018- The Pixie Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# SPDX-License-Identifier: Apache-2.0
+
+import dataclasses
+import hashlib
+import re
+from typing import Any
+
+from google.protobuf import (descriptor_pb2, descriptor_pool, message_factory,
+                             text_encoding)
+
+PACKAGE = "privy"
+FIELD_TYPES = {
+    bool: descriptor_pb2.FieldDescriptorProto.TYPE_BOOL,
+    int: descriptor_pb2.FieldDescriptorProto.TYPE_INT64,
+    float: descriptor_pb2.FieldDescriptorProto.TYPE_DOUBLE,
+    str: descriptor_pb2.FieldDescriptorProto.TYPE_STRING,
+}
+# protobuf wire type of length delimited fields, e.g. strings
+LENGTH_DELIMITED = 2
+
+
+def field_name(name: str) -> str:
+    """Protobuf field name for a parameter name. Lower case, since presidio lower cases some rendered payloads."""
+    name = re.sub(r"\W", "_", name.lower(), flags=re.ASCII)
+    return f"f_{name}" if not name or name[0].isdigit() else name
+
+
+def message_class(descriptor):
+    if hasattr(message_factory, "GetMessageClass"):
+        return message_factory.GetMessageClass(descriptor)
+    # protobuf < 4.21
+    return message_factory.MessageFactory(descriptor.file.pool).GetPrototype(descriptor)
+
+
+def read_varint(data: bytes, pos: int) -> tuple[int, int]:
+    value = shift = 0
+    while True:
+        byte = data[pos]
+        value |= (byte & 0x7F) << shift
+        pos += 1
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+
+
+def string_offsets(data: bytes) -> dict[int, int]:
+    """Offset of the value of every length delimited field in a serialized message, by field number"""
+    offsets = {}
+    pos = 0
+    while pos < len(data):
+        key, pos = read_varint(data, pos)
+        wire_type = key & 7
+        if wire_type == LENGTH_DELIMITED:
+            length, pos = read_varint(data, pos)
+            offsets[key >> 3] = pos
+            pos += length
+        elif wire_type == 0:
+            _, pos = read_varint(data, pos)
+        elif wire_type == 1:
+            pos += 8
+        else:
+            pos += 4
+    return offsets
+
+
+@dataclasses.dataclass()
+class ProtoMessage:
+    """Dynamic message type of payloads with one parameter signature. Fields are numbered in parameter order."""
+
+    name: str
+    message_class: Any
+    # field name and python type of each parameter
+    fields: list[tuple[str, type]]
+
+    def text_template(self, payload: dict) -> str:
+        """Text format of the payload template on one line, leaving its {{placeholders}} in place"""
+        parts = []
+        for (name, type_), value in zip(self.fields, payload.values()):
+            if type_ is str:
+                parts.append(f'{name}: "{text_encoding.CEscape(str(value), as_utf8=True)}"')
+            elif type_ is bool:
+                parts.append(f"{name}: {str(value).lower()}")
+            else:
+                parts.append(f"{name}: {value!r}")
+        return " ".join(parts)
+
+
+class ProtoConverter:
+    """Convert payload templates to protobuf text format, and rendered payloads to binary protobuf messages.
+
+    A message type is derived from the names and value types of the parameters of a payload template the first time
+    they are seen, and cached in a descriptor pool. Message types are named after a hash of the parameter
+    signature, so payloads of the same operation have the same message type in every process.
+
+    Templates are converted to text format, so that presidio renders them into text format payloads with character
+    spans like every other format. serialize then parses the rendered text format payload back into the message
+    type, using the spans to tell the rendered PII apart from the template, and serializes it to the binary format
+    with the byte offsets of each span.
+    """
+
+    def __init__(self):
+        self.pool = descriptor_pool.DescriptorPool()
+        self.messages = {}
+
+    def message(self, payload: dict) -> ProtoMessage:
+        signature = tuple((str(name), type(value) if type(value) in FIELD_TYPES else str)
+                          for name, value in payload.items())
+        message = self.messages.get(signature)
+        if message is None:
+            message = self.messages[signature] = self.add_message(signature)
+        return message
+
+    def add_message(self, signature: tuple) -> ProtoMessage:
+        key = repr([(name, type_.__name__) for name, type_ in signature]).encode()
+        name = f"Payload{hashlib.blake2b(key, digest_size=8).hexdigest()}"
+        file_proto = descriptor_pb2.FileDescriptorProto(name=f"{PACKAGE}/{name}.proto", package=PACKAGE,
+                                                        syntax="proto3")
+        message_proto = file_proto.message_type.add(name=name)
+        fields = []
+        names = set()
+        for number, (parameter, type_) in enumerate(signature, 1):
+            name_ = field_name(parameter)
+            # parameter names that only differ in case or punctuation
+            while name_ in names:
+                name_ = f"{name_}_{number}"
+            names.add(name_)
+            # with explicit json names, since the default camel case ones of e.g. user_id and userid collide
+            message_proto.field.add(name=name_, json_name=name_, number=number, type=FIELD_TYPES[type_],
+                                    label=descriptor_pb2.FieldDescriptorProto.LABEL_OPTIONAL)
+            fields.append((name_, type_))
+        self.pool.Add(file_proto)
+        descriptor = self.pool.FindMessageTypeByName(f"{PACKAGE}.{name}")
+        return ProtoMessage(f"{PACKAGE}.{name}", message_class(descriptor), fields)
+
+    def convert(self, payload: dict) -> str:
+        return self.message(payload).text_template(payload)
+
+    def serialize(self, payload: dict, payload_span) -> tuple[bytes, list[dict]]:
+        """Serialize a payload rendered from the text format of the payload template, returning the binary message
+        and its spans, with start and end byte offsets into the message"""
+        message = self.message(payload)
+        fake = payload_span.fake
+        spans = sorted(payload_span.spans, key=lambda span: span.start)
+        # blank out the rendered PII, so that quotes or backslashes in it aren't mistaken for text format syntax
+        masked = []
+        pos = 0
+        for span in spans:
+            masked.append(fake[pos:span.start])
+            masked.append("\0" * (span.end - span.start))
+            pos = span.end
+        masked.append(fake[pos:])
+        masked = "".join(masked)
+
+        values = {}
+        # field number, start and end byte offsets in the field value of every span
+        span_offsets = {}
+        pos = 0
+        span_index = 0
+        for number, (name, type_) in enumerate(message.fields, 1):
+            prefix = f"{name}: " if number == 1 else f" {name}: "
+            if not masked.startswith(prefix, pos):
+                raise ValueError(f"Expected field {name} at {pos} of text format payload {fake}")
+            pos += len(prefix)
+            if type_ is not str:
+                end = masked.find(" ", pos)
+                end = len(masked) if end == -1 else end
+                text = fake[pos:end]
+                values[name] = text == "true" if type_ is bool else type_(text)
+                pos = end
+                continue
+            start = pos = pos + 1
+            while masked[pos] != '"':
+                pos += 2 if masked[pos] == "\\" else 1
+            value = bytearray()
+            cursor = start
+            while span_index < len(spans) and spans[span_index].start < pos:
+                span = spans[span_index]
+                value += text_encoding.CUnescape(fake[cursor:span.start])
+                span_start = len(value)
+                value += fake[span.start:span.end].encode()
+                span_offsets[id(span)] = (number, span_start, len(value))
+                cursor = span.end
+                span_index += 1
+            value += text_encoding.CUnescape(fake[cursor:pos])
+            values[name] = value.decode()
+            pos += 1
+
+        data = message.message_class(**values).SerializeToString(deterministic=True)
+        offsets = string_offsets(data)
+        byte_spans = []
+        for span in payload_span.spans:
+            number, start, end = span_offsets[id(span)]
+            byte_spans.append({"value": span.value, "start": offsets[number] + start, "end": offsets[number] + end,
+                               "type": span.type})
+        return data, byte_spans
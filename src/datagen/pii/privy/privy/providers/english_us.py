@@ -582,7 +582,7 @@ class English_US(GenericProvider):
         self.nonpii_providers = [
             Provider(
                 template_name="string",
-                aliases=set(["string", "text", "message"]),
+                aliases=set(["string", "text", "message", "order state", "order status", "end user"]),
                 type_=str,
             ),
             Provider(
@@ -596,7 +596,7 @@ class English_US(GenericProvider):
             ),
             Provider(
                 "random_number",
-                set(["integer", "int", "number", "to number", "from number"]),
+                set(["integer", "int", "number", "to number", "from number", "min age", "max age"]),
                 int,
             ),
             Provider(
@@ -610,5 +610,7 @@ class English_US(GenericProvider):
         # insert versions of aliases with different delimiters
         self.add_delimited_aliases(self.pii_providers)
         self.add_delimited_aliases(self.nonpii_providers)
+        # index aliases for constant time provider lookup
+        self.index_providers()
         # add aliases for providers
         self.f.add_provider_alias(provider_name="name", new_name="person")
@@ -16,16 +16,22 @@
 
 import dataclasses
 import random
+import re
 import string
 from abc import ABC
 from decimal import Decimal
-from typing import Optional, Set, Type, Union
+from functools import lru_cache
+from typing import Any, Callable, Optional, Set, Tuple, Type, Union
 
-import baluhn
 from faker.providers import BaseProvider
 from faker.providers.lorem.en_US import Provider as LoremProvider
-from presidio_evaluator.data_generator.faker_extensions.data_objects import \
-    FakerSpansResult
+from presidio_evaluator.data_generator.faker_extensions.data_objects import (
+    FakerSpan, FakerSpansResult)
+from presidio_evaluator.data_generator.faker_extensions.record_generator import \
+    RecordGenerator
+
+# same placeholder syntax as presidio's SpanGenerator, e.g. {{email}} or {{ email }}
+TEMPLATE_TOKEN = re.compile(r"\{\{\s*(\w+)(:\s*\w+?)?\s*\}\}")
 
 
 @dataclasses.dataclass()
@@ -42,11 +48,143 @@ class Provider:
         return str(vars(self))
 
 
+def tokenize(name: str) -> Tuple[str, ...]:
+    """Split a parameter name or alias into lowercase word tokens, e.g. billingEmail_address -> billing email address"""
+    name = re.sub(r"([a-z0-9])([A-Z])", r"\1 \2", name)
+    return tuple(token for token in re.split(r"[^a-zA-Z0-9]+", name.lower()) if token)
+
+
+class AliasTrie:
+    """Trie of provider aliases over word tokens, matching aliases contained in a parameter name in one pass.
+
+    Each alias is inserted as its token sequence, so "first name", "first_name" and "firstName" share a path.
+    """
+
+    def __init__(self):
+        self.root = {}
+
+    def add(self, alias: str, provider: Provider) -> None:
+        tokens = tokenize(alias)
+        if not tokens:
+            return
+        node = self.root
+        for token in tokens:
+            node = node.setdefault(token, {})
+        # keep the first provider registered for an alias, like the exact alias index
+        node.setdefault(None, provider)
+
+    def match(self, tokens: Tuple[str, ...]) -> list[Tuple[int, int, Provider]]:
+        """Return (start, end, provider) for every alias occurring as a token subsequence of tokens."""
+        matches = []
+        for start in range(len(tokens)):
+            node = self.root
+            for end in range(start, len(tokens)):
+                node = node.get(tokens[end])
+                if node is None:
+                    break
+                if None in node:
+                    matches.append((start, end + 1, node[None]))
+        return matches
+
+    def match_tail(self, tokens: Tuple[str, ...]) -> Optional[Tuple[int, Provider]]:
+        """Find the start and provider of the longest alias that ends with the last token of tokens.
+
+        Compound parameter names usually end in the noun they describe (customerEmail, billing_address_line1),
+        so only aliases covering the whole final token are considered to avoid e.g. matching userId as a person.
+        """
+        best = None
+        for start, end, provider in self.match(tokens):
+            if end == len(tokens) and (best is None or start < best[0]):
+                best = (start, provider)
+        return best
+
+
+class ValuePool:
+    """Pool of values generated in bulk by a faker provider the first time a value is requested"""
+
+    def __init__(self, generate: Callable[[], Any], size: int, generator):
+        self.generate = generate
+        self.size = size
+        self.generator = generator
+        self.values = []
+
+    def sample(self) -> Any:
+        if not self.values:
+            self.values = [self.generate() for _ in range(self.size)]
+        # use faker's random instance, so that seeding faker also seeds which pooled values are sampled
+        return self.values[self.generator.random.randrange(self.size)]
+
+
+class ValuePools:
+    """Replace the faker formatters of the given provider names with pools of pre-generated values.
+
+    Faker providers generate one value at a time, some of them (e.g. addresses, strings) with several random
+    calls per value. Sampling from a pool instead trades the variety of generated values for speed: every provider
+    produces at most size distinct values. Values taken from the fake person records of a RecordsFaker are not
+    affected, since RecordGenerator.format only falls back to formatters for fields missing from the record."""
+
+    def __init__(self, faker, names: list[str], size: int):
+        self.pools = {}
+        for generator in faker.factories:
+            for name in names:
+                try:
+                    formatter = generator.get_formatter(name)
+                except AttributeError:
+                    continue
+                pool = ValuePool(formatter, size, generator)
+                generator.set_formatter(name, pool.sample)
+                self.pools[name] = pool
+
+
+class CompiledTemplate:
+    """Payload template split once into literal segments and the {{placeholder}} slots between them.
+
+    Rendering fills every slot exactly as presidio's RecordGenerator does (one fake person record per rendering,
+    each record field used at most once), but concatenates the segments in a single pass and computes span offsets
+    from the running output length, instead of re-scanning the template and shifting offsets on every call."""
+
+    def __init__(self, template: str):
+        self.template = template
+        self.literals = []
+        self.formatters = []
+        pos = 0
+        for match in TEMPLATE_TOKEN.finditer(template):
+            self.literals.append(template[pos:match.start()])
+            self.formatters.append(match.group()[2:-2].strip())
+            pos = match.end()
+        self.literals.append(template[pos:])
+
+    def render(self, generator: RecordGenerator, template_id: Optional[int] = None) -> FakerSpansResult:
+        record = generator._get_random_record()
+        parts = [self.literals[0]]
+        spans = []
+        offset = len(self.literals[0])
+        for formatter, literal in zip(self.formatters, self.literals[1:]):
+            value = str(generator.format(formatter=formatter, record=record))
+            record.pop(formatter, None)
+            end = offset + len(value)
+            spans.append(FakerSpan(value=value, start=offset, end=end, type=formatter))
+            parts.append(value)
+            parts.append(literal)
+            offset = end + len(literal)
+        # presidio lists spans from the last to the first placeholder
+        spans.reverse()
+        return FakerSpansResult(fake="".join(parts), spans=spans, template=self.template, template_id=template_id)
+
+
+@lru_cache(maxsize=4096)
+def compile_template(template: str) -> CompiledTemplate:
+    return CompiledTemplate(template)
+
+
 class GenericProvider(ABC):
     """Parent class containing common methods shared by region specific providers"""
 
     def __init__(self):
-        pass
+        self.pii_alias_index = {}
+        self.nonpii_alias_index = {}
+        self.pii_alias_trie = AliasTrie()
+        self.nonpii_alias_trie = AliasTrie()
 
     def get_pii_types(self) -> list[str]:
         """Return all pii types in the pii_label_to_provider dict"""
@@ -73,21 +211,53 @@ class GenericProvider(ABC):
                     aliases_to_add.add(delimited_alias)
             prov.aliases = prov.aliases.union(aliases_to_add)
 
+    def index_providers(self) -> None:
+        """Build alias lookup tables for the pii and non-pii providers. Must be called after providers change."""
+        self.pii_alias_index, self.pii_alias_trie = self.build_alias_index(self.pii_providers)
+        self.nonpii_alias_index, self.nonpii_alias_trie = self.build_alias_index(self.nonpii_providers)
+
+    @staticmethod
+    def build_alias_index(providers: list[Provider]) -> Tuple[dict[str, Provider], AliasTrie]:
+        """Map every template name and alias to its provider. Providers earlier in the list win on conflicts."""
+        index = {}
+        trie = AliasTrie()
+        for provider in providers:
+            for alias in [provider.template_name, *sorted(provider.aliases)]:
+                index.setdefault(alias, provider)
+                trie.add(alias, provider)
+        return index, trie
+
     def get_pii_provider(self, name: str) -> Optional[Provider]:
         """Find PII provider that matches input name. Returns None if no match is found."""
         if not name:
             return
-        for provider in self.pii_providers:
-            if name.lower() == provider.template_name or name.lower() in provider.aliases:
-                return provider
+        return self.pii_alias_index.get(name.lower())
 
     def get_nonpii_provider(self, name: str) -> Optional[Provider]:
         """Find non-PII provider that matches input name. Returns None if no match is found."""
         if not name:
             return
-        for provider in self.nonpii_providers:
-            if name.lower() == provider.template_name or name.lower() in provider.aliases:
-                return provider
+        return self.nonpii_alias_index.get(name.lower())
+
+    def match_pii_provider(self, name: str) -> Optional[Provider]:
+        """Find PII provider with an alias contained in the input name, e.g. customerEmailAddress -> email"""
+        return self.match_provider(name, self.pii_alias_trie, self.nonpii_alias_trie)
+
+    def match_nonpii_provider(self, name: str) -> Optional[Provider]:
+        """Find non-PII provider with an alias contained in the input name, e.g. paymentId -> sha1"""
+        return self.match_provider(name, self.nonpii_alias_trie, self.pii_alias_trie)
+
+    @staticmethod
+    def match_provider(name: str, trie: AliasTrie, other_trie: AliasTrie) -> Optional[Provider]:
+        """Find the provider of the alias in trie that covers the end of name, unless a longer alias of other_trie
+        does, e.g. the non-PII alias min age rather than the PII alias age for minAge"""
+        if not name:
+            return
+        tokens = tokenize(name)
+        match = trie.match_tail(tokens)
+        other_match = other_trie.match_tail(tokens)
+        if match and (other_match is None or match[0] <= other_match[0]):
+            return match[1]
 
     def get_random_pii_provider(self) -> Provider:
         """choose random PII provider and generate a value"""
@@ -97,18 +267,45 @@ class GenericProvider(ABC):
         """Sample a random percentage of PII providers and associated values"""
         return random.sample(list(self.pii_providers), round(len(self.pii_providers) * percent))
 
-    def filter_providers(self, pii_types: list[str]) -> None:
-        """Filter out PII types not in the given list, marking them as non-PII"""
+    def filter_providers(self, pii_types: Optional[list[str]]) -> None:
+        """Filter out PII types not in the given list, marking them as non-PII. Parameters matching them are still
+        assigned their providers, but payloads containing them aren't labeled as PII."""
         if not pii_types:
-            pii_types = self.get_pii_types()
+            return
+        unknown = set(pii_types) - set(self.get_pii_types())
+        if unknown:
+            raise ValueError(f"Unknown pii types {sorted(unknown)}, choose from {self.get_pii_types()}")
+        # after the non-PII providers, which keep precedence on conflicting aliases
+        self.nonpii_providers.extend(p for p in self.pii_providers if p.template_name not in pii_types)
+        self.pii_providers = [p for p in self.pii_providers if p.template_name in pii_types]
+
+    def use_value_pools(self, pool_size: int) -> None:
+        """Sample the values of every pii and non-pii provider from a pool of pool_size pre-generated values"""
+        names = [provider.template_name for provider in [*self.pii_providers, *self.nonpii_providers]]
+        self.value_pools = ValuePools(self.custom_faker, names, pool_size)
 
     def get_faker(self, faker_provider: str):
         faker_generator = getattr(self.f.faker, faker_provider)
         return faker_generator
 
     def parse(self, template: str, template_id: int) -> FakerSpansResult:
-        """Parse payload template into a span, using data providers that match the template_names e.g. {{full_name}}"""
-        return self.f.parse(template=template, template_id=template_id)
+        """Parse payload template into a span, using data providers that match the template_names e.g. {{full_name}}.
+
+        Equivalent to PresidioDataGenerator.parse, rendering a cached CompiledTemplate of the payload template."""
+        factories = self.f.faker.factories
+        if len(factories) != 1 or not isinstance(factories[0], RecordGenerator):
+            return self.f.parse(template=template, template_id=template_id)
+        try:
+            payload_span = compile_template(template).render(factories[0], template_id)
+        except Exception as err:
+            raise AttributeError(
+                f'Failed to generate fake data based on template "{template}".'
+                f"You might need to add a new Faker provider! "
+                f"{err}"
+            )
+        if random.random() < self.f.lower_case_ratio:
+            payload_span = self.f._lower_pattern(payload_span)
+        return payload_span
 
 
 class MacAddressProvider(BaseProvider):
@@ -123,12 +320,22 @@ class MacAddressProvider(BaseProvider):
         return self.hexify(pattern)
 
 
+def luhn_check_digit(digits: str) -> str:
+    """Compute the Luhn check digit to append to the given digits"""
+    total = 0
+    # double every second digit, starting from the rightmost digit of the payload
+    for i, digit in enumerate(reversed(digits)):
+        d = int(digit)
+        if i % 2 == 0:
+            d = d * 2 - 9 if d > 4 else d * 2
+        total += d
+    return str(-total % 10)
+
+
 class IMEIProvider(BaseProvider):
     def imei(self) -> str:
-        imei = self.numerify(text="##-######-######-#")
-        while baluhn.verify(imei.replace("-", "")) is False:
-            imei = self.numerify(text="##-######-######-#")
-        return imei
+        digits = self.numerify(text="##############")
+        return f"{digits[:2]}-{digits[2:8]}-{digits[8:]}-{luhn_check_digit(digits)}"
 
 
 class GenderProvider(BaseProvider):
@@ -0,0 +1,35 @@
+# Copyright 2018- The Pixie Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# SPDX-License-Identifier: Apache-2.0
+
+from typing import Optional
+
+from privy.providers.english_us import English_US
+from privy.providers.generic import GenericProvider
+from privy.providers.german_de import German_DE
+
+REGIONS = {
+    "english_us": English_US,
+    "german_de": German_DE,
+}
+
+
+def load_region(region_name: str, pii_types: Optional[list[str]] = None, value_pool_size: int = 0) -> GenericProvider:
+    """Instantiate the language/region specific providers registered under region_name, optionally sampling
+    their values from pools of value_pool_size pre-generated values."""
+    region = REGIONS[region_name](pii_types=pii_types)
+    if value_pool_size:
+        region.use_value_pools(value_pool_size)
+    return region
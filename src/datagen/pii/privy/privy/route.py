@@ -17,73 +17,143 @@
 import json
 import logging
 
-from dicttoxml import dicttoxml
-from json2html import json2html
-
+from privy.dedup import TemplateDeduplicator, fingerprint
 from privy.generate.utils import PrivyFileType
+from privy.markup import HTMLRenderer, XMLRenderer
+from privy.profile import Profiler
+from privy.proto import ProtoConverter
 from privy.sql import SQLQueryBuilder
 
+# generate types whose payloads are flat, and that nested payload templates (e.g. request bodies) are flattened for
+FLAT_GENERATE_TYPES = ["sql", "proto"]
+
+
+def flatten_payload(payload_template: dict) -> dict:
+    """Flatten nested objects and arrays of a payload template into parameters named after their path, e.g.
+    {"user": {"emails": ["{{email}}"]}} into {"user.emails.0": "{{email}}"}"""
+    if not any(isinstance(value, (dict, list)) for value in payload_template.values()):
+        return payload_template
+    flat = {}
+
+    def flatten(prefix: str, value) -> None:
+        if isinstance(value, (dict, list)) and value:
+            for key, item in value.items() if isinstance(value, dict) else enumerate(value):
+                flatten(f"{prefix}.{key}", item)
+        else:
+            flat[prefix] = value
+
+    for name, value in payload_template.items():
+        flatten(str(name), value)
+    return flat
+
 
 class PayloadRoute:
     def __init__(self, file_writers, analyzer, args):
         self.file_writers = file_writers
+        self.proto = ProtoConverter()
         self.conversions = {
             "json": (json.dumps, {"default": "str"}),
-            "xml": (dicttoxml, {}),
-            "sql": (SQLQueryBuilder(args.region).build_query, {}),
-            "html": (json2html.convert, {}),
-            # todo @benkilimnik protobuf conversion
+            "xml": (XMLRenderer(args.xml_root, args.xml_attribute_style == "type").render, {}),
+            "sql": (SQLQueryBuilder(args.region, args.sql_dialects).build_query, {}),
+            "html": (HTMLRenderer(args.html_table_attributes, args.html_layout).render, {}),
+            "proto": (self.proto.convert, {}),
         }
         self.args = args
         self.analyzer = analyzer
-        self.unique_payload_templates = set()
+        self.deduplicator = TemplateDeduplicator(args.dedup_bloom_capacity, args.dedup_state)
         self.fuzzer = PayloadFuzzer()
+        # set by PayloadGenerator, see privy.profile
+        self.profiler = Profiler()
+        # when set (see privy.parallel), one JSON line is written per generated template and type, recording how
+        # many records it added to each output file so that shards can be deduplicated and merged. Output files are
+        # flushed before every line, so that the index only refers to records of workers killed mid spec that made it
+        # to disk.
+        self.index_file = None
 
     def is_duplicate(self, case_attr):
         """check if payload template with given arrangement of parameters already exists"""
         payload_template = json.dumps(case_attr, default=str)
-        if payload_template in self.unique_payload_templates:
+        if not self.deduplicator.add(fingerprint(payload_template)):
             logging.getLogger("privy").debug(
                 f"Skipping duplicate case: {payload_template}")
             return True
-        self.unique_payload_templates.add(payload_template)
 
-    def write_fuzzed_payloads(self, row, generate_type, writer):
-        for fuzzed_payload in self.fuzzer.fuzz_payload(row[0], generate_type):
-            row[0] = fuzzed_payload
-            writer.csv_writer.writerow(row)
+    def write_fuzzed_payloads(self, payload, has_pii, pii_types, generate_type, writer) -> int:
+        num_rows = 0
+        for fuzzed_payload in self.fuzzer.fuzz_payload(payload, generate_type):
+            writer.write_payload(fuzzed_payload, has_pii, pii_types)
+            num_rows += 1
+        return num_rows
+
+    def write_binary_payloads(self, payload_template, payload_spans, writer) -> None:
+        """serialize the rendered text format payloads of a proto template to binary protobuf messages"""
+        message = self.proto.message(payload_template).name
+        for span in payload_spans:
+            with self.profiler.phase("convert"):
+                payload, spans = self.proto.serialize(payload_template, span)
+            writer.write_binary(payload, spans, message, span.template_id)
+
+    def write_index_entry(self, payload_template, generate_type, converted_payload_template, num_payload_rows,
+                          pii_types) -> None:
+        payload_template = json.dumps(payload_template, default=str)
+        entry = {
+            "key": fingerprint(payload_template).hex(),
+            "type": generate_type,
+            "payloads": num_payload_rows,
+            "templates": converted_payload_template.count("\n") + 1,
+            "spans": self.args.spans_per_template,
+            "pii_types": list(pii_types),
+        }
+        for writer in self.file_writers[generate_type]:
+            writer.checkpoint()
+        self.index_file.write(f"{json.dumps(entry)}\n")
+        self.index_file.flush()
 
     def write_payload_to_csv(self, payload_template, has_pii, pii_types):
         if not payload_template or "null" in payload_template.values() or self.is_duplicate(payload_template):
             return
-        has_pii_str = str(int(has_pii))
-        pii_types_str = ",".join(set(pii_types))
+        pii_types_list = sorted(set(pii_types))
         for generate_type, privy_writers in self.file_writers.items():
             # convert case template (dict) to other types (json, sql, xml), and then to str for template parsing
             converter, kwargs = self.conversions.get(generate_type, None)
-            converted_payload_template = str(
-                converter(payload_template, **kwargs))
+            with self.profiler.phase("convert"):
+                template = flatten_payload(payload_template) if generate_type in FLAT_GENERATE_TYPES \
+                    else payload_template
+                converted_payload_template = str(
+                    converter(template, **kwargs))
             payload_spans = []
-            for i in range(self.args.spans_per_template):
-                payload_span = self.args.region.parse(template=converted_payload_template,
-                                                      template_id=self.analyzer.num_payloads)
-                if pii_types:
-                    self.analyzer.update_pii_counters(pii_types)
-                self.analyzer.update_payload_counts()
-                payload_spans.append(payload_span)
+            with self.profiler.phase("parse"):
+                for i in range(self.args.spans_per_template):
+                    payload_span = self.args.region.parse(template=converted_payload_template,
+                                                          template_id=self.analyzer.num_payloads)
+                    if pii_types:
+                        self.analyzer.update_pii_counters(pii_types)
+                    self.analyzer.update_payload_counts()
+                    payload_spans.append(payload_span)
             logging.getLogger("privy").debug(
                 f"Generated span: {payload_span.spans}")
-            for writer in privy_writers:
-                if writer.file_type == PrivyFileType.PAYLOADS:
-                    row = [payload_span.fake, has_pii_str, pii_types_str]
-                    if self.args.fuzz_payloads:
-                        self.write_fuzzed_payloads(row, generate_type, writer)
-                    writer.csv_writer.writerow(row)
-                if writer.file_type == PrivyFileType.TEMPLATES:
-                    writer.open_file.write(f"{converted_payload_template}\n")
-                if writer.file_type == PrivyFileType.SPANS:
-                    for span in payload_spans:
-                        writer.open_file.write(f"{span.toJSON()}\n")
+            num_payload_rows = 0
+            with self.profiler.phase("write"):
+                for writer in privy_writers:
+                    if writer.file_type == PrivyFileType.PAYLOADS:
+                        if self.args.fuzz_payloads:
+                            num_payload_rows += self.write_fuzzed_payloads(
+                                payload_span.fake, has_pii, pii_types_list, generate_type, writer)
+                        writer.write_payload(payload_span.fake, has_pii, pii_types_list)
+                        num_payload_rows += 1
+                    if writer.file_type == PrivyFileType.TEMPLATES:
+                        writer.write_template(converted_payload_template)
+                    if writer.file_type == PrivyFileType.SPANS:
+                        for span in payload_spans:
+                            writer.write_span(span)
+                    if writer.file_type == PrivyFileType.BINARY:
+                        self.write_binary_payloads(template, payload_spans, writer)
+                if self.index_file is not None:
+                    self.write_index_entry(payload_template, generate_type, converted_payload_template,
+                                           num_payload_rows, pii_types)
+            self.profiler.count("templates")
+            self.profiler.count("payloads", num_payload_rows)
+            self.profiler.count("spans", len(payload_spans))
 
 
 class PayloadFuzzer:
@@ -0,0 +1,70 @@
+# Copyright 2018- The Pixie Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# SPDX-License-Identifier: Apache-2.0
+
+import hashlib
+import heapq
+import random
+from pathlib import Path
+from typing import Optional
+
+from faker import Faker
+
+
+def spec_key(file: Path, api_specs_folder: Path) -> str:
+    """Machine independent identifier of a spec: its path relative to the api specs folder."""
+    try:
+        return Path(file).relative_to(api_specs_folder).as_posix()
+    except ValueError:
+        return Path(file).as_posix()
+
+
+def spec_seed(seed: int, key: str) -> int:
+    """Derive the 64-bit seed of the RNGs used to generate a single spec from the global seed and its key."""
+    digest = hashlib.blake2b(f"{seed}:{key}".encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big")
+
+
+def seed_generators(seed: int, faker: Optional[Faker] = None) -> None:
+    """Seed python's global RNG, the RNG shared by all faker generators and, if given, a region's faker instance."""
+    random.seed(seed)
+    Faker.seed(seed)
+    if faker is not None:
+        faker.seed_instance(seed)
+
+
+def shard_specs(api_specs: list[Path], api_specs_folder: Path, shard_index: int, shard_count: int) -> list[Path]:
+    """Return the specs assigned to shard_index out of shard_count shards.
+
+    Specs are assigned greedily, largest first, to the shard with the fewest bytes assigned so far, with ties broken by
+    a hash of the spec key. The assignment only depends on the set of spec keys and their sizes, so every machine of a
+    distributed run computes the same partition independently. The returned specs keep their input order.
+    """
+    if shard_count <= 1:
+        return api_specs
+
+    sizes = {file: Path(file).stat().st_size for file in api_specs}
+
+    def key_hash(file):
+        return hashlib.blake2b(spec_key(file, api_specs_folder).encode(), digest_size=8).digest()
+
+    loads = [(0, shard) for shard in range(shard_count)]
+    assigned = set()
+    for file in sorted(api_specs, key=lambda file: (-sizes[file], key_hash(file))):
+        load, shard = heapq.heappop(loads)
+        if shard == shard_index:
+            assigned.add(file)
+        heapq.heappush(loads, (load + sizes[file], shard))
+    return [file for file in api_specs if file in assigned]
@@ -14,23 +14,85 @@
 #
 # SPDX-License-Identifier: Apache-2.0
 
+import dataclasses
 import random
+from typing import Any, Optional
 
-from pypika import Case, Criterion, Table, functions
-from pypika.dialects import MySQLQuery, PostgreSQLQuery
+# query templates, filled in with clauses rendered for the dialect and payload. Optional clauses render to "" or
+# start with a space.
+SELECT = "SELECT {top}{columns}{case} FROM {table}{where}{groupby}{orderby}{limit}"
+INSERT = "INSERT INTO {table}{columns} VALUES ({values})"
+UPDATE = "UPDATE {table} SET {assignment}{where}"
+COMPARISONS = [">=", "<=", "=", "<>", ">", "<"]
+
+
+@dataclasses.dataclass(frozen=True)
+class SQLDialect:
+    """Identifier quoting, string literals, aggregate functions, conditions and row limit syntax of a SQL dialect"""
+
+    open_quote: str
+    close_quote: str
+    aggregates: tuple[str, ...]
+    # limit rows with SELECT TOP n rather than LIMIT n
+    top: bool = False
+    # backslashes escape characters in string literals, as in MySQL by default
+    backslash_escapes: bool = False
+    # prefix for unicode string literals, e.g. N'...' in MSSQL
+    string_prefix: str = ""
+    # a column on its own is a valid condition, rather than only boolean columns
+    bare_conditions: bool = True
+
+    def quote(self, identifier: str) -> str:
+        return f"{self.open_quote}{identifier.replace(self.close_quote, self.close_quote * 2)}{self.close_quote}"
+
+    def literal(self, value: Any) -> str:
+        """Render a payload value as a SQL literal"""
+        if value is None:
+            return "NULL"
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            return str(value)
+        value = str(value)
+        if self.backslash_escapes:
+            value = value.replace("\\", "\\\\")
+        return f"""{self.string_prefix}'{value.replace("'", "''")}'"""
+
+
+SQL_DIALECTS = {
+    "mysql": SQLDialect("`", "`", ("COUNT", "SUM", "AVG", "MIN", "MAX", "STD", "STDDEV"), backslash_escapes=True),
+    "postgresql": SQLDialect('"', '"', ("COUNT", "SUM", "AVG", "MIN", "MAX", "STDDEV"), bare_conditions=False),
+    "sqlite": SQLDialect('"', '"', ("COUNT", "SUM", "AVG", "MIN", "MAX", "TOTAL")),
+    "mssql": SQLDialect("[", "]", ("COUNT", "SUM", "AVG", "MIN", "MAX", "STDEV"), top=True, string_prefix="N",
+                        bare_conditions=False),
+}
+
+
+def is_integer(value: Any) -> bool:
+    try:
+        int(value)
+        return True
+    except (TypeError, ValueError):
+        return False
 
 
 class SQLQueryBuilder:
-    """Build sql query from json"""
+    """Build sql query from json
 
-    def __init__(self, providers):
-        self.payload = None
+    Renders a random SELECT, INSERT or UPDATE query over a random selection of the payload's parameters, in a random
+    one of the given dialects, by filling in string templates. SELECT queries have a random selection of where,
+    order by, limit, group by with having, and case clauses, UPDATE queries optionally a where clause and INSERT
+    queries optionally a column list.
+    """
+
+    def __init__(self, providers, dialects: Optional[list[str]] = None):
         self.query_types = {
             "select": ["orderby", "where", "limit", "groupby", "case"],
             "insert": ["columns"],
             "update": ["where"],
         }
-        self.providers = providers
+        self.dialects = [SQL_DIALECTS[dialect] for dialect in dialects or SQL_DIALECTS]
+        self.word = providers.get_faker("word")
+        # quoted identifiers of each dialect, since the same parameter names recur across payloads
+        self.identifiers = {dialect: {} for dialect in self.dialects}
 
     def get_random_sample(self, min, source):
         """return random sample from input list. Min number of samples is 1"""
@@ -39,149 +101,91 @@ class SQLQueryBuilder:
     def get_random_val(self, source):
         return random.choice(list(source))
 
-    def _where(self, pii_labels, query):
-        """Add where clause to query"""
-        conditions = []
-        for label in pii_labels:
-            table_col = getattr(self.table, label)
-            options = [
-                table_col == self.payload[label],
-                table_col,
-                table_col != self.payload[label],
-                (table_col == self.payload[label]) | (table_col == self.providers.get_faker("word")()),
-            ]
-            # todo: remove useful try except? What does the first cast to int do?
-            try:
-                int(self.payload[label])
-                options.append(table_col > random.randint(0, 1000))
-                options.append(table_col < random.randint(0, 1000))
-                options.append(table_col <= random.randint(0, 1000))
-                options.append(table_col >= random.randint(0, 1000))
-            except Exception:
-                pass
-            conditions.append(self.get_random_val(options))
-        conditions = Criterion.all(conditions)
-        query = query(conditions)
-        return query
-
-    def _case(self, pii_labels, query):
-        """Add case statement to select query"""
-        case = Case()
-        for label in pii_labels:
-            table_col = getattr(self.table, label)
-            options = [
-                table_col == self.payload[label],
-                table_col,
-                table_col != self.payload[label],
-                (table_col == self.payload[label]) | (table_col == self.providers.get_faker("word")()),
-            ]
-            try:
-                int(self.payload[label])
-                options.append(table_col > random.randint(0, 1000))
-                options.append(table_col < random.randint(0, 1000))
-                options.append(table_col <= random.randint(0, 1000))
-                options.append(table_col >= random.randint(0, 1000))
-                case = case.when(self.get_random_val(options), random.randint(0, 1000))
-                continue
-            except Exception:
-                pass
-            case = case.when(self.get_random_val(options), self.providers.get_faker("word")())
-        return query.select(table_col, case)
-
-    def _having(self, pii_label, query):
-        """Add having clause to select query"""
-        funs = [
-            functions.Count,
-            functions.Sum,
-            functions.Avg,
-            functions.Min,
-            functions.Max,
-            functions.Std,
-            functions.StdDev,
-        ]
-        fun = self.get_random_val(funs)
-        condition = random.randint(0, 10000)
+    def _quote(self, dialect: SQLDialect, identifier: str) -> str:
+        identifiers = self.identifiers[dialect]
+        quoted = identifiers.get(identifier)
+        if quoted is None:
+            quoted = identifiers[identifier] = dialect.quote(identifier)
+        return quoted
+
+    def _condition(self, dialect: SQLDialect, column: str, value: Any) -> str:
+        """Random condition on a column, comparing it with the payload value, a random word or a random number"""
+        value_literal = dialect.literal(value)
         options = [
-            fun(pii_label) >= condition,
-            fun(pii_label) <= condition,
-            fun(pii_label) == condition,
-            fun(pii_label) != condition,
-            fun(pii_label) > condition,
-            fun(pii_label) < condition,
+            f"{column}={value_literal}",
+            column if dialect.bare_conditions else f"{column} IS NOT NULL",
+            f"{column}<>{value_literal}",
+            f"({column}={value_literal} OR {column}={dialect.literal(self.word())})",
         ]
-        query = query.having(self.get_random_val(options))
-        return query
+        if is_integer(value):
+            options.extend(f"{column}{comparison}{random.randint(0, 1000)}" for comparison in [">", "<", "<=", ">="])
+        return self.get_random_val(options)
+
+    def _where(self, dialect: SQLDialect, columns: list[str], values: list[Any]) -> str:
+        """Render where clause"""
+        return " WHERE " + " AND ".join(
+            self._condition(dialect, column, value) for column, value in zip(columns, values))
 
-    def _select(self, pii_labels, pii_labels_str, query):
+    def _case(self, dialect: SQLDialect, columns: list[str], values: list[Any]) -> str:
+        """Render case statement of select query"""
+        whens = []
+        for column, value in zip(columns, values):
+            result = random.randint(0, 1000) if is_integer(value) else dialect.literal(self.word())
+            whens.append(f" WHEN {self._condition(dialect, column, value)} THEN {result}")
+        return f",{columns[-1]},CASE{''.join(whens)} END"
+
+    def _having(self, dialect: SQLDialect, column: str) -> str:
+        """Render having clause of select query"""
+        aggregate = self.get_random_val(dialect.aggregates)
+        return f" HAVING {aggregate}({column}){self.get_random_val(COMPARISONS)}{random.randint(0, 10000)}"
+
+    def _select(self, dialect: SQLDialect, table: str, columns: list[str], values: list[Any]) -> str:
         """construct select query"""
-        query = query.select(pii_labels_str)
+        clauses = dict.fromkeys(["top", "case", "where", "groupby", "orderby", "limit"], "")
         # choose subtypes (e.g. for select this could be orderby, where, limit, offset)
-        subtypes = self.get_random_sample(1, self.query_types["select"])
-        # self.logger.debug("subtypes", subtypes)
-        for subtype in subtypes:
-            # get method for this subtype e.g. select.where()
-            query_method = getattr(query, subtype)
+        for subtype in self.get_random_sample(1, self.query_types["select"]):
             if subtype == "orderby":
-                # call function with labels e.g. select.orderby("name, address")
-                query = query_method(pii_labels_str)
+                clauses["orderby"] = f" ORDER BY {','.join(columns)}"
             elif subtype == "where":
-                query = self._where(pii_labels, query_method)
+                clauses["where"] = self._where(dialect, columns, values)
             elif subtype == "limit":
-                query = query_method(random.randint(0, 100))
+                limit = random.randint(0, 100)
+                if dialect.top:
+                    clauses["top"] = f"TOP {limit} "
+                else:
+                    clauses["limit"] = f" LIMIT {limit}"
             elif subtype == "groupby":
-                query = query_method(self.get_random_val(pii_labels))
-                query = self._having(self.get_random_val(pii_labels), query)
+                clauses["groupby"] = f" GROUP BY {self.get_random_val(columns)}" + \
+                    self._having(dialect, self.get_random_val(columns))
             elif subtype == "case":
-                query = self._case(pii_labels, query)
-        return query
+                clauses["case"] = self._case(dialect, columns, values)
+        return SELECT.format(table=table, columns=",".join(columns), **clauses)
 
-    def _update(self, pii_labels, query):
+    def _update(self, dialect: SQLDialect, table: str, columns: list[str], values: list[Any]) -> str:
         """construct update query"""
         subtypes = self.get_random_sample(0, self.query_types["update"])
-        if subtypes:  # where
-            query = getattr(
-                query.update(self.table).set(
-                    pii_labels[0], self.payload[pii_labels[0]]
-                ),
-                "where",
-            )
-            query = self._where(pii_labels, query)
-        else:
-            query = query.update(self.table).set(
-                pii_labels[0], self.payload[pii_labels[0]]
-            )
-        return query
-
-    def _insert(self, pii_vals_str, pii_labels_str, query):
+        where = self._where(dialect, columns, values) if subtypes else ""
+        return UPDATE.format(table=table, assignment=f"{columns[0]}={dialect.literal(values[0])}", where=where)
+
+    def _insert(self, dialect: SQLDialect, table: str, columns: list[str], values: list[Any]) -> str:
         """construct insert query"""
         subtypes = self.get_random_sample(0, self.query_types["insert"])
-        if subtypes:  # with columns
-            query = query.into(self.table).columns(pii_labels_str).insert(pii_vals_str)
-        else:  # no columns shown
-            query = query.into(self.table).insert(pii_vals_str)
-        return query
+        column_list = f" ({','.join(columns)})" if subtypes else ""
+        return INSERT.format(table=table, columns=column_list,
+                             values=",".join(dialect.literal(value) for value in values))
 
-    def build_query(self, payload):
+    def build_query(self, payload: dict) -> str:
         """Build sql query from json"""
-        self.payload = payload
-        table = Table(self.providers.get_faker("word")())
-        self.table = table
-        self.dialects = [
-            MySQLQuery.from_(table),
-            PostgreSQLQuery.from_(table),
-        ]
-        query = random.choice(self.dialects)
+        dialect = random.choice(self.dialects)
+        table = dialect.quote(self.word())
         # choose a query type e.g. select
         query_type = self.get_random_val(self.query_types.keys())
         # choose selection of json keys (pii types), e.g. "name, address"
-        pii_labels = self.get_random_sample(1, self.payload.keys())
-        pii_labels_str = ",".join(pii_labels)
-        pii_vals = [str(self.payload[pii_label]) for pii_label in pii_labels]
-        pii_vals_str = ",".join(pii_vals)
+        pii_labels = self.get_random_sample(1, payload.keys())
+        columns = [self._quote(dialect, label) for label in pii_labels]
+        values = [payload[label] for label in pii_labels]
         if query_type == "insert":
-            query = self._insert(pii_vals_str, pii_labels_str, query)
+            return self._insert(dialect, table, columns, values)
         if query_type == "update":
-            query = self._update(pii_labels, query)
-        if query_type == "select":
-            query = self._select(pii_labels, pii_labels_str, query)
-        return query
+            return self._update(dialect, table, columns, values)
+        return self._select(dialect, table, columns, values)
@@ -0,0 +1,307 @@
+# Copyright 2018- The Pixie Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# SPDX-License-Identifier: Apache-2.0
+
+"""Offline benchmarks of privy, run on the openAPI specs bundled with the tests.
+
+Measures the payloads and spans generated per second for every region and output format, the cost of region.parse
+for every PII provider and the cost of converting payload templates to each output format. Results are written as
+JSON with sorted keys, so that the results of two commits can be diffed, or compared with --compare.
+"""
+
+import argparse
+import json
+import logging
+import pathlib
+import platform
+import random
+import shutil
+import subprocess
+import tempfile
+import time
+from typing import Any, Callable
+
+from dicttoxml import dicttoxml
+from json2html import json2html
+
+from privy.generate.utils import PrivyFileType
+from privy.markup import HTMLRenderer, XMLRenderer
+from privy.providers.regions import REGIONS, load_region
+from privy.sql import SQLQueryBuilder
+from privy.tests.utils import generate_one_api_spec
+
+RESULTS_VERSION = 1
+SPECS = ["openapi.json", "openapi2.json"]
+GENERATE_TYPES = ["json", "xml", "sql", "html"]
+# relative changes within this fraction are reported as noise by --compare
+NOISE = 0.05
+
+
+def parse_args():
+    """Perform command-line argument parsing."""
+
+    parser = argparse.ArgumentParser(
+        description="Benchmark privy on the openAPI specs bundled with its tests.",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+
+    parser.add_argument(
+        "--out",
+        "-o",
+        required=False,
+        default="benchmark.json",
+        help="Path to write the benchmark results to.",
+    )
+
+    parser.add_argument(
+        "--compare",
+        "-c",
+        required=False,
+        default=None,
+        help="Path to the results of an earlier benchmark run, e.g. of another commit, to compare the results with.",
+    )
+
+    parser.add_argument(
+        "--regions",
+        nargs="+",
+        required=False,
+        choices=list(REGIONS),
+        default=list(REGIONS),
+        help="Regions to benchmark.",
+    )
+
+    parser.add_argument(
+        "--generate_types",
+        "-g",
+        nargs="+",
+        required=False,
+        choices=GENERATE_TYPES,
+        default=GENERATE_TYPES,
+        help="Output formats to benchmark.",
+    )
+
+    parser.add_argument(
+        "--repeat",
+        "-r",
+        type=int,
+        required=False,
+        default=3,
+        help="Run every benchmark this many times, keeping the fastest run.",
+    )
+
+    parser.add_argument(
+        "--parse_calls",
+        type=int,
+        required=False,
+        default=200,
+        help="Number of times to parse the template of each PII provider per run.",
+    )
+
+    parser.add_argument(
+        "--seed",
+        "-s",
+        type=int,
+        required=False,
+        default=0,
+        help="Seed of the generated payloads, so that every run generates the same dataset.",
+    )
+
+    parser.add_argument(
+        "--logging",
+        "-l",
+        required=False,
+        default="info",
+        choices=["debug", "info", "warning", "error"],
+        help="logging level: debug, info, warning, error",
+    )
+
+    return parser.parse_args()
+
+
+def best_time(function: Callable[[Any], Any], items: list, repeat: int) -> float:
+    """Fastest of repeat runs of function over items, in microseconds per item"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for item in items:
+            function(item)
+        best = min(best, time.perf_counter() - start)
+    return best / max(len(items), 1) * 1e6
+
+
+class Benchmark:
+    def __init__(self, args: argparse.Namespace, api_specs_folder: pathlib.Path):
+        self.args = args
+        # one folder per bundled spec, in which it is named like the specs of the openapi-directory
+        self.api_specs_folder = api_specs_folder
+        self.regions = {region_name: load_region(region_name) for region_name in args.regions}
+        self.log = logging.getLogger("privy.benchmark")
+
+    def generate(self, region_name: str, generate_type: str, file_type=PrivyFileType.PAYLOADS,
+                 profile: pathlib.Path = None) -> str:
+        """Generate the payloads of every bundled spec in memory"""
+        file = generate_one_api_spec(self.api_specs_folder, self.regions[region_name], False, generate_type,
+                                     file_type, logging=self.args.logging, seed=self.args.seed, profile=profile)
+        return file.getvalue()
+
+    def bench_generate(self) -> dict:
+        """Payloads and spans generated per second, excluding the setup of the generator"""
+        results = {}
+        with tempfile.TemporaryDirectory() as tmp:
+            profile_path = pathlib.Path(tmp) / "profile.json"
+            for region_name in self.args.regions:
+                for generate_type in self.args.generate_types:
+                    best = None
+                    for _ in range(self.args.repeat):
+                        self.generate(region_name, generate_type, profile=profile_path)
+                        report = json.loads(profile_path.read_text())
+                        if best is None or report["spec_seconds"] < best["spec_seconds"]:
+                            best = report
+                    seconds = best["spec_seconds"]
+                    counts = best["counts"]
+                    results.setdefault(region_name, {})[generate_type] = {
+                        "seconds": seconds,
+                        **counts,
+                        "payloads_per_second": counts["payloads"] / seconds,
+                        "spans_per_second": counts["spans"] / seconds,
+                        "phases": best["phases"],
+                    }
+                    self.log.info(f"generate {region_name} {generate_type}: {counts['payloads'] / seconds:.0f} "
+                                  f"payloads/s, {counts['spans'] / seconds:.0f} spans/s")
+        return results
+
+    def bench_parse(self) -> dict:
+        """Microseconds per region.parse of the template of every PII provider, and of generated payload templates"""
+        results = {}
+        for region_name, region in self.regions.items():
+            templates = self.generate(region_name, "json", PrivyFileType.TEMPLATES).splitlines()
+            providers = {}
+            for pii_type in region.get_pii_types():
+                providers[pii_type] = best_time(lambda t: region.parse(template=t, template_id=0),
+                                                [f"{{{{{pii_type}}}}}"] * self.args.parse_calls, self.args.repeat)
+            results[region_name] = {
+                "providers": providers,
+                "templates": best_time(lambda t: region.parse(template=t, template_id=0), templates,
+                                       self.args.repeat),
+            }
+            slowest = sorted(providers.items(), key=lambda item: item[1], reverse=True)[:5]
+            self.log.info(f"parse {region_name}: {results[region_name]['templates']:.0f}us per payload template, "
+                          "slowest providers " + ", ".join(f"{pii_type} {us:.0f}us" for pii_type, us in slowest))
+        return results
+
+    def bench_convert(self) -> dict:
+        """Microseconds per conversion of a payload template to each output format, and with the dicttoxml and
+        json2html libraries the xml and html renderers replace"""
+        results = {}
+        for region_name, region in self.regions.items():
+            templates = self.generate(region_name, "json", PrivyFileType.TEMPLATES).splitlines()
+            # flat templates only, i.e. of path, query, header and cookie parameters, since dicttoxml fails on the
+            # lists of request bodies on python >= 3.10
+            templates = [template for template in map(json.loads, templates)
+                         if not any(isinstance(value, (dict, list)) for value in template.values())]
+            conversions = {
+                "json": lambda t: json.dumps(t, default=str),
+                "xml": XMLRenderer().render,
+                "sql": SQLQueryBuilder(region).build_query,
+                "html": HTMLRenderer().render,
+                "dicttoxml": dicttoxml,
+                "json2html": json2html.convert,
+            }
+            # build_query samples the clauses of each query from the global RNG
+            random.seed(self.args.seed)
+            results[region_name] = {generate_type: best_time(convert, templates, self.args.repeat)
+                                    for generate_type, convert in conversions.items()}
+            costs = ", ".join(f"{generate_type} {us:.0f}us" for generate_type, us in results[region_name].items())
+            self.log.info(f"convert {region_name}: {costs}")
+        return results
+
+    def run(self) -> dict:
+        return {
+            "version": RESULTS_VERSION,
+            "environment": environment(),
+            "options": {k: getattr(self.args, k)
+                        for k in ["regions", "generate_types", "repeat", "parse_calls", "seed"]},
+            "generate": self.bench_generate(),
+            "parse_us": self.bench_parse(),
+            "convert_us": self.bench_convert(),
+        }
+
+
+def environment() -> dict:
+    """Where the benchmark ran, so that results of different machines aren't mistaken for regressions"""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                                cwd=pathlib.Path(__file__).parent).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+    }
+
+
+def flatten(results: dict, prefix: str = "") -> dict[str, float]:
+    flat = {}
+    for key, value in results.items():
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{prefix}{key}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[f"{prefix}{key}"] = value
+    return flat
+
+
+def compare(baseline: dict, results: dict) -> list[str]:
+    """Describe the rates and costs that changed by more than NOISE relative to the baseline"""
+    baseline, results = flatten(baseline), flatten(results)
+    changes = []
+    for key, value in results.items():
+        higher_is_better = key.endswith("per_second")
+        if not (higher_is_better or key.startswith(("parse_us.", "convert_us."))) or not baseline.get(key):
+            continue
+        change = value / baseline[key] - 1
+        if abs(change) > NOISE:
+            better = (change > 0) == higher_is_better
+            changes.append(
+                f"{'faster' if better else 'SLOWER'} {change:+.0%} {key}: {baseline[key]:.4g} -> {value:.4g}")
+    return sorted(changes)
+
+
+def main(args):
+    logging.basicConfig(level=logging.WARNING)
+    # only log the benchmark results, not the progress of the generator
+    logging.getLogger("privy").setLevel(logging.WARNING)
+    log = logging.getLogger("privy.benchmark")
+    log.setLevel(args.logging.upper())
+    with tempfile.TemporaryDirectory() as api_specs_folder:
+        api_specs_folder = pathlib.Path(api_specs_folder)
+        for spec in SPECS:
+            spec_folder = api_specs_folder / pathlib.Path(spec).stem
+            spec_folder.mkdir()
+            shutil.copy(pathlib.Path(__file__).parent / spec, spec_folder / "openapi.json")
+        results = Benchmark(args, api_specs_folder).run()
+    with open(args.out, "w") as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+        f.write("\n")
+    log.info(f"Wrote benchmark results to {args.out}")
+    if args.compare:
+        with open(args.compare) as f:
+            for change in compare(json.load(f), results):
+                log.info(change)
+
+
+if __name__ == "__main__":
+    main(parse_args())
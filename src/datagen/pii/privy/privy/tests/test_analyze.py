@@ -0,0 +1,89 @@
+# Copyright 2018- The Pixie Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# SPDX-License-Identifier: Apache-2.0
+
+import random
+import unittest
+from collections import Counter
+
+from privy.analyze import DatasetAnalyzer, PIITypeHeap
+from privy.providers.english_us import English_US
+
+
+class TestDatasetAnalyzer(unittest.TestCase):
+    def setUp(self):
+        self.region = English_US()
+        self.pii_types = self.region.get_pii_types()
+
+    def test_pii_type_heap(self):
+        rng = random.Random(0)
+        heap = PIITypeHeap(self.pii_types)
+        counts = Counter({pii_type: 0 for pii_type in self.pii_types})
+        order = {pii_type: i for i, pii_type in enumerate(self.pii_types)}
+        for _ in range(2000):
+            pii_type = rng.choice(self.pii_types)
+            n = rng.randint(1, 3)
+            heap.increment(pii_type, n)
+            counts[pii_type] += n
+            expected = sorted(counts.items(), key=lambda item: (item[1], order[item[0]]))
+            k = rng.randint(1, 10)
+            self.assertEqual(heap.k_lowest(k), expected[:k])
+            self.assertEqual(heap.lowest(), min(counts.items(), key=lambda item: item[1]))
+        heap.increment("new_type", 1)
+        self.assertIn(("new_type", 1), heap.k_lowest(len(self.pii_types) + 1))
+
+    def test_pii_type_heap_new_types(self):
+        heap = PIITypeHeap(["a", "b", "c"])
+        for pii_type in ["a", "b", "c"]:
+            heap.increment(pii_type, 5)
+        # new pii types with lower counts than every leaf's parent
+        heap.increment("d", 1)
+        self.assertEqual(heap.lowest(), ("d", 1))
+        heap.increment("e", 0)
+        self.assertEqual(heap.k_lowest(3), [("e", 0), ("d", 1), ("a", 5)])
+        for i, (count, order, pii_type) in enumerate(heap.heap):
+            self.assertEqual(heap.position[pii_type], i)
+            if i:
+                self.assertLessEqual(heap.heap[(i - 1) // 2], heap.heap[i])
+
+    def test_running_totals(self):
+        analyzer = DatasetAnalyzer(self.region)
+        for i in range(100):
+            if i % 3:
+                analyzer.update_pii_counters(random.sample(self.pii_types, 3))
+            analyzer.update_payload_counts()
+        self.assertEqual(analyzer.num_pii_types, sum(analyzer.count_pii_types.values()))
+        self.assertAlmostEqual(analyzer.num_pii_types_per_pii_payload, 3)
+        restored = DatasetAnalyzer(self.region)
+        restored.restore_state(analyzer.get_state())
+        self.assertEqual(restored.k_lowest_pii_types(5), analyzer.k_lowest_pii_types(5))
+        self.assertEqual(restored.num_pii_types, analyzer.num_pii_types)
+
+    def test_num_pii_payloads_needed(self):
+        for num_payloads, num_pii_payloads in [(0, 0), (1, 0), (10, 3), (1000, 10), (7, 7), (100, 49)]:
+            for percentage in [0, 1, 33, 50, 99, 100]:
+                analyzer = DatasetAnalyzer(self.region)
+                analyzer.num_payloads, analyzer.num_pii_payloads = num_payloads, num_pii_payloads
+                needed = analyzer.num_pii_payloads_needed(percentage)
+                # simulate adding PII payloads one at a time, as equalizing did before planning
+                added = 0
+                while percentage and (num_payloads + added == 0 or round(
+                        (num_pii_payloads + added) / (num_payloads + added) * 100) < percentage):
+                    added += 1
+                self.assertEqual(needed, added, (num_payloads, num_pii_payloads, percentage))
+
+
+if __name__ == "__main__":
+    unittest.main()
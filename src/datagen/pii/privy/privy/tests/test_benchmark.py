@@ -0,0 +1,54 @@
+# Copyright 2018- The Pixie Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# SPDX-License-Identifier: Apache-2.0
+
+import argparse
+import json
+import pathlib
+import tempfile
+import unittest
+
+from privy.tests.benchmark import compare, main
+
+
+class TestBenchmark(unittest.TestCase):
+    def test_benchmark(self):
+        with tempfile.TemporaryDirectory() as out_folder:
+            out = pathlib.Path(out_folder) / "benchmark.json"
+            main(argparse.Namespace(out=str(out), compare=None, regions=["english_us"], generate_types=["json", "sql"],
+                                    repeat=1, parse_calls=2, seed=0, logging="warning"))
+            results = json.loads(out.read_text())
+        self.assertEqual(list(results), sorted(results))
+        self.assertEqual(list(results["generate"]["english_us"]), ["json", "sql"])
+        for generate_type in ["json", "sql"]:
+            generated = results["generate"]["english_us"][generate_type]
+            self.assertGreater(generated["payloads"], 0)
+            self.assertEqual(generated["spans"], 10 * generated["templates"])
+            self.assertAlmostEqual(generated["spans_per_second"], generated["spans"] / generated["seconds"])
+        self.assertIn("email", results["parse_us"]["english_us"]["providers"])
+        self.assertEqual(sorted(results["convert_us"]["english_us"]),
+                         ["dicttoxml", "html", "json", "json2html", "sql", "xml"])
+
+        slower = json.loads(json.dumps(results))
+        slower["generate"]["english_us"]["json"]["payloads_per_second"] /= 2
+        slower["parse_us"]["english_us"]["templates"] *= 2
+        changes = compare(results, slower)
+        self.assertEqual(len(changes), 2)
+        self.assertTrue(all(change.startswith("SLOWER") for change in changes))
+        self.assertEqual(compare(results, results), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
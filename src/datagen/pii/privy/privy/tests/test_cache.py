@@ -0,0 +1,88 @@
+# Copyright 2018- The Pixie Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# SPDX-License-Identifier: Apache-2.0
+
+import pathlib
+import tempfile
+import unittest
+
+import schemathesis
+
+from privy.cache import SpecCache
+
+SWAGGER_YAML = """
+swagger: "2.0"
+info:
+  title: test
+  version: "1.0"
+paths:
+  /users/{user_id}:
+    get:
+      parameters:
+        - name: user_id
+          in: path
+          required: true
+          type: string
+        - $ref: "#/parameters/email"
+      responses:
+        "200":
+          description: OK
+parameters:
+  email:
+    name: email
+    in: query
+    type: string
+"""
+
+
+class TestSpecCache(unittest.TestCase):
+    def setUp(self):
+        self.lufthansa_openapi = pathlib.Path(__file__).parent / "openapi.json"
+
+    def assert_same_schema(self, cached, parsed):
+        self.assertEqual(cached.raw_schema, parsed.raw_schema)
+        cached_ops = [(path, method) for path in cached.keys() for method in cached[path]]
+        parsed_ops = [(path, method) for path in parsed.keys() for method in parsed[path]]
+        self.assertEqual(cached_ops, parsed_ops)
+
+    def test_json_spec(self):
+        with tempfile.TemporaryDirectory() as cache_folder:
+            cache = SpecCache(pathlib.Path(cache_folder))
+            first = cache.load_schema(self.lufthansa_openapi)
+            second = cache.load_schema(self.lufthansa_openapi)
+            self.assertEqual((cache.misses, cache.hits), (1, 1))
+            self.assert_same_schema(first, schemathesis.from_path(self.lufthansa_openapi))
+            self.assert_same_schema(second, first)
+
+    def test_yaml_spec_keyed_by_content(self):
+        with tempfile.TemporaryDirectory() as folder:
+            spec = pathlib.Path(folder) / "swagger.yaml"
+            spec.write_text(SWAGGER_YAML)
+            cache = SpecCache(pathlib.Path(folder) / "cache")
+            cache.load_schema(spec)
+            schema = cache.load_schema(spec)
+            self.assertEqual((cache.misses, cache.hits), (1, 1))
+            self.assert_same_schema(schema, schemathesis.from_path(spec))
+            operation = schema["/users/{user_id}"]["get"]
+            self.assertEqual([p.name for p in operation.query], ["email"])
+            # changing the file contents invalidates its cache entry
+            spec.write_text(SWAGGER_YAML.replace("email", "phone"))
+            schema = cache.load_schema(spec)
+            self.assertEqual(cache.misses, 2)
+            self.assertEqual([p.name for p in schema["/users/{user_id}"]["get"].query], ["phone"])
+
+
+if __name__ == "__main__":
+    unittest.main()
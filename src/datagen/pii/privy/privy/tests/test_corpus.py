@@ -0,0 +1,113 @@
+# Copyright 2018- The Pixie Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# SPDX-License-Identifier: Apache-2.0
+
+
+import json
+import os
+import pathlib
+import shutil
+import tempfile
+import unittest
+from datetime import timedelta
+
+from privy.corpus import (DEFAULT_SECONDS_PER_BYTE, CorpusIndex, Progress,
+                          longest_first)
+from privy.providers.english_us import English_US
+from privy.tests.utils import generate_one_api_spec
+
+
+class TestCorpusIndex(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.folder = pathlib.Path(self.tmp.name)
+        self.specs = []
+        for name, size in [("small", 10), ("large", 1000), ("medium", 100)]:
+            (self.folder / name).mkdir()
+            self.specs.append(self.folder / name / "openapi.json")
+            self.specs[-1].write_text("x" * size)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_estimates(self):
+        corpus = CorpusIndex()
+        corpus.scan(self.specs, self.folder)
+        small, large, medium = self.specs
+        # untimed specs are estimated by size
+        estimates = corpus.estimates(self.specs, self.folder)
+        self.assertEqual(estimates[large], 1000 * DEFAULT_SECONDS_PER_BYTE)
+        self.assertEqual(longest_first(self.specs, estimates), [large, medium, small])
+        # and then by the seconds per byte of the timed specs
+        corpus.record("small/openapi.json", 5.0, 2, 3)
+        estimates = corpus.estimates(self.specs, self.folder)
+        self.assertEqual(estimates[small], 5.0)
+        self.assertEqual(estimates[medium], 50.0)
+        corpus.record("medium/openapi.json", 500.0, 4, 6)
+        estimates = corpus.estimates(self.specs, self.folder)
+        self.assertAlmostEqual(estimates[large], 1000 * 505 / 110)
+        self.assertEqual(longest_first(self.specs, estimates), [large, medium, small])
+        self.assertEqual(corpus.specs["medium/openapi.json"]["operations"], 4)
+        self.assertEqual(corpus.specs["medium/openapi.json"]["parameters"], 6)
+        # specs of killed workers keep their counts
+        corpus.record("medium/openapi.json", 600.0)
+        self.assertEqual(corpus.specs["medium/openapi.json"]["operations"], 4)
+        self.assertEqual(corpus.specs["medium/openapi.json"]["seconds"], 600.0)
+
+    def test_persistence(self):
+        path = self.folder / "corpus_index.json"
+        corpus = CorpusIndex(path)
+        corpus.scan(self.specs, self.folder)
+        corpus.record("small/openapi.json", 5.0, 2, 3)
+        corpus.record("large/openapi.json", 7.0, 2, 3)
+        corpus.save()
+        # changed specs are reset
+        self.specs[1].write_text("y" * 2000)
+        corpus = CorpusIndex(path)
+        corpus.scan(self.specs, self.folder)
+        self.assertEqual(corpus.specs["small/openapi.json"]["seconds"], 5.0)
+        self.assertNotIn("seconds", corpus.specs["large/openapi.json"])
+        self.assertEqual(corpus.specs["large/openapi.json"]["size"], 2000)
+        path.write_text("{")
+        self.assertEqual(CorpusIndex(path).specs, {})
+
+    def test_progress(self):
+        small, large, medium = self.specs
+        progress = Progress({small: 10.0, large: 100.0, medium: 50.0}, num_workers=2)
+        self.assertEqual(progress.eta(), timedelta(seconds=80))
+        # specs take twice as long as estimated
+        progress.done(large, 200.0)
+        self.assertEqual(progress.eta(), timedelta(seconds=60))
+        progress.done(medium, 100.0)
+        progress.done(small, 20.0)
+        self.assertEqual(progress.eta(), timedelta(0))
+        self.assertEqual(progress.text(), "ETA 0:00:00")
+
+    def test_generate_records_specs(self):
+        api_specs_folder = self.folder / "specs"
+        (api_specs_folder / "lufthansa").mkdir(parents=True)
+        shutil.copy(pathlib.Path(__file__).parent / "openapi.json", api_specs_folder / "lufthansa")
+        path = self.folder / "corpus_index.json"
+        generate_one_api_spec(api_specs_folder, English_US(), False, "json", logging="warning", corpus_index=path)
+        entry = json.loads(path.read_text())["specs"]["lufthansa/openapi.json"]
+        self.assertEqual(entry["size"], os.path.getsize(api_specs_folder / "lufthansa" / "openapi.json"))
+        self.assertEqual(entry["operations"], 15)
+        # 31 path, 29 query and 15 header parameters
+        self.assertEqual(entry["parameters"], 75)
+        self.assertGreater(entry["seconds"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
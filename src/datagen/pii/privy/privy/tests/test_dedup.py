@@ -0,0 +1,91 @@
+# Copyright 2018- The Pixie Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# SPDX-License-Identifier: Apache-2.0
+
+import os
+import pathlib
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from privy.dedup import TemplateDeduplicator, fingerprint
+
+GENERATE_WITH_STATE = """
+import pathlib, sys
+from privy.generate.utils import PrivyFileType
+from privy.providers.english_us import English_US
+from privy.tests.utils import generate_one_api_spec
+file = generate_one_api_spec(pathlib.Path(sys.argv[1]), English_US(), False, "json", PrivyFileType.TEMPLATES,
+                             logging="warning", seed=7, dedup_state=sys.argv[2])
+pathlib.Path(sys.argv[3]).write_text(file.getvalue())
+"""
+
+
+class TestTemplateDeduplicator(unittest.TestCase):
+    def setUp(self):
+        self.templates = [fingerprint(f'{{"id": "{{{{uuid4}}}}", "n": {i}}}') for i in range(1000)]
+
+    def assert_dedups(self, deduplicator):
+        self.assertTrue(all(deduplicator.add(t) for t in self.templates))
+        self.assertFalse(any(deduplicator.add(t) for t in self.templates))
+        self.assertEqual(len(deduplicator), len(self.templates))
+
+    def test_exact(self):
+        self.assert_dedups(TemplateDeduplicator())
+
+    def test_bloom(self):
+        deduplicator = TemplateDeduplicator(bloom_capacity=len(self.templates))
+        self.assert_dedups(deduplicator)
+        self.assertEqual(len(deduplicator.bloom.bits), (deduplicator.bloom.num_bits + 7) // 8)
+
+    def test_persist(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            for bloom_capacity in [0, len(self.templates)]:
+                state_file = pathlib.Path(tmp) / f"state-{bloom_capacity}"
+                deduplicator = TemplateDeduplicator(bloom_capacity, state_file)
+                for t in self.templates[:500]:
+                    deduplicator.add(t)
+                deduplicator.save()
+                reloaded = TemplateDeduplicator(bloom_capacity, state_file)
+                self.assertEqual(len(reloaded), 500)
+                self.assertFalse(any(reloaded.add(t) for t in self.templates[:500]))
+                self.assertTrue(all(reloaded.add(t) for t in self.templates[500:]))
+            # exact fingerprints can be loaded into a bloom filter, but not the other way around
+            self.assertEqual(len(TemplateDeduplicator(len(self.templates), pathlib.Path(tmp) / "state-0")), 500)
+            with self.assertRaises(ValueError):
+                TemplateDeduplicator(0, pathlib.Path(tmp) / f"state-{len(self.templates)}")
+
+    def test_incremental_run(self):
+        api_specs_folder = pathlib.Path(__file__).parent
+        privy_root = api_specs_folder.parents[1]
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join([str(privy_root), *sys.path]))
+        outputs = []
+        with tempfile.TemporaryDirectory() as folder:
+            state_file = pathlib.Path(folder) / "dedup"
+            # separate processes, since schemathesis hooks registered by one run would affect the next
+            for run in range(2):
+                out = pathlib.Path(folder) / f"templates-{run}.txt"
+                subprocess.run([sys.executable, "-c", GENERATE_WITH_STATE, str(api_specs_folder), str(state_file),
+                                str(out)], env=env, check=True, capture_output=True)
+                outputs.append(out.read_text().splitlines())
+            self.assertTrue(state_file.exists())
+        # the second run only emits templates the first run did not
+        self.assertTrue(outputs[0])
+        self.assertFalse(set(outputs[0]) & set(outputs[1]))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,210 @@
+# Copyright 2018- The Pixie Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# SPDX-License-Identifier: Apache-2.0
+
+
+import json
+import pathlib
+import random
+import re
+import tempfile
+import unittest
+
+import schemathesis
+
+from privy.generate.utils import PrivyFileType
+from privy.hooks import PARAMETER_TYPES, ParamType, SchemaHooks
+from privy.providers.english_us import English_US
+from privy.route import flatten_payload
+from privy.tests.utils import PrivyArgs, generate_one_api_spec
+
+SPEC = {
+    "openapi": "3.0.0",
+    "info": {"title": "users", "version": "1.0"},
+    "paths": {
+        "/users/{user_id}": {
+            "put": {
+                "parameters": [
+                    {"name": "user_id", "in": "path", "required": True, "schema": {"type": "string"}},
+                    {"name": "email", "in": "query", "schema": {"type": "string"}},
+                    {"name": "X-Phone-Number", "in": "header", "schema": {"type": "string"}},
+                    {"name": "session_id", "in": "cookie", "schema": {"type": "string"}},
+                ],
+                "requestBody": {
+                    "content": {
+                        "application/xml": {"schema": {"type": "string"}},
+                        "application/json": {"schema": {"$ref": "#/components/schemas/User"}},
+                    },
+                },
+                "responses": {"200": {"description": "OK"}},
+            },
+        },
+        "/users": {
+            "post": {
+                "requestBody": {
+                    "content": {
+                        "application/json": {
+                            "schema": {"type": "array", "items": {"$ref": "#/components/schemas/User"}},
+                        },
+                    },
+                },
+                "responses": {"200": {"description": "OK"}},
+            },
+        },
+    },
+    "components": {
+        "schemas": {
+            "Address": {"type": "object", "properties": {"city": {"type": "string"}}},
+            "User": {
+                "allOf": [
+                    {"type": "object", "properties": {"first_name": {"type": "string"}}},
+                    {
+                        "type": "object",
+                        "properties": {
+                            "emails": {"type": "array", "items": {"type": "string", "format": "email"}},
+                            "address": {"$ref": "#/components/schemas/Address"},
+                            "status": {"type": "string", "enum": ["active"]},
+                            "friends": {"type": "array", "items": {"$ref": "#/components/schemas/User"}},
+                        },
+                    },
+                ],
+            },
+        },
+    },
+}
+
+
+def analyzer(parameter_types=PARAMETER_TYPES, seed=None):
+    return SchemaHooks.SchemaAnalyzer(PrivyArgs({
+        "region": English_US(),
+        "seed": seed,
+        "parameter_types": parameter_types,
+    }))
+
+
+class TestAssignParameters(unittest.TestCase):
+    def assign(self, schema_analyzer, name, schema):
+        case_attr = {}
+        schema_analyzer.assign_parameters(name, None, schema, None, case_attr, ParamType.QUERY)
+        return case_attr[name]
+
+    def test_pii_substring(self):
+        schema_analyzer = analyzer()
+        self.assertEqual(self.assign(schema_analyzer, "customerEmailAddress", {"type": "string"}), "{{email}}")
+        self.assertEqual(schema_analyzer.get_pii_types(ParamType.QUERY), {"email"})
+
+    def test_pattern_before_pii_substring(self):
+        schema_analyzer = analyzer()
+        value = self.assign(schema_analyzer, "orderState", {"type": "string", "pattern": "^[A-Z]{3}$"})
+        self.assertRegex(value, "^[A-Z]{3}$")
+        self.assertEqual(schema_analyzer.get_pii_types(ParamType.QUERY), set())
+
+    def test_nonpii_compound_names(self):
+        schema_analyzer = analyzer()
+        for name, schema, value in [
+            ("orderState", {"type": "string"}, "{{string}}"),
+            ("minAge", {"type": "integer"}, "{{random_number}}"),
+            ("endUser", {"type": "string"}, "{{string}}"),
+        ]:
+            self.assertEqual(self.assign(schema_analyzer, name, schema), value, name)
+        self.assertEqual(schema_analyzer.get_pii_types(ParamType.QUERY), set())
+
+    def test_seeded_regex_draws(self):
+        schema_analyzer = analyzer(seed=0)
+        schema = {"type": "string", "pattern": "^[a-z]{8}[0-9]{4}$"}
+        values = []
+        for _ in range(2):
+            random.seed(7)
+            values.append(self.assign(schema_analyzer, "voucher", schema))
+        self.assertEqual(values[0], values[1])
+        self.assertRegex(values[0], "^[a-z]{8}[0-9]{4}$")
+        # the seed is set per draw, not on the class shared by the threads of --multi_threaded runs
+        self.assertFalse(hasattr(SchemaHooks.SchemaAnalyzer.generate_value_from_regex, "_hypothesis_internal_use_seed"))
+
+    def test_nonpii_alias_before_pii_substring(self):
+        schema_analyzer = analyzer()
+        # a non-pii alias ending in the state pii alias
+        sha1 = schema_analyzer.providers.get_nonpii_provider("sha1")
+        sha1.aliases.add("deliverystate")
+        schema_analyzer.providers.index_providers()
+        self.assertEqual(schema_analyzer.providers.match_pii_provider("deliveryState").template_name, "state")
+        self.assertEqual(self.assign(schema_analyzer, "deliveryState", {"type": "string"}), "{{sha1}}")
+        self.assertEqual(schema_analyzer.get_pii_types(ParamType.QUERY), set())
+
+
+class TestCompiledOperations(unittest.TestCase):
+    def setUp(self):
+        self.schema = schemathesis.from_dict(SPEC)
+        self.operation = self.schema["/users/{user_id}"]["PUT"]
+
+    def test_compile_operation(self):
+        schema_analyzer = analyzer()
+        compiled = schema_analyzer.compile_operation(self.operation)
+        templates = compiled.templates
+        self.assertEqual(list(templates), list(ParamType))
+        self.assertEqual(list(templates[ParamType.PATH]), ["user_id"])
+        self.assertEqual(list(templates[ParamType.QUERY]), ["email"])
+        self.assertEqual(list(templates[ParamType.HEADER]), ["X-Phone-Number"])
+        self.assertEqual(list(templates[ParamType.COOKIE]), ["session_id"])
+        # the json body, with its references resolved and all of its subschemas merged
+        body = templates[ParamType.BODY]
+        self.assertEqual(list(body), ["first_name", "emails", "address", "status", "friends"])
+        self.assertEqual(body["first_name"], "{{first_name}}")
+        self.assertEqual(len(body["emails"]), 1)
+        self.assertEqual(body["emails"][0], "{{email}}")
+        self.assertEqual(list(body["address"]), ["city"])
+        self.assertEqual(body["status"], "active")
+        self.assertEqual(list(flatten_payload(body))[:4], ["first_name", "emails.0", "address.city", "status"])
+        # recursive references are walked until MAX_BODY_DEPTH
+        self.assertEqual(list(body["friends"][0]), list(body))
+        self.assertIn("email", compiled.pii_types[ParamType.QUERY])
+        self.assertIn("phone_number", compiled.pii_types[ParamType.HEADER])
+        self.assertTrue({"first_name", "email"} <= compiled.pii_types[ParamType.BODY])
+        self.assertNotIn("email", compiled.pii_types[ParamType.PATH])
+
+    def test_compiled_operation_cache(self):
+        schema_analyzer = analyzer(["query", "body"])
+        compiled = schema_analyzer.compile_operation(self.operation)
+        self.assertEqual(list(compiled.templates), [ParamType.QUERY, ParamType.BODY])
+        self.assertIs(schema_analyzer.compile_operation(self.operation), compiled)
+        # bodies with an array at their root are represented by one item
+        array_body = schema_analyzer.compile_operation(self.schema["/users"]["POST"]).templates[ParamType.BODY]
+        self.assertEqual(list(array_body), list(compiled.templates[ParamType.BODY]))
+        schema_analyzer.clear_pii_types(ParamType.QUERY)
+        schema_analyzer.load_operation(compiled)
+        self.assertEqual(schema_analyzer.get_pii_types(ParamType.QUERY), {"email"})
+        schema_analyzer.release_operations(self.schema.location)
+        self.assertIsNot(schema_analyzer.compile_operation(self.operation), compiled)
+
+    def test_generate_body_payloads(self):
+        with tempfile.TemporaryDirectory() as api_specs_folder:
+            (pathlib.Path(api_specs_folder) / "openapi.json").write_text(json.dumps(SPEC))
+            for generate_type in ["json", "proto"]:
+                file = generate_one_api_spec(pathlib.Path(api_specs_folder), English_US(), False, generate_type,
+                                             PrivyFileType.TEMPLATES)
+                templates = file.read()
+                # proto field names are lower case with punctuation replaced
+                normalized = re.sub(r"[\W_]", "", templates.lower())
+                self.assertIn("xphonenumber", normalized)
+                self.assertIn("sessionid", normalized)
+                if generate_type == "json":
+                    self.assertIn('"address": {"city": "{{city}}"}', templates)
+                else:
+                    # nested request bodies are flattened for flat payload formats
+                    self.assertIn('address_city: "{{city}}"', templates)
+
+
+if __name__ == "__main__":
+    unittest.main()
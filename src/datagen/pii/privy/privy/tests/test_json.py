@@ -14,14 +14,19 @@
 #
 # SPDX-License-Identifier: Apache-2.0
 
+import csv
+import io
 import os
 import pathlib
 import unittest
 
-from privy.generate.utils import PrivyFileType
+from privy.generate.utils import PrivyFileType, PrivyWriter
+from privy.hooks import ParamType
+from privy.payload import PayloadGenerator
 from privy.providers.english_us import English_US
 from privy.providers.german_de import German_DE
-from privy.tests.utils import generate_one_api_spec, read_generated_csv
+from privy.tests.utils import (generate_one_api_spec, privy_args,
+                               read_generated_csv)
 
 
 class TestPayloadGenerator(unittest.TestCase):
@@ -31,19 +36,38 @@ class TestPayloadGenerator(unittest.TestCase):
         self.api_specs_folder = pathlib.Path(lufthansa_openapi).parents[0]
 
     def test_parse_http_methods(self):
-        for multi_threaded in [False, True]:
-            for region in self.regions:
-                file = generate_one_api_spec(self.api_specs_folder, region, multi_threaded, "json",
-                                             PrivyFileType.PAYLOADS)
-                payload_params, pii_types_per_payload = read_generated_csv(
-                    file)
-                # check that pii_type column values match pii_types present in the request payload
-                for params, pii_types in zip(payload_params, pii_types_per_payload):
-                    for param in params:
-                        pii = region.get_pii_provider(param)
-                        if pii:
-                            self.assertTrue(pii.template_name in pii_types)
-                file.close()
+        for engine in ["direct", "hypothesis"]:
+            for multi_threaded in [False, True]:
+                for region in self.regions:
+                    file = generate_one_api_spec(self.api_specs_folder, region, multi_threaded, "json",
+                                                 PrivyFileType.PAYLOADS, engine=engine)
+                    payload_params, pii_types_per_payload = read_generated_csv(
+                        file)
+                    self.assertGreater(len(payload_params), 0)
+                    # check that pii_type column values match pii_types present in the request payload
+                    for params, pii_types in zip(payload_params, pii_types_per_payload):
+                        for param in params:
+                            pii = region.get_pii_provider(param)
+                            if pii:
+                                self.assertTrue(pii.template_name in pii_types)
+                    file.close()
+
+    def test_equalize_pii_distribution(self):
+        generate_types = ["json", "sql", "xml", "html"]
+        args = privy_args(English_US(), False, generate_types, logging="warning")
+        file_writers = {}
+        for generate_type in generate_types:
+            file = io.StringIO()
+            file_writers[generate_type] = [PrivyWriter(PrivyFileType.PAYLOADS, file, csv.writer(file, quotechar="|"))]
+        payload_generator = PayloadGenerator(self.api_specs_folder, file_writers, args)
+        analyzer = payload_generator.analyzer
+        analyzer.num_payloads, analyzer.num_pii_payloads = 100, 10
+        payload_generator.hook.add_pii_type(ParamType.QUERY, "email")
+        case = {ParamType.QUERY: {"email": "{{email}}", "limit": "{{random_number}}"}}
+        payload_generator.equalize_pii_distribution(case)
+        # every augmented case adds spans_per_template PII payloads for each of the generate types
+        self.assertGreaterEqual(round(analyzer.percent_pii), 50)
+        self.assertLess(analyzer.percent_pii, 55)
 
 
 if __name__ == "__main__":
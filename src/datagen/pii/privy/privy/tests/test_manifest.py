@@ -0,0 +1,152 @@
+# Copyright 2018- The Pixie Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# SPDX-License-Identifier: Apache-2.0
+
+import gzip
+import json
+import os
+import pathlib
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from privy.generate.utils import PrivyFileType
+from privy.generate.writers import get_out_files, open_privy_writers
+from privy.manifest import RESUME_OPTIONS, RunManifest
+
+GENERATE = """
+import argparse, os, pathlib, sys
+from privy.generate.generate import generate
+from privy.generate.writers import get_out_files
+from privy.hooks import PARAMETER_TYPES
+from privy.manifest import RunManifest
+from privy.providers.english_us import English_US
+
+api_specs, out_folder, output_format, compression, max_file_size, mode = sys.argv[1:]
+args = argparse.Namespace(
+    generate_types=["json"], region=English_US(), region_name="english_us", pii_types=None, logging="warning",
+    multi_threaded=False, num_processes=0, num_additional_pii_types=6, equalize_pii_distribution_to_percentage=50,
+    timeout=400, fuzz_payloads=False, spans_per_template=3, ignore_spec=[], spec_cache=None, seed=7,
+    engine="direct", value_pool_size=0, dedup_state=None, dedup_bloom_capacity=0, output_format=output_format,
+    compression=compression, max_file_size=int(max_file_size), shard_index=0, shard_count=1,
+    resume=mode == "resume", profile=None, xml_root="root", xml_attribute_style="type", html_layout="rows",
+    html_table_attributes='border="1"', sql_dialects=None, parameter_types=PARAMETER_TYPES, corpus_index=None,
+    api_specs=api_specs, fake_persons_file_path="",
+)
+if mode == "crash":
+    record = RunManifest.record
+
+    def record_and_crash(self, spec, file_writers, analyzer):
+        record(self, spec, file_writers, analyzer)
+        # leave partially written records of the next spec behind, as if the run was killed while generating it
+        for writers in file_writers.values():
+            for writer in writers:
+                writer.write_template("partial")
+                writer.checkpoint()
+        self.journal.write(b"partial")
+        self.journal.flush()
+        os._exit(1)
+
+    RunManifest.record = record_and_crash
+out_folder = pathlib.Path(out_folder)
+out_files = get_out_files(out_folder, args.generate_types, "", output_format, compression)
+generate(args, out_files, pathlib.Path(api_specs), out_folder / "manifest.jsonl")
+"""
+
+
+class TestRunManifest(unittest.TestCase):
+    def read_outputs(self, out_folder: pathlib.Path) -> dict[str, bytes]:
+        """Contents of every output file, concatenating and decompressing rolled over parts"""
+        outputs = {}
+        for path in sorted(out_folder.iterdir()):
+            if path.name.startswith("manifest"):
+                continue
+            name = re.sub(r"-\d{5}$", "", path.name.split(".")[0])
+            data = path.read_bytes()
+            outputs[name] = outputs.get(name, b"") + (gzip.decompress(data) if path.suffix == ".gz" else data)
+        return outputs
+
+    def test_checkpoint_and_resume_writers(self):
+        with tempfile.TemporaryDirectory() as folder:
+            for output_format, compression, max_file_size in [("csv", "none", 0), ("jsonl", "gzip", 0),
+                                                              ("jsonl", "none", 200)]:
+                out_folder = pathlib.Path(folder) / f"{output_format}-{max_file_size}"
+                out_files = get_out_files(out_folder, ["json"], "", output_format, compression)
+                writer_args = {"output_format": output_format, "compression": compression,
+                               "max_file_size": max_file_size}
+                with open_privy_writers(out_files, **writer_args) as file_writers:
+                    writer = file_writers["json"][1]
+                    for i in range(10):
+                        writer.write_template(f"template {i}")
+                    state = writer.checkpoint()
+                    for i in range(10, 15):
+                        writer.write_template(f"lost {i}")
+                with open_privy_writers(out_files, mode="a", write_header=False, **writer_args) as file_writers:
+                    writer = file_writers["json"][1]
+                    writer.resume(state)
+                    for i in range(10, 20):
+                        writer.write_template(f"template {i}")
+                templates = self.read_outputs(out_folder)["json-templates"].decode()
+                templates = templates.splitlines()
+                if output_format == "jsonl":
+                    templates = [json.loads(line)["template"] for line in templates]
+                self.assertEqual(templates, [f"template {i}" for i in range(20)])
+                if max_file_size:
+                    self.assertGreater(len(list(out_folder.glob("*templates*"))), 1)
+
+    def test_resume_matches_uninterrupted_run(self):
+        tests_folder = pathlib.Path(__file__).parent
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join([str(tests_folder.parents[1]), *sys.path]))
+        with tempfile.TemporaryDirectory() as folder:
+            folder = pathlib.Path(folder)
+            for name, spec in [("a", "openapi.json"), ("b", "openapi2.json")]:
+                (folder / "specs" / "APIs" / name).mkdir(parents=True)
+                shutil.copy(tests_folder / spec, folder / "specs" / "APIs" / name / "openapi.json")
+
+            def run(out_folder, output_format, compression, max_file_size, mode):
+                return subprocess.run([sys.executable, "-c", GENERATE, str(folder / "specs"), str(out_folder),
+                                       output_format, compression, str(max_file_size), mode],
+                                      env=env, capture_output=True)
+
+            # gzip members are ended at every checkpoint and parts rolled over, the hardest output to resume
+            writer_args = ["jsonl", "gzip", 4000]
+            uninterrupted, resumed = folder / "uninterrupted", folder / "resumed"
+            self.assertEqual(run(uninterrupted, *writer_args, "run").returncode, 0)
+            self.assertEqual(run(resumed, *writer_args, "crash").returncode, 1)
+            self.assertIn(b"partial", b"".join(self.read_outputs(resumed).values()))
+            self.assertEqual(run(resumed, *writer_args, "resume").returncode, 0)
+            expected = self.read_outputs(uninterrupted)
+            self.assertTrue(expected[f"json-{PrivyFileType.PAYLOADS.name.lower()}"])
+            self.assertEqual(self.read_outputs(resumed), expected)
+            # header and one line per spec
+            self.assertEqual((resumed / "manifest.jsonl").read_text().count("\n"), 3)
+
+    def test_resume_with_different_options(self):
+        with tempfile.TemporaryDirectory() as folder:
+            path = pathlib.Path(folder) / "manifest.jsonl"
+            options = {option: None for option in RESUME_OPTIONS}
+            for resume in [False, True]:
+                manifest = RunManifest(path, dict(options, timeout=400))
+                self.assertFalse(manifest.start(resume))
+                manifest.file.close()
+            with self.assertRaisesRegex(ValueError, "timeout"):
+                RunManifest(path, dict(options, timeout=10)).start(resume=True)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,76 @@
+# Copyright 2018- The Pixie Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# SPDX-License-Identifier: Apache-2.0
+
+import unittest
+from xml.dom.minidom import parseString
+
+from dicttoxml import dicttoxml
+from json2html import json2html
+
+from privy.markup import HTMLRenderer, XMLRenderer
+
+PAYLOADS = [
+    {},
+    {"id": "{{uuid}}"},
+    {
+        "id": "{{uuid}}", "limit": 5, "ratio": 1.5, "active": True, "q": "a<b&\"c\"'d>", "user name": "{{name}}",
+        "1st": "{{email}}", "123": "{{city}}", "ns:key": "x", "a&b": "", "straße": "{{street_address}}",
+    },
+]
+
+
+class TestMarkup(unittest.TestCase):
+    def test_xml_matches_dicttoxml(self):
+        for payload in PAYLOADS:
+            self.assertEqual(XMLRenderer().render(payload), dicttoxml(payload).decode())
+            self.assertEqual(XMLRenderer("payload").render(payload), dicttoxml(payload, custom_root="payload").decode())
+            self.assertEqual(XMLRenderer("", type_attributes=False).render(payload),
+                             dicttoxml(payload, root=False, attr_type=False).decode())
+            parseString(XMLRenderer().render(payload))
+
+    def test_xml_nested(self):
+        payload = {"id": None, "filter": {"name": "{{name}}"}, "ids": [1, "a"]}
+        self.assertEqual(
+            XMLRenderer("", type_attributes=False).render(payload),
+            "<id></id><filter><name>{{name}}</name></filter><ids><item>1</item><item>a</item></ids>")
+        self.assertEqual(
+            XMLRenderer("").render(payload),
+            '<id type="null"></id><filter type="dict"><name type="str">{{name}}</name></filter>'
+            '<ids type="list"><item type="int">1</item><item type="str">a</item></ids>')
+
+    def test_html_matches_json2html(self):
+        nested = [
+            {"id": None, "filter": {"name": "{{name}}"}, "ids": [1, "a"]},
+            # lists of objects with the same keys are clubbed into a table, in the key order of the first object
+            {"users": [{"name": "{{name}}", "emails": ["{{email}}"]}, {"emails": [], "name": "<b>"}],
+             "items": [{"id": 1, "address": {"city": "{{city}}"}}], "empty": [{}]},
+            {"mixed": [{"a": "1"}, {"b": "2"}], "partly": [{"a": "1"}, "b"]},
+        ]
+        for payload in [*PAYLOADS, *nested]:
+            self.assertEqual(HTMLRenderer().render(payload), json2html.convert(payload))
+            self.assertEqual(HTMLRenderer("class=\"payload\"").render(payload),
+                             json2html.convert(payload, table_attributes="class=\"payload\""))
+
+    def test_html_columns(self):
+        self.assertEqual(HTMLRenderer(layout="columns").render({}), "")
+        self.assertEqual(
+            HTMLRenderer(layout="columns").render({"id": "{{uuid}}", "q": "<", "n": 1}),
+            '<table border="1"><thead><tr><th>id</th><th>q</th><th>n</th></tr></thead>'
+            '<tbody><tr><td>{{uuid}}</td><td>&lt;</td><td>1</td></tr></tbody></table>')
+
+
+if __name__ == "__main__":
+    unittest.main()
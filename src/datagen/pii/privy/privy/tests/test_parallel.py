@@ -0,0 +1,129 @@
+# Copyright 2018- The Pixie Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# SPDX-License-Identifier: Apache-2.0
+
+import json
+import pathlib
+import shutil
+import tempfile
+import unittest
+from collections import Counter
+
+from privy.generate.utils import PrivyFileType
+from privy.generate.writers import get_out_files
+from privy.hooks import PARAMETER_TYPES
+from privy.parallel import ParallelPayloadGenerator
+from privy.payload import find_api_specs
+from privy.providers.english_us import English_US
+from privy.tests.utils import PrivyArgs, read_generated_csv
+
+
+class TestParallelPayloadGenerator(unittest.TestCase):
+    def setUp(self):
+        # two different specs, and a copy of one of them whose templates are all duplicates of another shard's
+        self.tmp = tempfile.TemporaryDirectory()
+        self.api_specs_folder = pathlib.Path(self.tmp.name)
+        tests_folder = pathlib.Path(__file__).parent
+        for name, spec in [("lufthansa", "openapi.json"), ("lufthansa_copy", "openapi.json"),
+                           ("ebay", "openapi2.json")]:
+            (self.api_specs_folder / name).mkdir()
+            shutil.copy(tests_folder / spec, self.api_specs_folder / name / "openapi.json")
+        self.region = English_US()
+        self.args = PrivyArgs({
+            "generate_types": ["json"],
+            "region": self.region,
+            "region_name": "english_us",
+            "logging": "warning",
+            "multi_threaded": False,
+            "num_processes": 2,
+            "num_additional_pii_types": 6,
+            "equalize_pii_distribution_to_percentage": 50,
+            "timeout": 400,
+            "pii_types": None,
+            "fuzz_payloads": False,
+            "spans_per_template": 3,
+            "ignore_spec": ["stripe.com"],
+            "spec_cache": None,
+            "seed": None,
+            "engine": "direct",
+            "value_pool_size": 0,
+            "dedup_state": None,
+            "dedup_bloom_capacity": 0,
+            "output_format": "csv",
+            "compression": "none",
+            "max_file_size": 0,
+            "spec_time_limit": 0,
+            "spec_memory_limit": 0,
+            "profile": None,
+            "xml_root": "root",
+            "xml_attribute_style": "type",
+            "html_layout": "rows",
+            "html_table_attributes": 'border="1"',
+            "sql_dialects": None,
+            "parameter_types": PARAMETER_TYPES,
+            "corpus_index": None,
+            "shard_index": 0,
+            "shard_count": 1,
+        })
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_generate_and_merge_shards(self):
+        with tempfile.TemporaryDirectory() as out_folder:
+            out_files = get_out_files(pathlib.Path(out_folder), self.args.generate_types)
+            generator = ParallelPayloadGenerator(self.api_specs_folder, out_files, self.args)
+            self.assertEqual(len(find_api_specs(self.api_specs_folder)), 3)
+            generator.generate_payloads()
+            self.assertFalse(generator.shards_folder.exists())
+            files = dict(out_files["json"])
+
+            with open(files[PrivyFileType.PAYLOADS]) as f:
+                self.assertEqual(f.readline().strip(), "payload,has_pii,pii_types")
+                payload_params, pii_types_per_payload = read_generated_csv(f)
+            self.assertGreater(len(payload_params), 0)
+            # check that pii_type column values match pii_types present in the request payload
+            for params, pii_types in zip(payload_params, pii_types_per_payload):
+                for param in params:
+                    pii = self.region.get_pii_provider(param)
+                    if pii:
+                        self.assertTrue(pii.template_name in pii_types)
+
+            # templates are unique across shards and every kept template has spans_per_template spans
+            with open(files[PrivyFileType.TEMPLATES]) as f:
+                templates = f.read().splitlines()
+            self.assertEqual(len(templates), len(set(templates)))
+            self.assertEqual(len(templates), len(payload_params))
+            with open(files[PrivyFileType.SPANS]) as f:
+                spans = [json.loads(line) for line in f]
+            self.assertEqual(len(spans), len(templates) * self.args.spans_per_template)
+            # template ids are renumbered against the merged dataset
+            self.assertEqual([s["template_id"] for s in spans], list(range(len(spans))))
+            # both specs are in the merged dataset
+            self.assertTrue(any("flightNumber" in params for params in payload_params))
+            self.assertTrue(any("marketplace_id" in params for params in payload_params))
+            # the analyzer of the merged dataset only counts the kept templates
+            spans_per_template = self.args.spans_per_template
+            self.assertEqual(generator.analyzer.num_payloads, len(spans))
+            self.assertEqual(generator.analyzer.num_pii_payloads,
+                             spans_per_template * sum(bool(pii_types) for pii_types in pii_types_per_payload))
+            expected = Counter()
+            for pii_types in pii_types_per_payload:
+                expected.update({pii_type: spans_per_template for pii_type in pii_types})
+            self.assertEqual(+generator.analyzer.count_pii_types, expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,128 @@
+# Copyright 2018- The Pixie Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# SPDX-License-Identifier: Apache-2.0
+
+
+import json
+import pathlib
+import shutil
+import tempfile
+import unittest
+
+import schemathesis
+
+from privy.prescreen import PIIPrescreener
+from privy.providers.english_us import English_US
+from privy.tests.utils import generate_one_api_spec, read_generated_csv
+
+SPEC = {
+    "openapi": "3.0.0",
+    "info": {"title": "accounts", "version": "1.0"},
+    "paths": {
+        "/accounts/{account_id}": {
+            "get": {
+                "parameters": [
+                    {"name": "account_id", "in": "path", "required": True, "schema": {"type": "string"}},
+                ],
+                "responses": {"200": {"description": "OK"}},
+            },
+            "put": {
+                "parameters": [
+                    {"name": "account_id", "in": "path", "required": True, "schema": {"type": "string"}},
+                ],
+                "requestBody": {
+                    "content": {
+                        "application/json": {"schema": {"$ref": "#/components/schemas/Account"}},
+                    },
+                },
+                "responses": {"200": {"description": "OK"}},
+            },
+        },
+    },
+    "components": {
+        "schemas": {
+            "Account": {
+                "type": "object",
+                "properties": {
+                    "holder": {"$ref": "#/components/schemas/Holder"},
+                    "balance": {"type": "integer"},
+                },
+            },
+            "Holder": {
+                "type": "object",
+                "properties": {
+                    "bankIban": {"type": "string"},
+                    "nickname": {"type": "string"},
+                },
+            },
+        },
+    },
+}
+
+
+class TestPrescreen(unittest.TestCase):
+    def test_filter_providers(self):
+        region = English_US(pii_types=["iban", "email"])
+        self.assertEqual(sorted(region.get_pii_types()), ["email", "iban"])
+        # other pii types are still generated, as non-pii
+        self.assertIsNone(region.get_pii_provider("ssn"))
+        self.assertEqual(region.get_nonpii_provider("ssn").template_name, "ssn")
+        self.assertEqual(region.match_pii_provider("customerEmailAddress").template_name, "email")
+        self.assertEqual(len(English_US().get_pii_types()), len(English_US(pii_types=None).get_pii_types()))
+        with self.assertRaises(ValueError):
+            English_US(pii_types=["iban", "social_security"])
+
+    def test_spec_matches(self):
+        lufthansa = json.loads((pathlib.Path(__file__).parent / "openapi.json").read_text())
+        self.assertTrue(PIIPrescreener(English_US(pii_types=["latitude"])).matches(lufthansa))
+        self.assertFalse(PIIPrescreener(English_US(pii_types=["credit_card_number", "iban", "ssn"])).matches(lufthansa))
+        # through the components the body refers to
+        self.assertTrue(PIIPrescreener(English_US(pii_types=["iban"])).matches(SPEC))
+        self.assertFalse(PIIPrescreener(English_US(pii_types=["ssn"])).matches(SPEC))
+
+    def test_operation_matches(self):
+        prescreener = PIIPrescreener(English_US(pii_types=["iban"]))
+        schema = schemathesis.from_dict(SPEC)
+        self.assertFalse(prescreener.operation_matches(schema["/accounts/{account_id}"]["GET"]))
+        # following the body's $refs to the nested bankIban property
+        self.assertTrue(prescreener.operation_matches(schema["/accounts/{account_id}"]["PUT"]))
+        self.assertTrue(prescreener.names["bankIban"])
+
+    def test_generate_pii_types(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            api_specs_folder = pathlib.Path(tmp) / "specs"
+            (api_specs_folder / "lufthansa").mkdir(parents=True)
+            shutil.copy(pathlib.Path(__file__).parent / "openapi.json", api_specs_folder / "lufthansa")
+            corpus_index = pathlib.Path(tmp) / "corpus_index.json"
+            file = generate_one_api_spec(api_specs_folder, English_US(pii_types=["latitude"]), False, "json",
+                                         logging="warning", pii_types=["latitude"], corpus_index=corpus_index)
+            payload_params, pii_types_per_payload = read_generated_csv(file)
+            self.assertTrue(payload_params)
+            # only the operation with a latitude parameter is generated, none of the others' parameters
+            for params in payload_params:
+                self.assertFalse(set(params) & {"origin", "airportCode", "flightNumber", "limit", "offset"})
+            self.assertTrue(any(pii_types == ["latitude"] for pii_types in pii_types_per_payload))
+            for pii_types in pii_types_per_payload:
+                self.assertLessEqual(set(pii_types), {"latitude"})
+            # a spec without any matching parameters is skipped before schemathesis loads it
+            file = generate_one_api_spec(api_specs_folder, English_US(pii_types=["iban"]), False, "json",
+                                         logging="warning", pii_types=["iban"])
+            self.assertEqual(file.read(), "")
+            entry = json.loads(corpus_index.read_text())["specs"]["lufthansa/openapi.json"]
+            self.assertEqual(entry["operations"], 15)
+
+
+if __name__ == "__main__":
+    unittest.main()
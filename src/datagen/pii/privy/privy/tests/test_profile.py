@@ -0,0 +1,79 @@
+# Copyright 2018- The Pixie Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# SPDX-License-Identifier: Apache-2.0
+
+import json
+import pathlib
+import tempfile
+import time
+import unittest
+
+from privy.generate.utils import PrivyFileType
+from privy.profile import COUNTS, PHASES, Profiler
+from privy.providers.english_us import English_US
+from privy.tests.utils import generate_one_api_spec, read_generated_csv
+
+
+class TestProfiler(unittest.TestCase):
+    def test_disabled(self):
+        profiler = Profiler()
+        with profiler.spec("spec"):
+            with profiler.phase("load"):
+                profiler.count("payloads")
+        self.assertEqual(profiler.specs, [])
+
+    def test_nested_phases_are_exclusive(self):
+        profiler = Profiler(pathlib.Path("profile.json"))
+        with profiler.spec("spec"):
+            with profiler.phase("draw"):
+                time.sleep(0.05)
+                with profiler.phase("hooks"):
+                    time.sleep(0.1)
+                    with profiler.phase("draw"):
+                        time.sleep(0.05)
+            profiler.count("templates")
+            profiler.count("payloads", 3)
+        (record,) = profiler.specs
+        phases = record["phases"]
+        self.assertAlmostEqual(phases["draw"], 0.1, delta=0.04)
+        self.assertAlmostEqual(phases["hooks"], 0.1, delta=0.04)
+        self.assertAlmostEqual(sum(phases.values()), record["seconds"], places=6)
+        self.assertEqual(record["counts"], {"payloads": 3, "templates": 1, "spans": 0})
+        self.assertEqual(record["status"], "ok")
+
+    def test_report(self):
+        with tempfile.TemporaryDirectory() as out_folder:
+            path = pathlib.Path(out_folder) / "profile.json"
+            file = generate_one_api_spec(pathlib.Path(__file__).parent, English_US(), False, "json",
+                                         PrivyFileType.PAYLOADS, logging="warning", engine="hypothesis",
+                                         profile=path)
+            payload_params, _ = read_generated_csv(file)
+            report = json.loads(path.read_text())
+        self.assertEqual(report["num_specs"], 1)
+        self.assertEqual(report["num_failed_specs"], 0)
+        self.assertEqual(list(report["phases"]), [*PHASES, "other"])
+        for phase in ["load", "draw", "hooks", "convert", "parse", "write"]:
+            self.assertGreater(report["phases"][phase], 0, phase)
+        self.assertEqual(list(report["counts"]), COUNTS)
+        self.assertEqual(report["counts"]["payloads"], len(payload_params))
+        self.assertEqual(report["counts"]["spans"], 10 * report["counts"]["templates"])
+        self.assertGreater(report["peak_rss"], 0)
+        seconds = [record["seconds"] for record in report["slowest_specs"]]
+        self.assertEqual(seconds, sorted(seconds, reverse=True))
+        self.assertEqual([record["spec"] for record in report["specs"]], ["openapi.json"])
+
+
+if __name__ == "__main__":
+    unittest.main()
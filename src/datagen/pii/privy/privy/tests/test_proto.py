@@ -0,0 +1,88 @@
+# Copyright 2018- The Pixie Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# SPDX-License-Identifier: Apache-2.0
+
+
+import base64
+import json
+import os
+import pathlib
+import unittest
+
+from privy.generate.utils import PrivyFileType
+from privy.providers.english_us import English_US
+from privy.proto import ProtoConverter, field_name
+from privy.tests.utils import generate_one_api_spec
+
+PAYLOAD = {
+    "id": "{{uuid4}}", "limit": 5, "ratio": 1.5, "active": True, "q": "a\"b\\c'd\n", "user name": "{{name}}",
+    "1st": "{{email}}", "straße": "{{street_address}} {{city}}", "empty": "",
+}
+
+
+class TestProto(unittest.TestCase):
+    def setUp(self):
+        self.region = English_US()
+        self.api_specs_folder = pathlib.Path(os.path.join(os.path.dirname(__file__), "openapi.json")).parents[0]
+
+    def test_text_template(self):
+        converter = ProtoConverter()
+        self.assertEqual(
+            converter.convert({"id": "{{uuid4}}", "limit": 5, "active": False, "q": "a\"b"}),
+            'id: "{{uuid4}}" limit: 5 active: false q: "a\\"b"')
+        self.assertEqual([field_name(name) for name in ["user name", "1st", "", "ns:Key"]],
+                         ["user_name", "f_1st", "f_", "ns_key"])
+
+    def test_descriptor_cache(self):
+        converter = ProtoConverter()
+        message = converter.message(PAYLOAD)
+        # the same parameter signature with other values reuses the message type
+        self.assertIs(converter.message({**PAYLOAD, "limit": 7, "id": "x"}), message)
+        self.assertIsNot(converter.message({**PAYLOAD, "limit": "7"}), message)
+        self.assertEqual(len(converter.messages), 2)
+        # message names only depend on the signature
+        self.assertEqual(ProtoConverter().message(PAYLOAD).name, message.name)
+
+    def test_serialize(self):
+        converter = ProtoConverter()
+        template = converter.convert(PAYLOAD)
+        message = converter.message(PAYLOAD)
+        for template_id in range(50):
+            payload_span = self.region.parse(template=template, template_id=template_id)
+            data, spans = converter.serialize(PAYLOAD, payload_span)
+            self.assertEqual(len(spans), len(payload_span.spans))
+            for span in spans:
+                self.assertEqual(data[span["start"]:span["end"]].decode(), span["value"])
+            parsed = message.message_class()
+            parsed.ParseFromString(data)
+            self.assertEqual(parsed.limit, 5)
+            self.assertEqual(parsed.ratio, 1.5)
+            self.assertTrue(parsed.active)
+            self.assertIn(parsed.q, ["a\"b\\c'd\n", "a\"b\\c'd\n".lower()])
+            self.assertEqual(parsed.empty, "")
+
+    def test_generate_binary(self):
+        file = generate_one_api_spec(self.api_specs_folder, self.region, False, "proto", PrivyFileType.BINARY)
+        records = [json.loads(line) for line in file]
+        self.assertGreater(len(records), 0)
+        for record in records:
+            payload = base64.b64decode(record["payload"])
+            self.assertTrue(record["message"].startswith("privy.Payload"))
+            for span in record["spans"]:
+                self.assertEqual(payload[span["start"]:span["end"]].decode(), span["value"])
+
+
+if __name__ == "__main__":
+    unittest.main()
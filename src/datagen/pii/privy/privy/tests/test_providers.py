@@ -14,12 +14,15 @@
 #
 # SPDX-License-Identifier: Apache-2.0
 
+import random
 import unittest
 
+from faker import Faker
 from hypothesis import given
 from hypothesis import strategies as st
 
 from privy.providers.english_us import English_US
+from privy.providers.generic import compile_template, luhn_check_digit
 from privy.providers.german_de import German_DE
 
 
@@ -41,6 +44,78 @@ class TestProviders(unittest.TestCase):
             for provider in region.nonpii_providers:
                 eval_provider(provider)
 
+    def test_alias_index(self):
+        def linear_scan(providers, name):
+            for provider in providers:
+                if name.lower() == provider.template_name or name.lower() in provider.aliases:
+                    return provider
+
+        for region in self.provider_regions:
+            for providers, lookup in [(region.pii_providers, region.get_pii_provider),
+                                      (region.nonpii_providers, region.get_nonpii_provider)]:
+                for provider in providers:
+                    for alias in [provider.template_name, *provider.aliases]:
+                        for name in [alias, alias.upper()]:
+                            self.assertIs(lookup(name), linear_scan(providers, name))
+            self.assertIsNone(region.get_pii_provider("not a pii alias"))
+            self.assertIsNone(region.get_pii_provider(""))
+
+    def test_match_alias_in_name(self):
+        for region in self.provider_regions:
+            for name, template_name in [
+                ("customerEmail", "email"),
+                ("billing_email_address", "email"),
+                ("X-Contact-Email", "email"),
+                ("primaryPhoneNumber", "phone_number"),
+            ]:
+                self.assertEqual(region.match_pii_provider(name).template_name, template_name, name)
+            # only aliases covering the last token of the name match
+            self.assertIsNone(region.match_pii_provider("emailVerified"))
+            self.assertIsNone(region.match_pii_provider("userId"))
+            self.assertEqual(region.match_nonpii_provider("userId").template_name, "sha1")
+            # the longer of the pii and non-pii aliases covering the last token wins
+            self.assertIsNone(region.match_pii_provider("minAge"))
+            self.assertEqual(region.match_nonpii_provider("minAge").template_name, "random_number")
+            self.assertIsNone(region.match_nonpii_provider("primaryPhoneNumber"))
+
+    def test_value_pools(self):
+        region = English_US()
+        region.use_value_pools(5)
+        for provider in [*region.pii_providers, *region.nonpii_providers]:
+            values = [getattr(region.custom_faker, provider.template_name)() for _ in range(50)]
+            self.assertTrue(all(isinstance(value, provider.type_) for value in values), provider.template_name)
+            self.assertLessEqual(len({repr(value) for value in values}), 5, provider.template_name)
+
+    def test_imei_check_digit(self):
+        # reference IMEI 49-015420-323751-8
+        self.assertEqual(luhn_check_digit("49015420323751"), "8")
+        for region in self.provider_regions:
+            imei = region.custom_faker.imei()
+            self.assertRegex(imei, r"^\d{2}-\d{6}-\d{6}-\d$")
+            self.assertEqual(imei[-1], luhn_check_digit(imei[:-1].replace("-", "")))
+
+    def test_compiled_template(self):
+        templates = [
+            '{"email": "{{email}}", "name": "{{ name }}", "id": {{sha1}}}',
+            "{{first_name}} {{last_name}} <{{email}}>",
+            "<user><name>{{name}}</name><name>{{name}}</name></user>",
+            "no placeholders",
+            "",
+        ]
+        for region in self.provider_regions:
+            for template in templates:
+                for seed in range(5):
+                    random.seed(seed)
+                    Faker.seed(seed)
+                    expected = region.f.parse(template=template, template_id=seed)
+                    random.seed(seed)
+                    Faker.seed(seed)
+                    actual = region.parse(template, seed)
+                    self.assertEqual(actual.toJSON(), expected.toJSON())
+                    for span in actual.spans:
+                        self.assertEqual(actual.fake[span.start:span.end], span.value)
+        self.assertIs(compile_template(templates[0]), compile_template(templates[0]))
+
     def test_get_random_pii(self):
         for region in self.provider_regions:
             random_provider = region.get_random_pii_provider()
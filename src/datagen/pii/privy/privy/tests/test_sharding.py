@@ -0,0 +1,81 @@
+# Copyright 2018- The Pixie Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# SPDX-License-Identifier: Apache-2.0
+
+import os
+import pathlib
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from privy.sharding import shard_specs, spec_key, spec_seed
+
+GENERATE_SEEDED = """
+import pathlib, sys
+from privy.providers.english_us import English_US
+from privy.tests.utils import generate_one_api_spec
+file = generate_one_api_spec(pathlib.Path(sys.argv[1]), English_US(), False, "json", logging="warning", seed=7)
+pathlib.Path(sys.argv[2]).write_text(file.getvalue())
+"""
+
+
+class TestSharding(unittest.TestCase):
+    def test_shard_specs(self):
+        with tempfile.TemporaryDirectory() as folder:
+            folder = pathlib.Path(folder)
+            specs = []
+            for i in range(20):
+                spec = folder / f"api{i}" / "openapi.json"
+                spec.parent.mkdir()
+                spec.write_text("x" * (i * 100 + 1))
+                specs.append(spec)
+            shards = [shard_specs(specs, folder, i, 3) for i in range(3)]
+            # shards partition the specs, keeping their order
+            self.assertEqual(sorted(sum(shards, []), key=specs.index), specs)
+            for shard in shards:
+                self.assertEqual(shard, sorted(shard, key=specs.index))
+            # assignment is balanced by size and independent of the input order
+            sizes = [sum(spec.stat().st_size for spec in shard) for shard in shards]
+            self.assertLess(max(sizes) - min(sizes), 2000)
+            self.assertEqual(set(shard_specs(specs[::-1], folder, 1, 3)), set(shards[1]))
+            self.assertEqual(shard_specs(specs, folder, 0, 1), specs)
+
+    def test_spec_seed(self):
+        folder = pathlib.Path("/specs")
+        key = spec_key(folder / "example.com" / "openapi.yaml", folder)
+        self.assertEqual(key, "example.com/openapi.yaml")
+        self.assertEqual(spec_seed(1, key), spec_seed(1, key))
+        self.assertNotEqual(spec_seed(1, key), spec_seed(2, key))
+        self.assertNotEqual(spec_seed(1, key), spec_seed(1, "other.com/openapi.yaml"))
+
+    def test_seeded_generation_is_reproducible(self):
+        api_specs_folder = pathlib.Path(__file__).parent
+        privy_root = api_specs_folder.parents[1]
+        outputs = []
+        with tempfile.TemporaryDirectory() as folder:
+            for hash_seed in ["1", "2"]:
+                out = pathlib.Path(folder) / f"payloads-{hash_seed}.csv"
+                env = dict(os.environ, PYTHONHASHSEED=hash_seed,
+                           PYTHONPATH=os.pathsep.join([str(privy_root), *sys.path]))
+                subprocess.run([sys.executable, "-c", GENERATE_SEEDED, str(api_specs_folder), str(out)],
+                               env=env, check=True, capture_output=True)
+                outputs.append(out.read_text())
+        self.assertTrue(outputs[0])
+        self.assertEqual(outputs[0], outputs[1])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -16,10 +16,14 @@
 
 import os
 import pathlib
+import random
+import re
+import sqlite3
 import unittest
 
 from privy.providers.english_us import English_US
 from privy.providers.german_de import German_DE
+from privy.sql import SQL_DIALECTS, SQLQueryBuilder
 from privy.tests.utils import (generate_one_api_spec, get_delimited,
                                read_generated_csv)
 
@@ -37,7 +41,7 @@ class TestSQLGenerator(unittest.TestCase):
                 payloads, pii_types_per_payload = read_generated_csv(file, generate_type="sql")
                 # check that pii_type column values match pii_types present in the request payload
                 query_types = {
-                    "select": ["ORDER BY", "WHERE", "LIMIT", "GROUP BY", "CASE"],
+                    "select": ["ORDER BY", "WHERE", "LIMIT", "TOP", "GROUP BY", "CASE"],
                     "insert": ["columns"],
                     "update": ["where"],
                 }
@@ -60,6 +64,58 @@ class TestSQLGenerator(unittest.TestCase):
                                 )
                 file.close()
 
+    def test_dialects(self):
+        random.seed(0)
+        payload = {"user_id": "{{uuid}}", "user name": "{{name}}", "limit": "12", "q": "o'brien", 'a]b`c"d': 3}
+        connection = sqlite3.connect(":memory:")
+        connection.execute('CREATE TABLE payloads ("user_id", "user name", "limit", "q", "a]b`c""d")')
+        table = re.compile(r'(FROM|INTO|UPDATE) "\w+"')
+        quoted = {"mysql": '`a]b``c"d`', "postgresql": '"a]b`c""d"', "sqlite": '"a]b`c""d"', "mssql": '[a]]b`c"d]'}
+        query_types = set()
+        for dialect in SQL_DIALECTS:
+            builder = SQLQueryBuilder(self.provider_regions[0], [dialect])
+            for _ in range(200):
+                query = builder.build_query(payload)
+                query_types.add((dialect, query.split(" ")[0]))
+                if 'a]b' in query:
+                    self.assertIn(quoted[dialect], query)
+                if "brien" in query:
+                    self.assertIn("'o''brien'", query)
+                if dialect == "mssql":
+                    self.assertNotIn("LIMIT", query)
+                if dialect == "sqlite":
+                    # check that sqlite can compile the query, against a table that exists
+                    try:
+                        connection.execute("EXPLAIN " + table.sub(r"\1 payloads", query))
+                    except sqlite3.OperationalError as e:
+                        # inserts without a column list only insert the values of some of the payload's parameters
+                        self.assertIn("values were supplied", str(e))
+        self.assertEqual(len(query_types), 3 * len(SQL_DIALECTS))
+
+    def test_dialect_literals(self):
+        value = "o'brien\\n café"
+        literals = {
+            "mysql": "'o''brien\\\\n café'",
+            "postgresql": "'o''brien\\n café'",
+            "sqlite": "'o''brien\\n café'",
+            "mssql": "N'o''brien\\n café'",
+        }
+        for dialect, literal in literals.items():
+            self.assertEqual(SQL_DIALECTS[dialect].literal(value), literal)
+            self.assertEqual(SQL_DIALECTS[dialect].literal(12), "12")
+            self.assertEqual(SQL_DIALECTS[dialect].literal(None), "NULL")
+
+    def test_dialect_conditions(self):
+        random.seed(0)
+        for dialect, bare_conditions in [("mysql", True), ("postgresql", False), ("sqlite", True), ("mssql", False)]:
+            builder = SQLQueryBuilder(self.provider_regions[0], [dialect])
+            sql_dialect = SQL_DIALECTS[dialect]
+            column = sql_dialect.quote("user name")
+            conditions = {builder._condition(sql_dialect, column, "o'brien") for _ in range(100)}
+            # postgresql and mssql only take a column on its own as a condition if it is boolean
+            self.assertEqual(column in conditions, bare_conditions, dialect)
+            self.assertEqual(f"{column} IS NOT NULL" in conditions, not bare_conditions, dialect)
+
 
 if __name__ == "__main__":
     unittest.main()
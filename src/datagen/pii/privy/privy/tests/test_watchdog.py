@@ -0,0 +1,64 @@
+# Copyright 2018- The Pixie Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# SPDX-License-Identifier: Apache-2.0
+
+import os
+import pathlib
+import tempfile
+import time
+import unittest
+
+from privy.watchdog import SupervisedPool, read_offenders, record_offender
+
+
+def run_task(task: str) -> str:
+    if task == "hang":
+        time.sleep(60)
+    elif task == "allocate":
+        memory = b"x" * (512 << 20)  # noqa: F841
+        time.sleep(60)
+    elif task == "crash":
+        os._exit(3)
+    return task.upper()
+
+
+class TestSupervisedPool(unittest.TestCase):
+    def test_kills_offending_workers(self):
+        tasks = ["a", "hang", "b", "allocate", "c", "crash", "d"]
+        pool = SupervisedPool(2, run_task, time_limit=5, memory_limit=256 << 20, poll_interval=0.1)
+        start = time.monotonic()
+        results = {task: (result, offense) for task, result, offense in pool.map(tasks)}
+        self.assertLess(time.monotonic() - start, 60)
+        self.assertEqual(set(results), set(tasks))
+        for task in "abcd":
+            self.assertEqual(results[task], (task.upper(), None))
+        self.assertEqual(results["hang"][1]["reason"], "time")
+        self.assertEqual(results["allocate"][1]["reason"], "memory")
+        self.assertEqual(results["crash"][1]["reason"], "crash")
+        self.assertEqual(results["crash"][1]["exitcode"], 3)
+        self.assertFalse(pool.workers)
+
+    def test_offenders_report(self):
+        with tempfile.TemporaryDirectory() as folder:
+            path = pathlib.Path(folder) / "data" / "offenders.jsonl"
+            self.assertEqual(read_offenders(path), [])
+            record_offender(path, {"spec": "example.com/openapi.yaml", "reason": "time"})
+            with open(path, "a") as f:
+                f.write('{"spec": "cut short')
+            self.assertEqual(read_offenders(path), [{"spec": "example.com/openapi.yaml", "reason": "time"}])
+
+
+if __name__ == "__main__":
+    unittest.main()
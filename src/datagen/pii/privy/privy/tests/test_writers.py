@@ -0,0 +1,121 @@
+# Copyright 2018- The Pixie Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# SPDX-License-Identifier: Apache-2.0
+
+import csv
+import gzip
+import json
+import pathlib
+import tempfile
+import unittest
+
+import pyarrow.parquet as pq
+import zstandard
+from presidio_evaluator.data_generator.faker_extensions.data_objects import (
+    FakerSpan, FakerSpansResult)
+
+from privy.generate.utils import PrivyFileType, atomic_write
+from privy.generate.writers import (get_out_files, open_privy_writers,
+                                    read_csv_payload)
+
+PAYLOADS = [
+    ('{"email": "jane@example.com", "note": "a|b"}', True, ["email"]),
+    ('{"id": "1234"}', False, []),
+    ('{"name": "Jane\\nDoe", "iban": "DE89"}', True, ["iban", "person"]),
+]
+TEMPLATE = '{"email": "{{email}}"}'
+SPAN = FakerSpansResult(fake='{"email": "jane@example.com"}', spans=[FakerSpan("jane@example.com", 11, 27, "email")],
+                        template=TEMPLATE, template_id=3)
+
+
+class TestWriters(unittest.TestCase):
+    def write(self, folder, output_format, compression="none", max_file_size=0, num_payloads=1):
+        out_files = get_out_files(folder, ["json"], output_format=output_format, compression=compression)
+        with open_privy_writers(out_files, output_format=output_format, compression=compression,
+                                max_file_size=max_file_size) as file_writers:
+            for writer in file_writers["json"]:
+                if writer.file_type == PrivyFileType.PAYLOADS:
+                    for _ in range(num_payloads):
+                        for payload in PAYLOADS:
+                            writer.write_payload(*payload)
+                elif writer.file_type == PrivyFileType.TEMPLATES:
+                    writer.write_template(TEMPLATE)
+                else:
+                    writer.write_span(SPAN)
+        return dict(out_files["json"])
+
+    def test_csv(self):
+        with tempfile.TemporaryDirectory() as folder:
+            files = self.write(pathlib.Path(folder), "csv")
+            self.assertEqual(files[PrivyFileType.PAYLOADS].name, "json-payloads.csv")
+            with open(files[PrivyFileType.PAYLOADS], newline="") as f:
+                rows = list(csv.reader(f, quotechar="|"))
+            self.assertEqual(rows[0], ["payload", "has_pii", "pii_types"])
+            self.assertEqual([read_csv_payload(row) for row in rows[1:]], PAYLOADS)
+            self.assertEqual(files[PrivyFileType.SPANS].read_text(), f"{SPAN.toJSON()}\n")
+            self.assertEqual(files[PrivyFileType.TEMPLATES].read_text(), f"{TEMPLATE}\n")
+
+    def test_jsonl(self):
+        for compression, extension, open_file in [("none", ".jsonl", open), ("gzip", ".jsonl.gz", gzip.open),
+                                                  ("zstd", ".jsonl.zst", zstandard.open)]:
+            with tempfile.TemporaryDirectory() as folder:
+                files = self.write(pathlib.Path(folder), "jsonl", compression)
+                self.assertTrue(files[PrivyFileType.PAYLOADS].name.endswith(extension))
+                with open_file(files[PrivyFileType.PAYLOADS], "rt") as f:
+                    records = [json.loads(line) for line in f]
+                self.assertEqual([(r["payload"], r["has_pii"], r["pii_types"]) for r in records], PAYLOADS)
+                with open_file(files[PrivyFileType.SPANS], "rt") as f:
+                    span = json.loads(f.readline())
+                self.assertEqual(span["spans"], [{"value": "jane@example.com", "start": 11, "end": 27,
+                                                  "type": "email"}])
+                self.assertEqual(span["template_id"], 3)
+
+    def test_parquet(self):
+        with tempfile.TemporaryDirectory() as folder:
+            files = self.write(pathlib.Path(folder), "parquet", "zstd")
+            payloads = pq.read_table(files[PrivyFileType.PAYLOADS]).to_pylist()
+            self.assertEqual([(r["payload"], r["has_pii"], r["pii_types"]) for r in payloads], PAYLOADS)
+            spans = pq.read_table(files[PrivyFileType.SPANS]).to_pylist()
+            self.assertEqual(spans[0]["spans"][0], {"value": "jane@example.com", "start": 11, "end": 27,
+                                                    "type": "email"})
+            self.assertEqual(pq.read_table(files[PrivyFileType.TEMPLATES]).to_pylist(), [{"template": TEMPLATE}])
+
+    def test_roll_over_max_file_size(self):
+        with tempfile.TemporaryDirectory() as folder:
+            folder = pathlib.Path(folder)
+            self.write(folder, "jsonl", max_file_size=1000, num_payloads=100)
+            parts = sorted(folder.glob("json-payloads-*.jsonl"))
+            self.assertGreater(len(parts), 1)
+            self.assertEqual(parts[0].name, "json-payloads-00000.jsonl")
+            records = [json.loads(line) for part in parts for line in part.read_text().splitlines()]
+            self.assertEqual(len(records), 100 * len(PAYLOADS))
+            self.assertEqual(sorted(folder.glob("json-spans*")), [folder / "json-spans-00000.jsonl"])
+
+    def test_atomic_write(self):
+        with tempfile.TemporaryDirectory() as folder:
+            path = pathlib.Path(folder) / "state" / "index.json"
+            with atomic_write(path) as f:
+                f.write("first")
+            # an interrupted write keeps the previous file and leaves no temporary file behind
+            with self.assertRaises(KeyboardInterrupt):
+                with atomic_write(path) as f:
+                    f.write("second")
+                    raise KeyboardInterrupt
+            self.assertEqual(path.read_text(), "first")
+            self.assertEqual(list(path.parent.iterdir()), [path])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -23,6 +23,7 @@ import numpy as np
 import pandas as pd
 
 from privy.generate.utils import PrivyFileType, PrivyWriter
+from privy.hooks import PARAMETER_TYPES
 from privy.payload import PayloadGenerator
 
 
@@ -33,11 +34,11 @@ class PrivyArgs:
             setattr(self, key, args[key])
 
 
-def generate_one_api_spec(api_specs_folder, region, multi_threaded, generate_type, file_type=PrivyFileType.PAYLOADS,
-                          logging="debug", num_additional_pii_types=6, equalize_pii_distribution_to_percentage=50,
-                          timeout=400, fuzz=False) -> io.StringIO:
-    file = io.StringIO()
-    args = {
+def privy_args(region, multi_threaded, generate_type, file_type=PrivyFileType.PAYLOADS, logging="debug",
+               num_additional_pii_types=6, equalize_pii_distribution_to_percentage=50, timeout=400, fuzz=False,
+               spec_cache=None, seed=None, engine="direct", dedup_state=None, dedup_bloom_capacity=0, profile=None,
+               corpus_index=None, pii_types=None) -> PrivyArgs:
+    return PrivyArgs({
         "generate_types": generate_type,
         "region": region,
         "logging": logging,
@@ -49,8 +50,29 @@ def generate_one_api_spec(api_specs_folder, region, multi_threaded, generate_typ
         "file_type": file_type,
         "spans_per_template": 10,
         "ignore_spec": ["stripe.com"],
-    }
-    args = PrivyArgs(args)
+        "spec_cache": spec_cache,
+        "seed": seed,
+        "engine": engine,
+        "dedup_state": dedup_state,
+        "dedup_bloom_capacity": dedup_bloom_capacity,
+        "profile": profile,
+        "xml_root": "root",
+        "xml_attribute_style": "type",
+        "html_layout": "rows",
+        "html_table_attributes": 'border="1"',
+        "sql_dialects": None,
+        "parameter_types": PARAMETER_TYPES,
+        "corpus_index": corpus_index,
+        "pii_types": pii_types,
+        "shard_index": 0,
+        "shard_count": 1,
+    })
+
+
+def generate_one_api_spec(api_specs_folder, region, multi_threaded, generate_type, file_type=PrivyFileType.PAYLOADS,
+                          **kwargs) -> io.StringIO:
+    file = io.StringIO()
+    args = privy_args(region, multi_threaded, generate_type, file_type, **kwargs)
     file_writers = defaultdict(list)
     csv_writer = csv.writer(file, quotechar="|")
     file_writers[args.generate_types] = [
@@ -0,0 +1,162 @@
+# Copyright 2018- The Pixie Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# SPDX-License-Identifier: Apache-2.0
+
+import json
+import logging
+import multiprocessing
+import time
+import traceback
+from collections import deque
+from multiprocessing.connection import Connection, wait
+from pathlib import Path
+from typing import Any, Callable, Iterable, Iterator, Optional
+
+import psutil
+
+# report of the specs killed by the watchdog, written next to the output files
+OFFENDERS_FILE = "offenders.jsonl"
+
+
+def _supervised_worker(conn: Connection, function: Callable, initializer: Optional[Callable], initargs: tuple) -> None:
+    """Worker process loop: run function on every task received from the supervisor, until it sends None."""
+    if initializer is not None:
+        initializer(*initargs)
+    conn.send(("ready", None))
+    while True:
+        task = conn.recv()
+        if task is None:
+            return
+        try:
+            conn.send(("done", function(task)))
+        except Exception:
+            conn.send(("error", traceback.format_exc()))
+
+
+class SupervisedPool:
+    """Pool of worker processes running one task at a time, which kills workers exceeding their time or memory budget.
+
+    Unlike a ProcessPoolExecutor, every worker is supervised on its own: the supervisor measures how long each worker
+    has spent on its current task and how much memory it uses, and kills it with SIGKILL once it exceeds time_limit
+    seconds or memory_limit bytes. Killed (or crashed) workers are replaced by a new one, so a single runaway task,
+    e.g. a pathological openAPI descriptor stuck in a regex draw, can't stall the whole run.
+    """
+
+    def __init__(self, num_workers: int, function: Callable, initializer: Optional[Callable] = None,
+                 initargs: tuple = (), time_limit: float = 0, memory_limit: int = 0, poll_interval: float = 1.0):
+        self.num_workers = num_workers
+        self.function = function
+        self.initializer = initializer
+        self.initargs = initargs
+        self.time_limit = time_limit
+        self.memory_limit = memory_limit
+        self.poll_interval = poll_interval
+        # spawn rather than fork, so that workers don't inherit hypothesis/faker state from the parent process
+        self.context = multiprocessing.get_context("spawn")
+        # connection -> [process, current task, time the task was sent]
+        self.workers = {}
+
+    def start_worker(self) -> None:
+        conn, child_conn = self.context.Pipe()
+        process = self.context.Process(target=_supervised_worker, daemon=True,
+                                       args=(child_conn, self.function, self.initializer, self.initargs))
+        process.start()
+        child_conn.close()
+        self.workers[conn] = [process, None, None]
+
+    def assign(self, conn: Connection, tasks: deque) -> None:
+        """Send the next task to an idle worker, or shut it down if there is none left."""
+        worker = self.workers[conn]
+        if tasks:
+            worker[1], worker[2] = tasks.popleft(), time.monotonic()
+            conn.send(worker[1])
+        else:
+            conn.send(None)
+            self.stop_worker(conn)
+
+    def stop_worker(self, conn: Connection, kill: bool = False) -> None:
+        process = self.workers.pop(conn)[0]
+        if kill:
+            process.kill()
+        process.join()
+        conn.close()
+
+    def offense(self, process: multiprocessing.Process, started: float) -> Optional[dict]:
+        """Return the budget the worker running a task since started exceeded, if any."""
+        elapsed = time.monotonic() - started
+        if self.time_limit and elapsed > self.time_limit:
+            return {"reason": "time", "seconds": round(elapsed, 1)}
+        if self.memory_limit:
+            try:
+                rss = psutil.Process(process.pid).memory_info().rss
+            except psutil.NoSuchProcess:
+                return
+            if rss > self.memory_limit:
+                return {"reason": "memory", "seconds": round(elapsed, 1), "rss": rss}
+
+    def map(self, tasks: Iterable) -> Iterator[tuple[Any, Any, Optional[dict]]]:
+        """Run function on every task, yielding (task, result, None) in order of completion, or
+        (task, None, offense) for tasks whose worker was killed or crashed."""
+        tasks = deque(tasks)
+        try:
+            for _ in range(min(self.num_workers, len(tasks))):
+                self.start_worker()
+            while self.workers:
+                for conn in wait(list(self.workers), timeout=self.poll_interval):
+                    process, task, started = self.workers[conn]
+                    try:
+                        status, result = conn.recv()
+                    except EOFError:
+                        # the worker died without being killed by the supervisor, e.g. by the OOM killer
+                        self.stop_worker(conn)
+                        if task is None:
+                            raise RuntimeError(f"Worker exited with code {process.exitcode} before it was ready")
+                        yield task, None, {"reason": "crash", "exitcode": process.exitcode,
+                                           "seconds": round(time.monotonic() - started, 1)}
+                        if tasks:
+                            self.start_worker()
+                        continue
+                    if status == "error":
+                        raise RuntimeError(f"Worker failed on {task}:\n{result}")
+                    if status == "done":
+                        yield task, result, None
+                    self.assign(conn, tasks)
+                for conn, (process, task, started) in list(self.workers.items()):
+                    if task is None:
+                        continue
+                    offense = self.offense(process, started)
+                    if offense:
+                        self.stop_worker(conn, kill=True)
+                        yield task, None, offense
+                        if tasks:
+                            self.start_worker()
+        finally:
+            for conn in list(self.workers):
+                self.stop_worker(conn, kill=True)
+
+
+def read_offenders(path: Path) -> list[dict]:
+    """Read the specs recorded by record_offender, ignoring a line cut short by an interrupted run."""
+    if not Path(path).exists():
+        return []
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.endswith("\n")]
+
+
+def record_offender(path: Path, offense: dict) -> None:
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "a") as f:
+        f.write(f"{json.dumps(offense)}\n")
+    logging.getLogger("privy").warning(f"Killed worker generating {offense['spec']}: {offense}")